@@ -0,0 +1,96 @@
+"""Compare JSON encoder backends serializing large collection documents
+
+Run with::
+
+    python benchmarks/json_encoders.py [number of resources]
+"""
+
+import datetime
+import decimal
+import sys
+import timeit
+import uuid
+
+from flask import Flask, make_response
+
+from flask_rest_jsonapi_next.json_encoders import JSON_ENCODERS, get_json_encoder
+
+
+def build_document(size):
+    now = datetime.datetime(2024, 1, 1, 12, 30)
+
+    return {
+        "data": [
+            {
+                "type": "person",
+                "id": str(i),
+                "attributes": {
+                    "name": "Person {}".format(i),
+                    "email": "person{}@example.com".format(i),
+                    "birth_date": (now - datetime.timedelta(days=i)).isoformat(),
+                    "balance": decimal.Decimal("{}.25".format(i)),
+                    "uuid": uuid.UUID(int=i),
+                    "tags": ["tag{}".format(j) for j in range(5)],
+                },
+                "relationships": {
+                    "computers": {
+                        "links": {
+                            "self": "/persons/{}/relationships/computers".format(i),
+                            "related": "/persons/{}/computers".format(i),
+                        },
+                        "data": [{"type": "computer", "id": str(i)}],
+                    }
+                },
+                "links": {"self": "/persons/{}".format(i)},
+            }
+            for i in range(size)
+        ],
+        "included": [
+            {
+                "type": "computer",
+                "id": str(i),
+                "attributes": {"serial": "serial-{}".format(i)},
+                "links": {"self": "/computers/{}".format(i)},
+            }
+            for i in range(size)
+        ],
+        "meta": {"count_mode": "exact", "count": size},
+        "links": {"self": "/persons?page[size]=0"},
+        "jsonapi": {"version": "1.0"},
+    }
+
+
+def main(size=1000, repeat=5, number=10):
+    app = Flask(__name__)
+    document = build_document(size)
+
+    print("{} resources, best of {} x {} runs".format(size, repeat, number))
+    print("{:<10} {:>12} {:>14}".format("encoder", "ms / dump", "ms / response"))
+
+    with app.test_request_context():
+        for name, encoder in JSON_ENCODERS.items():
+            if encoder is None:
+                print("{:<10} {:>12}".format(name, "not installed"))
+                continue
+
+            dumps = get_json_encoder(name)
+            dump_time = min(
+                timeit.repeat(lambda: dumps(document), repeat=repeat, number=number)
+            )
+            response_time = min(
+                timeit.repeat(
+                    lambda: make_response(dumps(document), 200),
+                    repeat=repeat,
+                    number=number,
+                )
+            )
+
+            print(
+                "{:<10} {:>12.2f} {:>14.2f}".format(
+                    name, dump_time / number * 1000, response_time / number * 1000
+                )
+            )
+
+
+if __name__ == "__main__":
+    main(*(int(_) for _ in sys.argv[1:2]))
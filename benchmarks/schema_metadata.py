@@ -0,0 +1,153 @@
+"""Compare schema field helpers computing results on every call with cached
+schema metadata
+
+Run with::
+
+    python benchmarks/schema_metadata.py [number of fields]
+"""
+
+import sys
+import timeit
+
+from marshmallow_jsonapi import Schema, fields
+from marshmallow_jsonapi.fields import List, Nested, Relationship
+
+from flask_rest_jsonapi_next.schema import (
+    get_model_field,
+    get_relationships,
+    get_schema_field,
+    get_schema_metadata,
+)
+
+
+def legacy_get_model_field(schema, field):
+    if schema._declared_fields.get(field) is None:
+        raise Exception("{} has no attribute {}".format(schema.__name__, field))
+
+    if schema._declared_fields[field].attribute is not None:
+        return schema._declared_fields[field].attribute
+    return field
+
+
+def legacy_get_relationships(schema, model_field=False):
+    relationships = [
+        key
+        for (key, value) in schema._declared_fields.items()
+        if isinstance(value, Relationship)
+    ]
+
+    if model_field is True:
+        relationships = [legacy_get_model_field(schema, key) for key in relationships]
+
+    return relationships
+
+
+def legacy_get_nested_fields(schema, model_field=False):
+    nested_fields = []
+    for key, value in schema._declared_fields.items():
+        if isinstance(value, List):
+            nested_fields.append(key)
+        elif isinstance(value, Nested):
+            nested_fields.append(key)
+
+    if model_field is True:
+        nested_fields = [legacy_get_model_field(schema, key) for key in nested_fields]
+
+    return nested_fields
+
+
+def legacy_get_schema_field(schema, field):
+    schema_fields_to_model = {
+        key: legacy_get_model_field(schema, key)
+        for (key, value) in schema._declared_fields.items()
+    }
+    for key, value in schema_fields_to_model.items():
+        if value == field:
+            return key
+
+    raise ValueError("Couldn't find schema field from {}".format(field))
+
+
+def build_schema(size):
+    attrs = {
+        "Meta": type("Meta", (), {"type_": "benchmark"}),
+        "id": fields.Integer(as_string=True),
+    }
+    for i in range(size):
+        attrs["attribute_{}".format(i)] = fields.Str(attribute="column_{}".format(i))
+        attrs["relationship_{}".format(i)] = Relationship(
+            type_="benchmark", schema="BenchmarkSchema", attribute="rel_{}".format(i)
+        )
+
+    return type("BenchmarkSchema", (Schema,), attrs)
+
+
+def apply_relationships(schema, get_relationships, get_schema_field, data):
+    """What ``SqlalchemyDataLayer.apply_relationships`` did per request"""
+    relationship_fields = get_relationships(schema, model_field=True)
+    for key in data:
+        if key in relationship_fields:
+            get_schema_field(schema, key)
+
+
+def apply_relationships_metadata(schema, data):
+    """What ``SqlalchemyDataLayer.apply_relationships`` does per request"""
+    metadata = get_schema_metadata(schema)
+    for key in data:
+        if key in metadata.relationship_model_fields:
+            metadata.schema_fields[key]
+
+
+def main(size=50, number=2000):
+    schema = build_schema(size)
+    data = ["rel_{}".format(i) for i in range(size)]
+    last = "column_{}".format(size - 1)
+
+    cases = [
+        (
+            "get_relationships",
+            lambda: legacy_get_relationships(schema, model_field=True),
+            lambda: get_relationships(schema, model_field=True),
+        ),
+        (
+            "get_nested_fields",
+            lambda: legacy_get_nested_fields(schema, model_field=True),
+            lambda: get_schema_metadata(schema).nested_model_fields,
+        ),
+        (
+            "get_model_field",
+            lambda: legacy_get_model_field(schema, "attribute_0"),
+            lambda: get_model_field(schema, "attribute_0"),
+        ),
+        (
+            "get_schema_field",
+            lambda: legacy_get_schema_field(schema, last),
+            lambda: get_schema_field(schema, last),
+        ),
+        (
+            "apply_relationships",
+            lambda: apply_relationships(
+                schema, legacy_get_relationships, legacy_get_schema_field, data
+            ),
+            lambda: apply_relationships_metadata(schema, data),
+        ),
+    ]
+
+    print(
+        "schema with {} fields, {} calls".format(len(schema._declared_fields), number)
+    )
+    print(
+        "{:<20} {:>12} {:>12} {:>8}".format("", "before [us]", "after [us]", "speedup")
+    )
+    for name, before, after in cases:
+        before_time = min(timeit.repeat(before, repeat=5, number=number)) / number
+        after_time = min(timeit.repeat(after, repeat=5, number=number)) / number
+        print(
+            "{:<20} {:>12.2f} {:>12.2f} {:>7.0f}x".format(
+                name, before_time * 1e6, after_time * 1e6, before_time / after_time
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(_) for _ in sys.argv[1:2]))
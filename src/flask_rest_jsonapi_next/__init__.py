@@ -2,6 +2,14 @@ __version__ = "0.44.2"
 
 from .api import Api
 from .data_layers.alchemy import SqlalchemyDataLayer
+from .data_layers.async_alchemy import AsyncSqlalchemyDataLayer
 from .error_responses import ErrorsAsJsonApi, ExceptionConverter, error_response
 from .exceptions import JsonApiException
-from .resource import ResourceDetail, ResourceList, ResourceRelationship
+from .resource import (
+    AsyncResourceDetail,
+    AsyncResourceList,
+    AsyncResourceRelationship,
+    ResourceDetail,
+    ResourceList,
+    ResourceRelationship,
+)
@@ -8,8 +8,13 @@ from pathlib import Path
 
 from flask import abort, request
 
+from .atomic import AtomicOperations
+from .data_layers.filtering.alchemy import filter_cache
 from .error_responses import ErrorsAsJsonApi
+from .json_encoders import get_json_encoder
 from .resource import ResourceList, ResourceRelationship
+from .response_cache import response_cache
+from .schema import schema_cache
 
 
 class Api(object):
@@ -71,6 +76,23 @@ class Api(object):
                 )
 
         self.app.config.setdefault("PAGE_SIZE", 30)
+        schema_cache.maxsize = self.app.config.setdefault(
+            "SCHEMA_CACHE_SIZE", schema_cache.maxsize
+        )
+        filter_cache.maxsize = self.app.config.setdefault(
+            "FILTER_CACHE_SIZE", filter_cache.maxsize
+        )
+        get_json_encoder(self.app.config.setdefault("JSON_ENCODER", "flask"))
+        self.app.config.setdefault("UNIT_OF_WORK", False)
+        response_cache.lru.maxsize = self.app.config.setdefault(
+            "RESPONSE_CACHE_SIZE", response_cache.lru.maxsize
+        )
+        response_cache.timeout = self.app.config.setdefault(
+            "RESPONSE_CACHE_TIMEOUT", response_cache.timeout
+        )
+        response_cache.backend = self.app.config.setdefault(
+            "RESPONSE_CACHE_BACKEND", None
+        )
 
         ErrorsAsJsonApi(app)
 
@@ -118,6 +140,19 @@ class Api(object):
 
         self.resource_registry.append(resource)
 
+    def atomic_operations(self, url="/operations", view="atomic_operations", **kwargs):
+        """Create the endpoint of JSON:API Atomic Operations extension
+
+        Operations are run by resource managers routed with this api, see
+        :class:`~flask_rest_jsonapi_next.atomic.AtomicOperations`.
+
+        :param str url: the url of the endpoint
+        :param str view: the view name
+        :param dict kwargs: additional options of the route, see :meth:`route`
+        """
+        resource = type(AtomicOperations.__name__, (AtomicOperations,), {"api": self})
+        self.route(resource, view, url, **kwargs)
+
     def oauth_manager(self, oauth_manager):
         """Use the oauth manager to enable oauth for API
 
@@ -0,0 +1,425 @@
+"""Endpoint of JSON:API Atomic Operations extension, see https://jsonapi.org/ext/atomic/"""
+
+from functools import wraps
+
+import marshmallow
+from flask import current_app, json, make_response, request
+from flask.views import MethodView
+from sqlalchemy.orm.exc import NoResultFound
+
+from .exceptions import (
+    BadRequest,
+    JsonApiException,
+    ObjectNotFound,
+    OperationFailed,
+    RelationNotFound,
+)
+from .json_encoders import json_dumps
+from .resource import (
+    AsyncResource,
+    ResourceDetail,
+    ResourceList,
+    ResourceRelationship,
+)
+from .schema import get_schema_metadata
+from .transaction import Transaction
+
+ATOMIC_EXTENSION = "https://jsonapi.org/ext/atomic"
+
+ATOMIC_CONTENT_TYPE = 'application/vnd.api+json; ext="{}"'.format(ATOMIC_EXTENSION)
+
+ATOMIC_OPERATIONS = ("add", "update", "remove")
+
+# Http methods of ResourceRelationship running operations on relationships
+RELATIONSHIP_OPERATIONS = {"add": "POST", "update": "PATCH", "remove": "DELETE"}
+
+# Headers of the atomic request not forwarded to requests of operations
+OPERATION_SKIPPED_HEADERS = ("Content-Type", "Content-Length", "Accept")
+
+
+def check_atomic_headers(func):
+    """Check headers according to JSON:API Atomic Operations extension
+
+    :param callable func: the function to decorate
+    :return callable: the wrapped function
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if request.mimetype not in ("application/vnd.api+json", "application/json"):
+            raise JsonApiException(
+                detail="Content-Type header must be {} or application/json".format(
+                    ATOMIC_CONTENT_TYPE
+                ),
+                title="Invalid request header",
+                status=415,
+            )
+
+        accepts = [
+            accept.strip()
+            for accept in request.headers.get("Accept", "").split(",")
+            if "application/vnd.api+json" in accept
+        ]
+        if accepts and not any(
+            accept == "application/vnd.api+json" or ATOMIC_EXTENSION in accept
+            for accept in accepts
+        ):
+            raise JsonApiException(
+                detail="Accept header must be {} or application/vnd.api+json".format(
+                    ATOMIC_CONTENT_TYPE
+                ),
+                title="Invalid request header",
+                status=406,
+            )
+
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+class AtomicOperations(MethodView):
+    """Run operations of JSON:API Atomic Operations extension in single transaction
+
+    Operations are run by resource managers routed with the api, found by type of
+    resources: ResourceList for "add", ResourceDetail for "update" and "remove" and
+    ResourceRelationship for operations on relationships. Each operation is
+    dispatched to the view of its resource manager as a request with the headers of
+    the atomic request, so that ``before_request``, ``after_request`` and
+    ``teardown_request`` functions (ie. oauth), error handlers, decorators, permission
+    manager and hooks of http methods (``before_post``, ``after_post``...) run as for
+    a single request. Every error of a failed operation is reported, with pointers
+    prefixed by the pointer of the operation. Commits of data layers are deferred
+    until all operations succeeded, see
+    :class:`~flask_rest_jsonapi_next.transaction.Transaction`.
+    """
+
+    api = None
+    schema = None
+    decorators = (check_atomic_headers,)
+
+    def post(self):
+        """Run operations and return their results"""
+        json_data = request.get_json() or {}
+
+        operations = json_data.get("atomic:operations")
+        if not isinstance(operations, list):
+            raise BadRequest(
+                'You must provide operations with an "atomic:operations" node',
+                source={"pointer": "/atomic:operations"},
+            )
+
+        lids = dict()
+        results = []
+        with Transaction() as transaction:
+            for index, operation in enumerate(operations):
+                prefix = "/atomic:operations/{}".format(index)
+                try:
+                    results.append(self.run_operation(operation, lids, transaction))
+                except JsonApiException as e:
+                    e.source = self._prefix_source(e.source, prefix)
+                    for error in getattr(e, "errors", ()):
+                        error["source"] = self._prefix_source(
+                            error.get("source"), prefix
+                        )
+                    raise
+                except NoResultFound as e:
+                    raise ObjectNotFound(
+                        "Object not found", source={"pointer": prefix}
+                    ) from e
+                except marshmallow.ValidationError as e:
+                    for error in e.messages.get("errors", []):
+                        if "pointer" in error.get("source", {}):
+                            error["source"]["pointer"] = (
+                                prefix + error["source"]["pointer"]
+                            )
+                    raise
+
+        if not any(results):
+            return make_response("", 204)
+
+        result = {
+            "atomic:results": results,
+            "jsonapi": {"version": "1.1", "ext": [ATOMIC_EXTENSION]},
+        }
+
+        return make_response(
+            json_dumps(result), 200, {"Content-Type": ATOMIC_CONTENT_TYPE}
+        )
+
+    def run_operation(self, operation, lids, transaction):
+        """Run an operation
+
+        :param dict operation: the operation
+        :param dict lids: identifiers of resources created by previous operations by
+            their local identifier
+        :param Transaction transaction: the transaction of operations
+        :return dict: result of the operation
+        """
+        if not isinstance(operation, dict) or operation.get("op") not in (
+            ATOMIC_OPERATIONS
+        ):
+            raise BadRequest(
+                "Operation must be one of {}".format(", ".join(ATOMIC_OPERATIONS)),
+                source={"pointer": "/op"},
+            )
+
+        op = operation["op"]
+        ref = self._resolve_lid(operation.get("ref"), lids, "/ref")
+        data = operation.get("data")
+
+        if ref is not None and "relationship" in ref:
+            return self.run_relationship_operation(op, ref, data, lids, transaction)
+
+        if op == "remove":
+            if ref is None:
+                raise BadRequest(
+                    "You must provide ref of resource to remove",
+                    source={"pointer": "/ref"},
+                )
+
+            resource = self.get_resource(
+                ref.get("type"), ResourceDetail, "DELETE", "/ref/type"
+            )
+            transaction.join(resource._data_layer)
+            self.dispatch_operation(
+                resource, "DELETE", self._view_kwargs(resource, ref, "/ref/id")
+            )
+
+            return dict()
+
+        if not isinstance(data, dict):
+            raise BadRequest(
+                'You must provide data with a "data" node', source={"pointer": "/data"}
+            )
+
+        if op == "update":
+            data = self._resolve_lid(data, lids, "/data")
+        else:
+            data = {key: value for key, value in data.items() if key != "lid"}
+        if isinstance(data.get("relationships"), dict):
+            data["relationships"] = {
+                name: self._resolve_relationship_lids(
+                    relationship, lids, "/data/relationships/{}/data".format(name)
+                )
+                for name, relationship in data["relationships"].items()
+            }
+
+        if op == "add":
+            resource = self.get_resource(
+                data.get("type"), ResourceList, "POST", "/data/type"
+            )
+            transaction.join(resource._data_layer)
+            result = self.dispatch_operation(resource, "POST", dict(), {"data": data})
+
+            if "lid" in operation["data"]:
+                lids[operation["data"]["lid"]] = result["data"]["id"]
+        else:
+            if ref is not None and str(ref.get("id")) != str(data.get("id")):
+                raise BadRequest(
+                    "Value of id does not match the ref of operation",
+                    source={"pointer": "/data/id"},
+                )
+
+            resource = self.get_resource(
+                data.get("type"), ResourceDetail, "PATCH", "/data/type"
+            )
+            transaction.join(resource._data_layer)
+            result = self.dispatch_operation(
+                resource,
+                "PATCH",
+                self._view_kwargs(resource, data, "/data/id"),
+                {"data": data},
+            )
+
+        return {"data": result["data"]}
+
+    def run_relationship_operation(self, op, ref, data, lids, transaction):
+        """Run an operation on a relationship
+
+        :param str op: the operation
+        :param dict ref: reference to the relationship
+        :param data: resource identifier or list of resource identifiers
+        :param dict lids: identifiers of created resources by their local identifier
+        :param Transaction transaction: the transaction of operations
+        :return dict: result of the operation
+        """
+        method = RELATIONSHIP_OPERATIONS[op]
+        resource = self.get_resource(
+            ref.get("type"), ResourceRelationship, method, "/ref/type"
+        )
+        relationship_field = ref["relationship"]
+
+        if relationship_field not in get_schema_metadata(resource.schema).relationships:
+            raise RelationNotFound(
+                "{} has no attribute {}".format(
+                    resource.schema.__name__, relationship_field
+                ),
+                source={"pointer": "/ref/relationship"},
+            )
+
+        data = self._resolve_relationship_lids({"data": data}, lids, "/data")["data"]
+
+        related_type_ = resource.schema._declared_fields[relationship_field].type_
+        for item in data if isinstance(data, list) else [data]:
+            if item is not None and (
+                not isinstance(item, dict) or item.get("type") != related_type_
+            ):
+                raise BadRequest(
+                    "The type provided does not match the resource type",
+                    source={"pointer": "/data"},
+                )
+
+        transaction.join(resource._data_layer)
+        self.dispatch_operation(
+            resource,
+            method,
+            self._view_kwargs(resource, ref, "/ref/id"),
+            {"data": data},
+            relationship_field,
+        )
+
+        return dict()
+
+    def dispatch_operation(
+        self, resource, method, view_kwargs, document=None, relationship=None
+    ):
+        """Dispatch an operation to the view of a resource manager
+
+        :param type resource: the resource manager class
+        :param str method: the http method
+        :param dict view_kwargs: kwargs of the view
+        :param dict document: the request document of the operation
+        :param str relationship: name of the relationship for operations on
+            relationships
+        :return dict: the response document, None if the response has no body
+        """
+        path = self._build_path(resource, method, view_kwargs, relationship)
+        if path is None:
+            raise BadRequest(
+                "Operation is not supported on resources of type {}".format(
+                    resource.schema.opts.type_
+                )
+            )
+
+        headers = [
+            (key, value)
+            for key, value in request.headers.items()
+            if key not in OPERATION_SKIPPED_HEADERS
+        ]
+        with current_app.test_request_context(
+            path,
+            base_url=request.url_root,
+            method=method,
+            headers=headers,
+            data=json_dumps(document) if document is not None else None,
+            content_type="application/vnd.api+json",
+        ):
+            response = current_app.full_dispatch_request()
+
+        body = response.get_data(as_text=True)
+        document = json.loads(body) if body else None
+
+        if response.status_code >= 400:
+            errors = [
+                {key: value for key, value in error.items() if key != "id"}
+                for error in (document or dict()).get("errors") or ()
+            ]
+            raise OperationFailed(
+                errors or [{"detail": response.status}], status=response.status_code
+            )
+
+        return document
+
+    @staticmethod
+    def _prefix_source(source, prefix):
+        return {"pointer": prefix + (source or dict()).get("pointer", "")}
+
+    def get_resource(self, type_, resource_cls, method, pointer):
+        """Get resource manager routed with the api for a type of resources
+
+        :param str type_: the type of resources
+        :param type resource_cls: ResourceList, ResourceDetail or ResourceRelationship
+        :param str method: http method the resource manager must handle
+        :param str pointer: pointer to the type in operation, used in errors
+        :return type: the resource manager class
+        """
+        for resource in self.api.resource_registry:
+            if (
+                issubclass(resource, resource_cls)
+                and not issubclass(resource, AsyncResource)
+                and method in (getattr(resource, "methods", None) or ())
+                and getattr(resource, "schema", None) is not None
+                and getattr(resource, "_data_layer", None) is not None
+                and resource.schema.opts.type_ == type_
+            ):
+                return resource
+
+        raise BadRequest(
+            "Operation is not supported on resources of type {}".format(type_),
+            source={"pointer": pointer},
+        )
+
+    @staticmethod
+    def _build_path(resource, method, view_kwargs, relationship=None):
+        """Build path of the request of an operation from url rules of a resource
+        manager, None if no rule matches
+        """
+        for rule in current_app.url_map.iter_rules():
+            view = current_app.view_functions.get(rule.endpoint)
+            if getattr(view, "view_class", None) is not resource:
+                continue
+            if not rule.suitable_for(view_kwargs, method):
+                continue
+            if (
+                relationship is not None
+                and rule.rule.split("/")[-1].replace("-", "_") != relationship
+            ):
+                continue
+
+            built = rule.build(view_kwargs, append_unknown=False)
+            if built is not None:
+                return built[1]
+
+        return None
+
+    @staticmethod
+    def _view_kwargs(resource, identifier, pointer):
+        """Get view kwargs identifying the object of an operation"""
+        if identifier.get("id") is None:
+            raise BadRequest("Missing id of resource", source={"pointer": pointer})
+
+        return {getattr(resource._data_layer, "url_field", "id"): identifier["id"]}
+
+    @classmethod
+    def _resolve_relationship_lids(cls, relationship, lids, pointer):
+        """Replace local identifiers in data of a relationship by created ids"""
+        if not isinstance(relationship, dict) or "data" not in relationship:
+            return relationship
+
+        data = relationship["data"]
+        if isinstance(data, list):
+            data = [
+                cls._resolve_lid(item, lids, "{}/{}".format(pointer, index))
+                for index, item in enumerate(data)
+            ]
+        else:
+            data = cls._resolve_lid(data, lids, pointer)
+
+        return {**relationship, "data": data}
+
+    @staticmethod
+    def _resolve_lid(identifier, lids, pointer):
+        """Replace local identifier of a resource identifier by the created id"""
+        if not isinstance(identifier, dict) or "lid" not in identifier:
+            return identifier
+
+        if identifier["lid"] not in lids:
+            raise BadRequest(
+                "Unknown local identifier {}".format(identifier["lid"]),
+                source={"pointer": pointer + "/lid"},
+            )
+
+        resolved = {key: value for key, value in identifier.items() if key != "lid"}
+        resolved["id"] = lids[identifier["lid"]]
+
+        return resolved
@@ -0,0 +1,84 @@
+"""Bounded in-process cache shared by the caches of the api"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Bounded LRU cache with optional expiration of entries
+
+    Used for serialization plans computed by :func:`~flask_rest_jsonapi_next.schema.
+    compute_schema`, compiled filters of the SQLAlchemy data layer and the in-process
+    response cache.
+    """
+
+    def __init__(self, maxsize=256):
+        """Initialize the cache
+
+        :param int maxsize: maximal number of cached entries, 0 disables the cache
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return cached entry for key and mark it as recently used
+
+        :param key: the cache key
+        :return: the cached entry or None if missing or expired
+        """
+        with self._lock:
+            try:
+                value, expires = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+
+            if expires is not None and expires <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, timeout=None):
+        """Store entry for key, evicting least recently used entries if needed
+
+        :param key: the cache key
+        :param value: the entry
+        :param int timeout: number of seconds the entry is kept, None or 0 to keep it
+            until it is evicted
+        """
+        expires = time.monotonic() + timeout if timeout else None
+
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(self.maxsize, 0):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def info(self):
+        """Return cache statistics
+
+        :return dict: hits, misses, evictions, current size and maxsize of the cache
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
@@ -1,21 +1,26 @@
 """This module is a CRUD interface between resource managers and the sqlalchemy ORM"""
 
+import json
+import time
 import warnings
 
 import marshmallow
 import sqlalchemy
-from flask import current_app
-from marshmallow import class_registry
-from marshmallow.base import SchemaABC
+from flask import current_app, g, has_request_context, request
 from packaging.version import Version
-from sqlalchemy import asc, desc, orm
+from sqlalchemy import and_, asc, desc, false, or_, orm
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import ColumnProperty, RelationshipProperty
 from sqlalchemy.orm.attributes import QueryableAttribute
 from sqlalchemy.orm.collections import InstrumentedList
 from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.expression import ClauseElement
 
 from ..exceptions import (
+    BadRequest,
     InvalidInclude,
     InvalidSort,
     InvalidType,
@@ -24,23 +29,123 @@ from ..exceptions import (
     RelatedObjectNotFound,
     RelationNotFound,
 )
+from ..pagination import (
+    CURSOR_PARAMETERS,
+    CursorPage,
+    Page,
+    decode_cursor,
+    encode_cursor,
+)
+from ..response_cache import response_cache
 from ..schema import (
     get_model_field,
-    get_nested_fields,
-    get_related_schema,
-    get_relationships,
-    get_schema_field,
+    get_related_id_field,
+    get_related_schema_cls,
+    get_schema_metadata,
 )
+from ..transaction import DEFER_COMMIT_KEY, WRITTEN_TYPES_KEY
 from .base import BaseDataLayer
-from .filtering.alchemy import create_filters
+from .filtering.alchemy import (
+    LARGE_IN_STRATEGIES,
+    create_filters,
+    create_large_in_filter,
+)
 
 _IS_SQLALCHEMY_1x = Version(sqlalchemy.__version__) < Version("2.0.0")
 
+COUNT_MODES = ("exact", "estimated", "none")
+
+# Default number of identifiers in single IN query resolving related objects
+RELATED_OBJECTS_CHUNK_SIZE = 500
+
+# Eager loading strategies for included relationships and their sqlalchemy loaders
+EAGERLOAD_STRATEGIES = {
+    "joined": "joinedload",
+    "selectin": "selectinload",
+    "subquery": "subqueryload",
+    "raise": "raiseload",
+}
+
+# Dialects supporting ``count(*) OVER ()`` with minimal server version if any
+WINDOW_FUNCTION_DIALECTS = {
+    "postgresql": None,
+    "oracle": None,
+    "mssql": None,
+    "mysql": (8, 0),
+    "mariadb": (10, 2),
+    "sqlite": (3, 25),
+}
+
+# Default number of objects added and flushed at once by bulk creation
+BULK_CREATE_BATCH_SIZE = 500
+
+# Default number of values above which IN filters use a large IN strategy
+LARGE_IN_THRESHOLD = 1000
+
+# Large IN strategies picked by "auto" per dialect, others use "chunked"
+LARGE_IN_DIALECT_STRATEGIES = {
+    "postgresql": "array",
+    "mssql": "values",
+}
+
+# Dialects supporting large IN strategies other than "chunked"
+LARGE_IN_STRATEGY_DIALECTS = {
+    "array": ("postgresql",),
+    "values": ("postgresql", "mssql"),
+}
+
+
+# Http methods whose reads are routed to ``read_session``
+READ_METHODS = ("GET", "HEAD")
+
+# Default maximal replication lag of ``read_session`` in seconds
+MAX_REPLICA_LAG = 1.0
+
+# Attribute of ``flask.g`` routing reads of the request to primary sessions
+READ_FROM_PRIMARY_KEY = "flask_rest_jsonapi_next_read_from_primary"
+
+# Attribute of ``flask.g`` keeping replication lags measured during the request
+REPLICA_LAGS_KEY = "flask_rest_jsonapi_next_replica_lags"
+
+# Time of last commit in this process by model, see ``read_your_writes_window``
+_last_writes = dict()
+
+
+def read_from_primary():
+    """Route reads of data layers to their primary session until the end of request
+
+    Useful when the request depends on data written just before, ie. by an other
+    service, that could be missing in read replicas.
+    """
+    setattr(g, READ_FROM_PRIMARY_KEY, True)
+
 
 class FlaskRestJsonApiNextWarning(UserWarning):
     pass
 
 
+class Explain(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON)`` of a statement, PostgreSQL only
+
+    The statement is compiled and its parameters are bound like any other
+    statement of the session, whatever the paramstyle of the driver.
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        """Initialize the construct
+
+        :param Select statement: the explained statement
+        """
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kwargs):
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kwargs)
+
+
 class SqlalchemyDataLayer(BaseDataLayer):
     """Sqlalchemy data layer"""
 
@@ -63,10 +168,117 @@ class SqlalchemyDataLayer(BaseDataLayer):
                     self.resource.__name__
                 )
             )
+        if getattr(self, "count_mode", "exact") not in COUNT_MODES:
+            raise Exception(
+                "count_mode in data_layer_kwargs must be one of {}".format(
+                    ", ".join(COUNT_MODES)
+                )
+            )
+
+        strategies = [getattr(self, "eagerload_strategy", "joined")] + list(
+            getattr(self, "eagerload_strategies", {}).values()
+        )
+        for strategy in strategies:
+            if strategy != "auto" and strategy not in EAGERLOAD_STRATEGIES:
+                raise Exception(
+                    "Eager loading strategy in data_layer_kwargs must be one of auto, {}".format(
+                        ", ".join(EAGERLOAD_STRATEGIES)
+                    )
+                )
+
+        large_in_strategy = getattr(self, "large_in_strategy", "auto")
+        if large_in_strategy != "auto" and large_in_strategy not in LARGE_IN_STRATEGIES:
+            raise Exception(
+                "large_in_strategy in data_layer_kwargs must be one of auto, {}".format(
+                    ", ".join(LARGE_IN_STRATEGIES)
+                )
+            )
 
     def rollback(self):
         self.session.rollback()
 
+    def commit(self):
+        """Commit the session, or only flush it while commits are deferred by a
+        :class:`~flask_rest_jsonapi_next.transaction.Transaction`
+
+        Cached responses of written resource types are invalidated once committed.
+        """
+        if self.session.info.get(DEFER_COMMIT_KEY):
+            self.session.flush()
+            self.session.info.setdefault(WRITTEN_TYPES_KEY, set()).update(
+                self.get_written_types()
+            )
+        else:
+            self.session.commit()
+            response_cache.invalidate(self.get_written_types())
+
+        _last_writes[self.model] = time.monotonic()
+
+    def get_written_types(self):
+        """Get resource types whose documents change with writes of the data layer
+
+        The type of the resource and types of its relationships, whose resource
+        linkage can change.
+
+        :return set: the resource types
+        """
+        schema = getattr(getattr(self, "resource", None), "schema", None)
+        if schema is None:
+            return set()
+
+        types = {schema.opts.type_}
+        for field in get_schema_metadata(schema).relationships:
+            type_ = getattr(schema._declared_fields[field], "type_", None)
+            if type_ is not None:
+                types.add(type_)
+
+        return types
+
+    def get_read_session(self):
+        """Get the session reading objects in get_object, get_collection and
+        get_relationship
+
+        ``read_session`` data layer parameter (ie. session of a read replica) is used
+        during GET and HEAD requests. Reads go to the primary ``session`` when reads
+        of the request are routed to primary by :func:`read_from_primary`, while the
+        primary session has pending changes or deferred commits, during
+        ``read_your_writes_window`` seconds after a commit of the model by this
+        process and when replication lag returned by ``replica_lag`` is unknown or
+        greater than ``max_replica_lag``.
+
+        :return Session: the session
+        """
+        read_session = getattr(self, "read_session", None)
+        if (
+            read_session is None
+            or not has_request_context()
+            or request.method not in READ_METHODS
+            or g.get(READ_FROM_PRIMARY_KEY)
+        ):
+            return self.session
+
+        if self.session.info.get(DEFER_COMMIT_KEY) or (
+            self.session.new or self.session.dirty or self.session.deleted
+        ):
+            return self.session
+
+        window = getattr(self, "read_your_writes_window", None)
+        last_write = _last_writes.get(self.model)
+        if window and last_write is not None and time.monotonic() - last_write < window:
+            return self.session
+
+        replica_lag = getattr(self, "replica_lag", None)
+        if replica_lag is not None:
+            lags = g.setdefault(REPLICA_LAGS_KEY, dict())
+            if id(read_session) not in lags:
+                lags[id(read_session)] = replica_lag(read_session)
+
+            lag = lags[id(read_session)]
+            if lag is None or lag > getattr(self, "max_replica_lag", MAX_REPLICA_LAG):
+                return self.session
+
+        return read_session
+
     def create_object(self, data, view_kwargs):
         """Create an object through sqlalchemy
 
@@ -76,10 +288,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
         """
         self.before_create_object(data, view_kwargs)
 
-        relationship_fields = get_relationships(self.resource.schema, model_field=True)
-        nested_fields = get_nested_fields(self.resource.schema, model_field=True)
-
-        join_fields = relationship_fields + nested_fields
+        join_fields = get_schema_metadata(self.resource.schema).related_model_fields
 
         obj = self.model(
             **{key: value for (key, value) in data.items() if key not in join_fields}
@@ -91,7 +300,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         self.session.add(obj)
         try:
-            self.session.commit()
+            self.commit()
         except:
             self.session.rollback()
             raise
@@ -100,6 +309,53 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         return obj
 
+    def create_objects(self, data, view_kwargs):
+        """Create objects through sqlalchemy in single transaction
+
+        Objects are added with ``session.add_all`` and flushed in batches of
+        ``bulk_create_batch_size`` objects (default 500), then committed once.
+
+        :param list data: the data validated by marshmallow, one dict per object
+        :param dict view_kwargs: kwargs from the resource view
+        :return list: the created objects
+        """
+        join_fields = get_schema_metadata(self.resource.schema).related_model_fields
+        batch_size = getattr(self, "bulk_create_batch_size", BULK_CREATE_BATCH_SIZE)
+
+        objs = []
+        try:
+            for start in range(0, len(data), batch_size):
+                batch = []
+                for item in data[start : start + batch_size]:
+                    self.before_create_object(item, view_kwargs)
+
+                    obj = self.model(
+                        **{
+                            key: value
+                            for (key, value) in item.items()
+                            if key not in join_fields
+                        }
+                    )
+                    self.apply_relationships(item, obj)
+                    self.apply_nested_fields(item, obj)
+
+                    self.before_commit(obj)
+                    batch.append(obj)
+
+                self.session.add_all(batch)
+                self.session.flush()
+                objs.extend(batch)
+
+            self.commit()
+        except:
+            self.session.rollback()
+            raise
+
+        for obj, item in zip(objs, data):
+            self.after_create_object(obj, item, view_kwargs)
+
+        return objs
+
     def get_object(self, view_kwargs, qs=None):
         """Retrieve an object through sqlalchemy
 
@@ -139,7 +395,9 @@ class SqlalchemyDataLayer(BaseDataLayer):
         :param bool as_query: If True, and if possible by concrete implementation,
             then return value will be tuple of count and query object instead of
             tuple of count and list of objects. May be more performant in some cases.
-        :return tuple: the number of object and the list of objects
+        :return tuple: the number of object and the list of objects. Number of objects
+            is approximate if data layer ``count_mode`` is "estimated" and None if it is
+            "none" or if it couldn't be estimated.
         """
         self.before_get_collection(qs, view_kwargs)
 
@@ -151,17 +409,52 @@ class SqlalchemyDataLayer(BaseDataLayer):
         if qs.filters:
             query = self.filter_query(query, qs.filters, self.model)
 
+        keyset_pagination = getattr(self, "pagination_strategy", "offset") == "keyset"
+
+        if keyset_pagination and "number" in qs.pagination:
+            raise BadRequest(
+                "{} supports only cursor pagination".format(self.resource.__name__),
+                source={"parameter": "page[number]"},
+            )
+
+        if not keyset_pagination:
+            for key in CURSOR_PARAMETERS:
+                if key in qs.pagination:
+                    raise BadRequest(
+                        "{} doesn't support cursor pagination".format(
+                            self.resource.__name__
+                        ),
+                        source={"parameter": "page[{}]".format(key)},
+                    )
+
+        window_count = not keyset_pagination and self.supports_window_count(qs)
+
+        # Count before eager loading and sorting: their joins and ordering only make
+        # counting slower and joins can even change the number of counted rows.
+        filtered_query = query
+        object_count = None if window_count else self.count_query(query)
+
         if getattr(self, "eagerload_includes", True):
             query = self.eagerload_includes(query, qs)
 
-        if qs.sorting:
-            query = self.sort_query(query, qs.sorting)
+        if keyset_pagination:
+            query, sort_keys = self.keyset_sort_query(query, qs.sorting)
 
-        object_count = query.count()
+            collection = self.keyset_paginate_query(query, sort_keys, qs.pagination)
 
-        query = self.paginate_query(query, qs.pagination)
+        else:
+            if qs.sorting:
+                query = self.sort_query(query, qs.sorting)
 
-        collection = query if as_query else query.all()
+            if window_count:
+                object_count, collection = self.window_count_paginate_query(
+                    query, qs.pagination, filtered_query
+                )
+            elif getattr(self, "count_mode", "exact") == "exact":
+                query = self.paginate_query(query, qs.pagination)
+                collection = query if as_query else query.all()
+            else:
+                collection = self.probe_paginate_query(query, qs.pagination)
 
         collection = self.after_get_collection(collection, qs, view_kwargs)
 
@@ -185,10 +478,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         self.before_update_object(obj, data, view_kwargs)
 
-        relationship_fields = get_relationships(self.resource.schema, model_field=True)
-        nested_fields = get_nested_fields(self.resource.schema, model_field=True)
-
-        join_fields = relationship_fields + nested_fields
+        join_fields = get_schema_metadata(self.resource.schema).related_model_fields
 
         for key, value in data.items():
             if hasattr(obj, key) and key not in join_fields:
@@ -200,7 +490,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
         self.before_commit(obj)
 
         try:
-            self.session.commit()
+            self.commit()
         except:
             self.session.rollback()
             raise
@@ -225,7 +515,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         self.session.delete(obj)
         try:
-            self.session.commit()
+            self.commit()
         except:
             self.session.rollback()
             raise
@@ -257,7 +547,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
                 source={"parameter": url_field},
             )
 
-        if not hasattr(obj, relationship_field):
+        if not hasattr(obj.__class__, relationship_field):
             raise RelationNotFound(
                 "{} has no attribute {}".format(
                     obj.__class__.__name__, relationship_field
@@ -270,18 +560,36 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         updated = False
 
-        if isinstance(json_data["data"], list):
+        association = self.get_set_based_relationship(obj, relationship_field)
+
+        if isinstance(json_data["data"], list) and association is not None:
+            keys = self._association_related_keys(
+                association, related_id_field, json_data["data"]
+            )
+            updated = self._insert_association_rows(association, obj, keys) > 0
+            self.session.expire(obj, [relationship_field])
+
+        elif isinstance(json_data["data"], list):
             obj_ids = {
                 str(getattr(obj__, related_id_field))
                 for obj__ in getattr(obj, relationship_field)
             }
 
-            for obj_ in json_data["data"]:
-                if obj_["id"] not in obj_ids:
-                    getattr(obj, relationship_field).append(
-                        self.get_related_object(related_model, related_id_field, obj_)
+            related_objects = self.get_related_objects(
+                related_model,
+                related_id_field,
+                [
+                    {"id": identifier}
+                    for identifier in dict.fromkeys(
+                        str(obj_["id"]) for obj_ in json_data["data"]
                     )
-                    updated = True
+                    if identifier not in obj_ids
+                ],
+            )
+
+            for related_object in related_objects:
+                getattr(obj, relationship_field).append(related_object)
+                updated = True
         else:
             related_object = None
 
@@ -297,7 +605,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
                 updated = True
 
         try:
-            self.session.commit()
+            self.commit()
         except:
             self.session.rollback()
             raise
@@ -333,7 +641,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
                 source={"parameter": url_field},
             )
 
-        if not hasattr(obj, relationship_field):
+        if not hasattr(obj.__class__, relationship_field):
             raise RelationNotFound(
                 "{} has no attribute {}".format(
                     obj.__class__.__name__, relationship_field
@@ -390,7 +698,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
                 source={"parameter": url_field},
             )
 
-        if not hasattr(obj, relationship_field):
+        if not hasattr(obj.__class__, relationship_field):
             raise RelationNotFound(
                 "{} has no attribute {}".format(
                     obj.__class__.__name__, relationship_field
@@ -403,13 +711,21 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         updated = False
 
-        if isinstance(json_data["data"], list):
-            related_objects = []
+        association = self.get_set_based_relationship(obj, relationship_field)
 
-            for obj_ in json_data["data"]:
-                related_objects.append(
-                    self.get_related_object(related_model, related_id_field, obj_)
-                )
+        if isinstance(json_data["data"], list) and association is not None:
+            keys = self._association_related_keys(
+                association, related_id_field, json_data["data"]
+            )
+            deleted = self._delete_association_rows(association, obj, keys, keep=True)
+            inserted = self._insert_association_rows(association, obj, keys)
+            updated = deleted > 0 or inserted > 0
+            self.session.expire(obj, [relationship_field])
+
+        elif isinstance(json_data["data"], list):
+            related_objects = self.get_related_objects(
+                related_model, related_id_field, json_data["data"]
+            )
 
             obj_ids = {
                 getattr(obj__, related_id_field)
@@ -438,7 +754,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
                 updated = True
 
         try:
-            self.session.commit()
+            self.commit()
         except Exception:
             self.session.rollback()
             raise
@@ -473,7 +789,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
                 source={"parameter": url_field},
             )
 
-        if not hasattr(obj, relationship_field):
+        if not hasattr(obj.__class__, relationship_field):
             raise RelationNotFound(
                 "{} has no attribute {}".format(
                     obj.__class__.__name__, relationship_field
@@ -486,24 +802,42 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         updated = False
 
-        if isinstance(json_data["data"], list):
+        association = self.get_set_based_relationship(obj, relationship_field)
+
+        if isinstance(json_data["data"], list) and association is not None:
+            keys = self._association_related_keys(
+                association, related_id_field, json_data["data"], validate=False
+            )
+            updated = self._delete_association_rows(association, obj, keys) > 0
+            self.session.expire(obj, [relationship_field])
+
+        elif isinstance(json_data["data"], list):
             obj_ids = {
                 str(getattr(obj__, related_id_field))
                 for obj__ in getattr(obj, relationship_field)
             }
 
-            for obj_ in json_data["data"]:
-                if obj_["id"] in obj_ids:
-                    getattr(obj, relationship_field).remove(
-                        self.get_related_object(related_model, related_id_field, obj_)
+            related_objects = self.get_related_objects(
+                related_model,
+                related_id_field,
+                [
+                    {"id": identifier}
+                    for identifier in dict.fromkeys(
+                        str(obj_["id"]) for obj_ in json_data["data"]
                     )
-                    updated = True
+                    if identifier in obj_ids
+                ],
+            )
+
+            for related_object in related_objects:
+                getattr(obj, relationship_field).remove(related_object)
+                updated = True
         else:
             setattr(obj, relationship_field, None)
             updated = True
 
         try:
-            self.session.commit()
+            self.commit()
         except JsonApiException as e:
             self.session.rollback()
             raise e
@@ -540,6 +874,233 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         return related_object
 
+    def get_related_objects(self, related_model, related_id_field, objs):
+        """Get related objects with as few queries as possible
+
+        Identifiers are resolved with ``IN`` queries, chunked by
+        ``related_objects_chunk_size`` data layer parameter.
+
+        :param Model related_model: an sqlalchemy model
+        :param str related_id_field: the identifier field of the related model
+        :param list objs: resource identifiers of related objects
+        :return list: related objects in order of identifiers
+        """
+        identifiers = list(dict.fromkeys(obj["id"] for obj in objs))
+        chunk_size = getattr(
+            self, "related_objects_chunk_size", RELATED_OBJECTS_CHUNK_SIZE
+        )
+        id_attribute = getattr(related_model, related_id_field)
+
+        found = {}
+        for i in range(0, len(identifiers), chunk_size):
+            for related_object in self.session.query(related_model).filter(
+                id_attribute.in_(identifiers[i : i + chunk_size])
+            ):
+                found[str(getattr(related_object, related_id_field))] = related_object
+
+        missing = [
+            identifier for identifier in identifiers if str(identifier) not in found
+        ]
+        if missing:
+            raise RelatedObjectNotFound(
+                "{}.{}: {} not found".format(
+                    related_model.__name__,
+                    related_id_field,
+                    ", ".join(str(identifier) for identifier in missing),
+                )
+            )
+
+        return [found[str(obj["id"])] for obj in objs]
+
+    def get_set_based_relationship(self, obj, relationship_field):
+        """Get relationship that is mutated directly in its association table
+
+        Applies to many-to-many relationships enabled by ``set_based_relationships``
+        data layer parameter (True for all of them or list of relationship
+        attributes). Their collections are never loaded by relationship mutations and
+        ORM events of the collections are not triggered.
+
+        :param DeclarativeMeta obj: the sqlalchemy object owning the relationship
+        :param str relationship_field: the model attribute used for relationship
+        :return RelationshipProperty: the relationship or None
+        """
+        set_based = getattr(self, "set_based_relationships", False)
+        if set_based is not True and relationship_field not in (set_based or ()):
+            return None
+
+        relationship = getattr(obj.__class__, relationship_field).property
+        if relationship.secondary is None or relationship.viewonly:
+            return None
+
+        return relationship
+
+    def _association_related_keys(
+        self, relationship, related_id_field, objs, validate=True
+    ):
+        """Resolve identifiers of related objects to association table values
+
+        :param RelationshipProperty relationship: many-to-many relationship
+        :param str related_id_field: the identifier field of the related model
+        :param list objs: resource identifiers of related objects
+        :param bool validate: raise RelatedObjectNotFound for unknown identifiers
+        :return list: tuples of values of association table columns referencing
+            related objects
+        """
+        related_model = relationship.mapper.class_
+        related_columns = [
+            column for column, _ in relationship.secondary_synchronize_pairs
+        ]
+        id_attribute = getattr(related_model, related_id_field)
+        identifiers = list(dict.fromkeys(obj["id"] for obj in objs))
+        chunk_size = getattr(
+            self, "related_objects_chunk_size", RELATED_OBJECTS_CHUNK_SIZE
+        )
+
+        found = {}
+        for i in range(0, len(identifiers), chunk_size):
+            rows = self.session.execute(
+                sqlalchemy.select(id_attribute, *related_columns).where(
+                    id_attribute.in_(identifiers[i : i + chunk_size])
+                )
+            )
+            for row in rows:
+                found[str(row[0])] = tuple(row[1:])
+
+        missing = [
+            identifier for identifier in identifiers if str(identifier) not in found
+        ]
+        if validate and missing:
+            raise RelatedObjectNotFound(
+                "{}.{}: {} not found".format(
+                    related_model.__name__,
+                    related_id_field,
+                    ", ".join(str(identifier) for identifier in missing),
+                )
+            )
+
+        return list(dict.fromkeys(found.values()))
+
+    @staticmethod
+    def _association_parent_values(relationship, obj):
+        mapper = inspect(obj.__class__)
+
+        return {
+            association_column: getattr(obj, mapper.get_property_by_column(column).key)
+            for column, association_column in relationship.synchronize_pairs
+        }
+
+    @staticmethod
+    def _association_related_criterion(relationship, keys):
+        columns = [column for _, column in relationship.secondary_synchronize_pairs]
+
+        if len(columns) == 1:
+            columns, keys = columns[0], [key[0] for key in keys]
+        else:
+            columns = sqlalchemy.tuple_(*columns)
+
+        return columns.in_(keys)
+
+    def _insert_association_rows(self, relationship, obj, keys):
+        """Link related objects that are not linked yet
+
+        :param RelationshipProperty relationship: many-to-many relationship
+        :param DeclarativeMeta obj: the sqlalchemy object owning the relationship
+        :param list keys: values of association table columns referencing related
+            objects
+        :return int: number of inserted association rows
+        """
+        table = relationship.secondary
+        parent_values = self._association_parent_values(relationship, obj)
+        related_columns = [
+            column for _, column in relationship.secondary_synchronize_pairs
+        ]
+        chunk_size = getattr(
+            self, "related_objects_chunk_size", RELATED_OBJECTS_CHUNK_SIZE
+        )
+
+        existing = set()
+        for i in range(0, len(keys), chunk_size):
+            rows = self.session.execute(
+                sqlalchemy.select(*related_columns).where(
+                    *(column == value for column, value in parent_values.items()),
+                    self._association_related_criterion(
+                        relationship, keys[i : i + chunk_size]
+                    ),
+                )
+            )
+            existing.update(tuple(row) for row in rows)
+
+        rows = [
+            dict(
+                {column.key: value for column, value in parent_values.items()},
+                **{column.key: value for column, value in zip(related_columns, key)},
+            )
+            for key in keys
+            if key not in existing
+        ]
+        if not rows:
+            return 0
+
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            statement = postgresql.insert(table).on_conflict_do_nothing()
+        elif dialect == "sqlite":
+            statement = sqlite.insert(table).on_conflict_do_nothing()
+        elif dialect in ("mysql", "mariadb"):
+            statement = table.insert().prefix_with("IGNORE")
+        else:
+            statement = table.insert()
+
+        self.session.execute(statement, rows)
+
+        return len(rows)
+
+    def _delete_association_rows(self, relationship, obj, keys, keep=False):
+        """Unlink related objects
+
+        :param RelationshipProperty relationship: many-to-many relationship
+        :param DeclarativeMeta obj: the sqlalchemy object owning the relationship
+        :param list keys: values of association table columns referencing related
+            objects
+        :param bool keep: if True, unlink all related objects except given ones
+        :return int: number of deleted association rows
+        """
+        parent_criteria = [
+            column == value
+            for column, value in self._association_parent_values(
+                relationship, obj
+            ).items()
+        ]
+        chunk_size = getattr(
+            self, "related_objects_chunk_size", RELATED_OBJECTS_CHUNK_SIZE
+        )
+
+        if keep:
+            # Linked keys are compared in python: a NOT IN of all kept keys would
+            # exceed bind parameter limits of large relationships
+            related_columns = [
+                column for _, column in relationship.secondary_synchronize_pairs
+            ]
+            rows = self.session.execute(
+                sqlalchemy.select(*related_columns)
+                .where(*parent_criteria)
+                .execution_options(yield_per=chunk_size)
+            )
+            keys = list({tuple(row) for row in rows} - set(keys))
+
+        deleted = 0
+        for i in range(0, len(keys), chunk_size):
+            deleted += self.session.execute(
+                sqlalchemy.delete(relationship.secondary).where(
+                    *parent_criteria,
+                    self._association_related_criterion(
+                        relationship, keys[i : i + chunk_size]
+                    ),
+                )
+            ).rowcount
+
+        return deleted
+
     def apply_relationships(self, data, obj):
         """Apply relationship provided by data to obj
 
@@ -548,23 +1109,21 @@ class SqlalchemyDataLayer(BaseDataLayer):
         :return boolean: True if relationship have changed else False
         """
         relationships_to_apply = []
-        relationship_fields = get_relationships(self.resource.schema, model_field=True)
+        metadata = get_schema_metadata(self.resource.schema)
         for key, value in data.items():
-            if key in relationship_fields:
+            if key in metadata.relationship_model_fields:
                 related_model = getattr(obj.__class__, key).property.mapper.class_
-                schema_field = get_schema_field(self.resource.schema, key)
-                related_id_field = self.resource.schema._declared_fields[
-                    schema_field
-                ].id_field
+                schema_field = metadata.schema_fields[key]
+                related_id_field = get_related_id_field(
+                    self.resource.schema, schema_field
+                )
 
                 if isinstance(value, list):
-                    related_objects = []
-
-                    for identifier in value:
-                        related_object = self.get_related_object(
-                            related_model, related_id_field, {"id": identifier}
-                        )
-                        related_objects.append(related_object)
+                    related_objects = self.get_related_objects(
+                        related_model,
+                        related_id_field,
+                        [{"id": identifier} for identifier in value],
+                    )
 
                     relationships_to_apply.append(
                         {"field": key, "value": related_objects}
@@ -586,7 +1145,7 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
     def apply_nested_fields(self, data, obj):
         nested_fields_to_apply = []
-        nested_fields = get_nested_fields(self.resource.schema, model_field=True)
+        nested_fields = get_schema_metadata(self.resource.schema).nested_model_fields
         for key, value in data.items():
             if key in nested_fields:
                 nested_field_inspection = inspect(getattr(obj.__class__, key))
@@ -633,11 +1192,45 @@ class SqlalchemyDataLayer(BaseDataLayer):
         :return Query: the sorted query
         """
         if filter_info:
-            filters = create_filters(model, filter_info, self.resource)
+            filters = create_filters(
+                model, filter_info, self.resource, large_in=self.large_in_filter
+            )
             query = query.filter(*filters)
 
         return query
 
+    def large_in_filter(self, column, values, negate=False):
+        """Create filter of a column on a list of values longer than
+        ``large_in_threshold`` data layer parameter
+
+        ``large_in_strategy`` data layer parameter selects the strategy, "auto" binds
+        an array on PostgreSQL, joins VALUES on SQL Server and uses chunked IN lists
+        on other databases. See :func:`create_large_in_filter`. "array" and "values"
+        strategies raise an error on databases that don't support them.
+
+        :param InstrumentedAttribute column: the column to filter on
+        :param list values: the values
+        :param bool negate: create ``NOT IN`` filter
+        :return: the sqlalchemy filter or None to use a plain ``IN`` filter
+        """
+        threshold = getattr(self, "large_in_threshold", LARGE_IN_THRESHOLD)
+        if threshold is None or len(values) <= threshold:
+            return None
+
+        dialect = self.session.get_bind().dialect.name
+        strategy = getattr(self, "large_in_strategy", "auto")
+        if strategy == "auto":
+            strategy = LARGE_IN_DIALECT_STRATEGIES.get(dialect, "chunked")
+
+        if dialect not in LARGE_IN_STRATEGY_DIALECTS.get(strategy, (dialect,)):
+            raise Exception(
+                "large_in_strategy {} is not supported by {} database".format(
+                    strategy, dialect
+                )
+            )
+
+        return create_large_in_filter(column, values, strategy, negate)
+
     def sort_query(self, query, sort_info):
         """Sort query according to jsonapi 1.0
 
@@ -645,12 +1238,26 @@ class SqlalchemyDataLayer(BaseDataLayer):
         :param list sort_info: sort information
         :return Query: the sorted query
         """
-        order_conditions = []
+        query, sort_keys = self._sort_keys(query, sort_info)
 
-        for relation_path in sort_info:
-            relation_path["field"] = relation_path["field"].replace("-", "")
+        return query.order_by(
+            *(
+                desc(attribute) if order == "desc" else asc(attribute)
+                for attribute, order, _ in sort_keys
+            )
+        )
+
+    def _sort_keys(self, query, sort_info):
+        """Join relationships needed for sorting and collect attributes to sort on
 
-            relation_parts = relation_path["field"].split(".")
+        :param Query query: sqlalchemy query to sort
+        :param list sort_info: sort information
+        :return tuple: the query and list of (attribute, order, path) tuples
+        """
+        sort_keys = []
+
+        for relation_path in sort_info:
+            relation_parts = relation_path["field"].replace("-", "").split(".")
 
             current_model = self.model
 
@@ -670,12 +1277,173 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
             final_attribute = getattr(current_model, attribute_name)
 
-            if relation_path["order"] == "desc":
-                order_conditions.append(desc(final_attribute))
+            sort_keys.append((final_attribute, relation_path["order"], relation_parts))
+
+        return query, sort_keys
+
+    def keyset_sort_query(self, query, sort_info):
+        """Prepare query for keyset pagination
+
+        Sort keys are extended with primary key of the model so that they identify each
+        row uniquely. Ordering itself is applied in :meth:`keyset_paginate_query`.
+
+        :param Query query: sqlalchemy query to sort
+        :param list sort_info: sort information
+        :return tuple: the query and list of (attribute, order, path) tuples
+        """
+        query, sort_keys = self._sort_keys(query, sort_info)
+
+        for _, _, path in sort_keys:
+            current_model = self.model
+            for part in path[:-1]:
+                relation = getattr(current_model, part)
+                if relation.property.uselist:
+                    raise InvalidSort(
+                        "Cursor pagination can't sort through to-many relationship "
+                        "{}".format(part)
+                    )
+                current_model = relation.mapper.class_
+
+        mapper = inspect(self.model)
+        for column in mapper.primary_key:
+            key = mapper.get_property_by_column(column).key
+            if [key] not in [path for _, _, path in sort_keys]:
+                sort_keys.append((getattr(self.model, key), "asc", [key]))
+
+        return query, sort_keys
+
+    def keyset_paginate_query(self, query, sort_keys, paginate_info):
+        """Paginate query by seeking after (or before) row identified by a cursor
+
+        Unlike :meth:`paginate_query` it doesn't use OFFSET, so it performs equally on
+        any page of the collection. NULL values of nullable sort keys (and of sort keys
+        through relationships) are sorted as greater than any other value, ie. NULLS
+        LAST in ascending order and NULLS FIRST in descending order.
+
+        :param Query query: sqlalchemy queryset prepared by :meth:`keyset_sort_query`
+        :param list sort_keys: list of (attribute, order, path) tuples
+        :param dict paginate_info: pagination information
+        :return CursorPage: objects of the page
+        """
+        before = paginate_info.get("before")
+        after = paginate_info.get("after", paginate_info.get("cursor"))
+        backwards = before is not None
+        cursor = before if backwards else after
+
+        if cursor is not None:
+            parameter = "page[{}]".format(
+                "before"
+                if backwards
+                else ("after" if "after" in paginate_info else "cursor")
+            )
+            values = decode_cursor(cursor, len(sort_keys), parameter)
+            query = query.filter(self._keyset_filter(sort_keys, values, backwards))
+
+        query = query.order_by(
+            *(
+                self._keyset_order(attribute, order, path, backwards)
+                for attribute, order, path in sort_keys
+            )
+        )
+
+        if int(paginate_info.get("size", 1)) == 0:
+            return CursorPage(query.all())
+
+        page_size = int(paginate_info.get("size", 0)) or current_app.config["PAGE_SIZE"]
+
+        objects = query.limit(page_size + 1).all()
+        has_more = len(objects) > page_size
+        objects = objects[:page_size]
+
+        if backwards:
+            objects.reverse()
+            has_next, has_prev = True, has_more
+        else:
+            has_next, has_prev = has_more, cursor is not None
+
+        next_cursor = prev_cursor = None
+        if objects and has_next:
+            next_cursor = encode_cursor(self._keyset_values(objects[-1], sort_keys))
+        if objects and has_prev:
+            prev_cursor = encode_cursor(self._keyset_values(objects[0], sort_keys))
+
+        return CursorPage(objects, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+    @staticmethod
+    def _keyset_nullable(attribute, path):
+        """Check if a sort key can be NULL: nullable column or path through an outer
+        joined relationship
+        """
+        if len(path) > 1:
+            return True
+
+        columns = getattr(getattr(attribute, "property", None), "columns", None)
+        if not columns:
+            return True
+
+        return any(getattr(column, "nullable", True) for column in columns)
+
+    @classmethod
+    def _keyset_order(cls, attribute, order, path, backwards):
+        if (order == "desc") != backwards:
+            clause = desc(attribute)
+            if cls._keyset_nullable(attribute, path):
+                clause = clause.nulls_first()
+        else:
+            clause = asc(attribute)
+            if cls._keyset_nullable(attribute, path):
+                clause = clause.nulls_last()
+
+        return clause
+
+    @classmethod
+    def _keyset_filter(cls, sort_keys, values, backwards):
+        conditions = []
+
+        for idx, (attribute, order, path) in enumerate(sort_keys):
+            value = values[idx]
+            nullable = cls._keyset_nullable(attribute, path)
+
+            # NULL is greater than any value
+            if (order == "desc") != backwards:
+                if value is None:
+                    condition = attribute.isnot(None)
+                else:
+                    condition = attribute < value
+            elif value is None:
+                condition = false()
             else:
-                order_conditions.append(asc(final_attribute))
+                condition = attribute > value
+                if nullable:
+                    condition = or_(condition, attribute.is_(None))
+
+            conditions.append(
+                and_(
+                    *(
+                        (
+                            previous.is_(None)
+                            if values[previous_idx] is None
+                            else previous == values[previous_idx]
+                        )
+                        for previous_idx, (previous, _, _) in enumerate(sort_keys[:idx])
+                    ),
+                    condition,
+                )
+            )
+
+        return or_(*conditions)
+
+    @staticmethod
+    def _keyset_values(obj, sort_keys):
+        values = []
+
+        for _, _, path in sort_keys:
+            value = obj
+            for part in path:
+                value = getattr(value, part, None)
+            values.append(value)
 
-        return query.order_by(*order_conditions)
+        return values
 
     def paginate_query(self, query, paginate_info):
         """Paginate query according to jsonapi 1.0
@@ -694,6 +1462,121 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         return query
 
+    def supports_window_count(self, qs):
+        """Check if count and page of collection can be fetched in single statement
+
+        Requires ``window_count`` data layer parameter, exact ``count_mode``, database
+        with window functions support and no sorting through relationships (their joins
+        would change number of counted rows).
+
+        :param QueryStringManager qs: a querystring manager to retrieve information from url
+        :return bool: True if ``count(*) OVER ()`` can be used
+        """
+        if not getattr(self, "window_count", False):
+            return False
+
+        if getattr(self, "count_mode", "exact") != "exact":
+            return False
+
+        if any("." in sort_info["field"] for sort_info in qs.sorting):
+            return False
+
+        dialect = self.session.get_bind().dialect
+        if dialect.name not in WINDOW_FUNCTION_DIALECTS:
+            return False
+
+        minimal_version = WINDOW_FUNCTION_DIALECTS[dialect.name]
+        if minimal_version is None:
+            return True
+
+        server_version = getattr(dialect, "server_version_info", None) or ()
+        return tuple(server_version) >= minimal_version
+
+    def window_count_paginate_query(self, query, paginate_info, count_query=None):
+        """Paginate query and count all objects in filtered collection in single statement
+
+        Total number of objects is selected with ``count(*) OVER ()`` next to each
+        object of the page. If the page is empty, objects are counted with separate query.
+
+        :param Query query: sqlalchemy queryset
+        :param dict paginate_info: pagination information
+        :param Query count_query: queryset to count objects with if page is empty
+        :return tuple: number of objects and list of objects of the page
+        """
+        rows = self.paginate_query(
+            query.add_columns(sqlalchemy.func.count().over().label("_object_count")),
+            paginate_info,
+        ).all()
+
+        if rows:
+            return rows[0][-1], [row[0] for row in rows]
+
+        if not paginate_info.get("number") or int(paginate_info["number"]) <= 1:
+            return 0, []
+
+        return self.count_query(query if count_query is None else count_query), []
+
+    def count_query(self, query):
+        """Count objects in filtered collection according to data layer ``count_mode``
+
+        Loader options and ordering of the query are ignored.
+
+        :param Query query: filtered sqlalchemy queryset
+        :return int: exact or estimated number of objects or None if not counted
+        """
+        count_mode = getattr(self, "count_mode", "exact")
+
+        if count_mode == "none":
+            return None
+
+        query = query.enable_eagerloads(False).order_by(None)
+
+        if count_mode == "estimated":
+            return self.estimate_count(query)
+
+        return query.count()
+
+    def estimate_count(self, query):
+        """Estimate number of objects returned by query
+
+        Uses ``count_estimator`` callable from data layer parameters if provided,
+        otherwise asks PostgreSQL query planner for its row estimate.
+
+        :param Query query: sqlalchemy queryset
+        :return int: estimated number of objects or None if it can't be estimated
+        """
+        count_estimator = getattr(self, "count_estimator", None)
+        if count_estimator is not None:
+            return count_estimator(query)
+
+        bind = query.session.get_bind()
+        if bind.dialect.name != "postgresql":
+            return None
+
+        plan = query.session.execute(Explain(query.statement)).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def probe_paginate_query(self, query, paginate_info):
+        """Paginate query and find out if there is a next page without counting objects
+
+        Fetches one object more than page size; its presence means there is a next page.
+
+        :param Query query: sqlalchemy queryset
+        :param dict paginate_info: pagination information
+        :return Page: objects of the page
+        """
+        if int(paginate_info.get("size", 1)) == 0:
+            return Page(query.all(), has_next=False)
+
+        page_size = int(paginate_info.get("size", 0)) or current_app.config["PAGE_SIZE"]
+
+        objects = self.paginate_query(query, paginate_info).limit(page_size + 1).all()
+
+        return Page(objects[:page_size], has_next=len(objects) > page_size)
+
     def eagerload_includes(self, query, qs):
         """Use eagerload feature of sqlalchemy to optimize data retrieval for include querystring parameter
 
@@ -709,22 +1592,19 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
             if "." in include:
                 current_schema = self.resource.schema
-                for field_name in include.split("."):
+                path = include.split(".")
+                for i, field_name in enumerate(path):
                     joinload_object = self._field_eager_loader(
-                        current_schema, field_name, joinload_object
+                        current_schema,
+                        field_name,
+                        joinload_object,
+                        ".".join(path[: i + 1]),
                     )
 
-                    related_schema_cls = get_related_schema(current_schema, field_name)
-                    if isinstance(related_schema_cls, SchemaABC):
-                        related_schema_cls = related_schema_cls.__class__
-                    else:
-                        related_schema_cls = class_registry.get_class(
-                            related_schema_cls
-                        )
-                    current_schema = related_schema_cls
+                    current_schema = get_related_schema_cls(current_schema, field_name)
             else:
                 joinload_object = self._field_eager_loader(
-                    self.resource.schema, include, None
+                    self.resource.schema, include, None, include
                 )
 
             if joinload_object:
@@ -732,7 +1612,40 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
         return query
 
-    def _field_eager_loader(self, schema, field_name, previous_loader=None):
+    def get_eager_loader_name(self, include_path, model_attribute=None):
+        """Get name of sqlalchemy loader used to eager load included relationship
+
+        Strategy is looked up by include path (ie. "computers.owner") in
+        ``eagerload_strategies`` data layer parameter and defaults to
+        ``eagerload_strategy`` data layer parameter ("joined" if not set). "auto"
+        strategy picks "selectin" for to-many and "joined" for to-one relationships.
+        Collections of resource managers with ``stream`` attribute are fetched with
+        ``yield_per``, which can't be used with "subquery" strategy nor with "joined"
+        strategy on to-many relationships: "selectin" is used instead.
+
+        :param str include_path: dotted path of relationship fields from resource schema
+        :param QueryableAttribute model_attribute: relationship attribute of the model
+        :return str: name of sqlalchemy loader function, ie. "selectinload"
+        """
+        strategy = getattr(self, "eagerload_strategies", {}).get(
+            include_path, getattr(self, "eagerload_strategy", "joined")
+        )
+
+        uselist = getattr(getattr(model_attribute, "property", None), "uselist", False)
+
+        if strategy == "auto":
+            strategy = "selectin" if uselist else "joined"
+
+        if getattr(getattr(self, "resource", None), "stream", False) and (
+            strategy == "subquery" or (strategy == "joined" and uselist)
+        ):
+            strategy = "selectin"
+
+        return EAGERLOAD_STRATEGIES[strategy]
+
+    def _field_eager_loader(
+        self, schema, field_name, previous_loader=None, include_path=None
+    ):
         try:
             model_attribute_name = get_model_field(schema, field_name)
         except Exception:
@@ -765,10 +1678,13 @@ class SqlalchemyDataLayer(BaseDataLayer):
         # elif model_attribute:
 
         if model_attribute:
+            strategy = self.get_eager_loader_name(
+                include_path or field_name, model_attribute
+            )
             if previous_loader is None:
-                loader = orm.joinedload(model_attribute)
+                loader = getattr(orm, strategy)(model_attribute)
             else:
-                loader = previous_loader.joinedload(model_attribute)
+                loader = getattr(previous_loader, strategy)(model_attribute)
 
         return loader
 
@@ -784,30 +1700,23 @@ class SqlalchemyDataLayer(BaseDataLayer):
 
             if "." in include:
                 current_schema = self.resource.schema
-                for obj in include.split("."):
+                path = include.split(".")
+                for i, obj in enumerate(path):
                     try:
                         field = get_model_field(current_schema, obj)
                     except Exception as e:
                         raise InvalidInclude(str(e))
 
+                    strategy = self.get_eager_loader_name(".".join(path[: i + 1]))
                     try:
                         if joinload_object is None:
-                            joinload_object = orm.joinedload(field)
+                            joinload_object = getattr(orm, strategy)(field)
                         else:
-                            joinload_object = joinload_object.joinedload(field)
+                            joinload_object = getattr(joinload_object, strategy)(field)
                     except sqlalchemy.exc.ArgumentError as e:
                         raise InvalidInclude(str(e))
 
-                    related_schema_cls = get_related_schema(current_schema, obj)
-
-                    if isinstance(related_schema_cls, SchemaABC):
-                        related_schema_cls = related_schema_cls.__class__
-                    else:
-                        related_schema_cls = class_registry.get_class(
-                            related_schema_cls
-                        )
-
-                    current_schema = related_schema_cls
+                    current_schema = get_related_schema_cls(current_schema, obj)
             else:
                 try:
                     field = get_model_field(self.resource.schema, include)
@@ -815,7 +1724,9 @@ class SqlalchemyDataLayer(BaseDataLayer):
                     raise InvalidInclude(str(e))
 
                 try:
-                    joinload_object = orm.joinedload(field)
+                    joinload_object = getattr(orm, self.get_eager_loader_name(include))(
+                        field
+                    )
                 except sqlalchemy.exc.ArgumentError as e:
                     raise InvalidInclude(str(e))
 
@@ -831,14 +1742,18 @@ class SqlalchemyDataLayer(BaseDataLayer):
         :params filter_value: the value to filter with
         :return sqlalchemy query: a query from sqlalchemy
         """
-        return self.session.query(self.model).filter(filter_field == filter_value)
+        return (
+            self.get_read_session()
+            .query(self.model)
+            .filter(filter_field == filter_value)
+        )
 
     def query(self, view_kwargs):
         """Construct the base query to retrieve wanted data
 
         :param dict view_kwargs: kwargs from the resource view
         """
-        return self.session.query(self.model)
+        return self.get_read_session().query(self.model)
 
     def before_create_object(self, data, view_kwargs):
         """Provide additional data before object creation
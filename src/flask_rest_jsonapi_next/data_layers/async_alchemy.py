@@ -0,0 +1,96 @@
+"""SQLAlchemy data layer on asyncio sessions"""
+
+from contextvars import ContextVar
+
+from .alchemy import SqlalchemyDataLayer
+
+try:
+    from sqlalchemy.ext.asyncio import async_scoped_session
+except ImportError:  # pragma: no cover
+    async_scoped_session = None
+
+
+class AsyncSqlalchemyDataLayer(SqlalchemyDataLayer):
+    """SQLAlchemy data layer using an ``AsyncSession``
+
+    The ``session`` parameter is an ``AsyncSession`` or an ``async_scoped_session``.
+    Methods of the data layer are the ones of :class:`SqlalchemyDataLayer` and are
+    awaited through :meth:`run_sync`, which runs them with the synchronous session
+    of the ``AsyncSession`` in a greenlet: every database call made by the method,
+    including lazy loads during serialization and queries of hooks, is awaited on
+    the event loop. Async resource managers (:class:`~flask_rest_jsonapi_next.
+    resource.AsyncResourceList`...) run their whole http method this way.
+
+    Example::
+
+        objects = await data_layer.run_sync(data_layer.get_collection, qs, {})
+    """
+
+    def __init__(self, kwargs):
+        """Initialize an instance of AsyncSqlalchemyDataLayer
+
+        :param dict kwargs: initialization parameters of an AsyncSqlalchemyDataLayer
+            instance
+        """
+        self._sync_session = ContextVar(
+            "sync_session_{}".format(id(self)), default=None
+        )
+
+        super(AsyncSqlalchemyDataLayer, self).__init__(kwargs)
+
+    @property
+    def session(self):
+        """The synchronous session of the ``AsyncSession`` while running in
+        :meth:`run_sync`, otherwise the ``AsyncSession`` of the data layer
+        """
+        session = self._sync_session.get()
+        if session is not None:
+            return session
+
+        if "async_session" not in self.__dict__:
+            raise AttributeError("session")
+
+        return self.async_session
+
+    @session.setter
+    def session(self, session):
+        self.async_session = session
+
+    def get_async_session(self):
+        """Get the ``AsyncSession`` of the current scope
+
+        :return AsyncSession: the session
+        """
+        if async_scoped_session is not None and isinstance(
+            self.async_session, async_scoped_session
+        ):
+            return self.async_session()
+
+        return self.async_session
+
+    async def close_session(self):
+        """Close the ``AsyncSession``, removing it from its scope if it is scoped"""
+        if async_scoped_session is not None and isinstance(
+            self.async_session, async_scoped_session
+        ):
+            await self.async_session.remove()
+        else:
+            await self.async_session.close()
+
+    async def run_sync(self, func, *args, **kwargs):
+        """Run a synchronous function using the data layer and await its database
+        calls
+
+        :param callable func: the function, ie. a method of the data layer or an
+            http method of a resource manager
+        :return: the value returned by the function
+        """
+
+        def run(session):
+            token = self._sync_session.set(session)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._sync_session.reset(token)
+
+        return await self.get_async_session().run_sync(run)
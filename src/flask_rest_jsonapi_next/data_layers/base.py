@@ -52,6 +52,17 @@ class BaseDataLayer(object):
         """
         raise NotImplementedError
 
+    def create_objects(self, data, view_kwargs):
+        """Create objects, used by bulk creation
+
+        Default implementation creates objects one by one with :meth:`create_object`.
+
+        :param list data: the data validated by marshmallow, one dict per object
+        :param dict view_kwargs: kwargs from the resource view
+        :return list: the created objects
+        """
+        return [self.create_object(item, view_kwargs) for item in data]
+
     def get_object(self, view_kwargs):
         """Retrieve an object
 
@@ -5,30 +5,342 @@ from datetime import date, datetime
 from decimal import Decimal
 from typing import Iterable, Mapping, Union
 
+import sqlalchemy
 from dateutil import parser
-from sqlalchemy import and_, not_, or_
+from marshmallow import fields as ma_fields
+from sqlalchemy import all_, and_, any_, bindparam, not_, or_, select
+from sqlalchemy.dialects import postgresql
 
+from ...cache import LRUCache
 from ...exceptions import InvalidFilters
-from ...schema import get_model_field, get_nested_fields, get_relationships
+from ...schema import get_model_field, get_related_schema_cls, get_schema_metadata
 
+filter_cache = LRUCache()
 
-def create_filters(model, filter_info, resource):
+# Strategies of filters on large lists of values, see create_large_in_filter
+LARGE_IN_STRATEGIES = ("array", "values", "chunked")
+
+# Number of values in each IN list of the "chunked" strategy
+LARGE_IN_CHUNK_SIZE = 1000
+
+# Names of column operator methods filtering on a list of values, mapped to negate
+IN_OPERATORS = {"in_": False, "not_in": True, "notin_": True}
+
+
+def _parse_bool(value):
+    """Parse boolean from a querystring value"""
+    lowered = value.lower()
+    if lowered in ("true", "1"):
+        return True
+    if lowered in ("false", "0"):
+        return False
+
+    raise ValueError("{} is not a boolean".format(value))
+
+
+# python types of columns or schema fields mapped to functions parsing string values
+TYPE_PARSERS = {
+    bool: _parse_bool,
+    int: int,
+    float: float,
+    Decimal: Decimal,
+    datetime: parser.isoparse,
+    date: parser.isoparse,
+    str: str,
+}
+
+# schema field classes mapped to python types, used for columns of unknown type
+SCHEMA_FIELD_TYPES = (
+    (ma_fields.Boolean, bool),
+    (ma_fields.Integer, int),
+    (ma_fields.Float, float),
+    (ma_fields.Decimal, Decimal),
+    (ma_fields.Date, date),
+    (ma_fields.DateTime, datetime),
+    (ma_fields.String, str),
+)
+
+
+def create_filters(model, filter_info, resource, large_in=None):
     """Apply filters from filters information to base query
 
     :param DeclarativeMeta model: the model of the node
     :param dict filter_info: current node filter information
     :param Resource resource: the resource
+    :param callable large_in: function taking a column, a list of values and negate
+        flag and returning a filter for large lists of values or None to use ``IN``
     """
     filters = []
 
     for filter_ in filter_info:
-        resolved = Node(model, filter_, resource, resource.schema).resolve()
+        resolved = compile_filter(model, filter_, resource, resource.schema).bind(
+            filter_, large_in
+        )
         if resolved is not None:
             filters.append(resolved)
 
     return filters
 
 
+def compile_filter(model, filter_, resource, schema):
+    """Get compiled plan of a filter, see :meth:`Node.compile`
+
+    Plans only depend on the shape of the filter (names, operators and fields, not
+    values) so they are cached in :data:`filter_cache` by shape.
+
+    :param DeclarativeMeta model: the model of the node
+    :param dict filter_: filters information of the node and deeper nodes
+    :param Resource resource: the base resource to apply filters on
+    :param Schema schema: the serializer of the resource
+    :return: the compiled plan
+    """
+    if not filter_cache.maxsize:
+        return Node(model, filter_, resource, schema).compile()
+
+    try:
+        key = (model, schema, _filter_shape(filter_))
+    except TypeError:
+        return Node(model, filter_, resource, schema).compile()
+
+    plan = filter_cache.get(key)
+    if plan is None:
+        plan = Node(model, filter_, resource, schema).compile()
+        filter_cache.set(key, plan)
+
+    return plan
+
+
+def _filter_shape(filter_):
+    """Return hashable shape of a filter: the filter without values to filter on
+
+    Raise TypeError if the filter is malformed and can't be cached.
+    """
+    if not isinstance(filter_, Mapping):
+        raise TypeError("filter must be an object")
+
+    shape = []
+    for key, item in filter_.items():
+        if key in ("or", "and") and isinstance(item, list):
+            item = tuple(_filter_shape(filt) for filt in item)
+        elif key == "not" and isinstance(item, Mapping):
+            item = _filter_shape(item)
+        elif key == "val":
+            if isinstance(item, Mapping) and filter_.get("op") != "between":
+                item = _filter_shape(item)
+            else:
+                item = None
+        else:
+            hash(item)
+        shape.append((key, item))
+
+    return frozenset(shape)
+
+
+def create_large_in_filter(column, values, strategy, negate=False):
+    """Create filter of a column on a large list of values without one bind
+    parameter per value
+
+    * array: ``column = ANY(:values)`` binding a single array, PostgreSQL only
+    * values: ``column IN (SELECT value FROM (VALUES ...) AS in_values (value))``,
+      PostgreSQL and SQL Server only
+    * chunked: ``column IN (...) OR column IN (...)`` with values rendered inline in
+      lists of :data:`LARGE_IN_CHUNK_SIZE` values
+
+    :param InstrumentedAttribute column: the column to filter on
+    :param list values: the values
+    :param str strategy: one of :data:`LARGE_IN_STRATEGIES`
+    :param bool negate: create ``NOT IN`` filter
+    :return: the sqlalchemy filter
+    """
+    if strategy == "array":
+        array = bindparam(None, values, type_=postgresql.ARRAY(column.type))
+        return column != all_(array) if negate else column == any_(array)
+
+    if strategy == "values":
+        table = sqlalchemy.values(
+            sqlalchemy.column("value", column.type),
+            name="in_values",
+            literal_binds=True,
+        ).data([(value,) for value in values])
+        subquery = select(table.c.value)
+        return column.not_in(subquery) if negate else column.in_(subquery)
+
+    if strategy == "chunked":
+        chunks = [
+            bindparam(
+                None,
+                values[i : i + LARGE_IN_CHUNK_SIZE],
+                expanding=True,
+                literal_execute=True,
+            )
+            for i in range(0, len(values), LARGE_IN_CHUNK_SIZE)
+        ]
+        if negate:
+            return and_(*(column.not_in(chunk) for chunk in chunks))
+        return or_(*(column.in_(chunk) for chunk in chunks))
+
+    raise ValueError(
+        "Large IN strategy must be one of {}".format(", ".join(LARGE_IN_STRATEGIES))
+    )
+
+
+class TypedCoercer(object):
+    """Coerce values of a filter to the python type of the filtered column"""
+
+    __slots__ = ("parse", "fallback")
+
+    def __init__(self, parse, fallback):
+        """Initialize the coercer
+
+        :param callable parse: function parsing a string value, see :data:`TYPE_PARSERS`
+        :param callable fallback: heuristic coercion used when parsing fails
+        """
+        self.parse = parse
+        self.fallback = fallback
+
+    def __call__(self, value):
+        """Coerce a value, lists of strings are parsed in one pass
+
+        :param value: the value from the filter
+        :return: the coerced value
+        """
+        if isinstance(value, str):
+            try:
+                return self.parse(value)
+            except (TypeError, ValueError, ArithmeticError):
+                return self.fallback(value)
+
+        elif isinstance(value, Mapping):
+            return {k: self(v) for k, v in value.items()}
+
+        elif isinstance(value, Iterable):
+            if all(isinstance(item, str) for item in value):
+                try:
+                    return list(map(self.parse, value))
+                except (TypeError, ValueError, ArithmeticError):
+                    pass
+            return [self(item) for item in value]
+
+        else:
+            return value
+
+
+class CompiledEmpty(object):
+    """Compiled boolean node without operands, binds to None"""
+
+    __slots__ = ()
+
+    def bind(self, filter_, large_in=None):
+        """Return None, the node has no filter
+
+        :param dict filter_: filters information of the node
+        :param callable large_in: filter factory for large lists of values
+        """
+        return None
+
+
+class CompiledLeaf(object):
+    """Compiled filter on a column, only the value is bound on each request"""
+
+    __slots__ = (
+        "operator",
+        "column",
+        "kwarg",
+        "between",
+        "field",
+        "nested",
+        "coerce",
+        "negate_in",
+    )
+
+    def __init__(
+        self, operator, column, kwarg, between, field, nested, coerce, negate_in=None
+    ):
+        """Initialize the plan
+
+        :param callable operator: operator method of the column
+        :param InstrumentedAttribute column: the column to filter on
+        :param str kwarg: keyword to pass value with to the operator, if any
+        :param bool between: whether the operator is "between"
+        :param InstrumentedAttribute field: column to compare with instead of a value
+        :param nested: compiled plan of a filter on a related model
+        :param callable coerce: function coercing values from the querystring
+        :param bool negate_in: for ``IN`` operators, whether the operator is negated
+        """
+        self.operator = operator
+        self.column = column
+        self.kwarg = kwarg
+        self.between = between
+        self.field = field
+        self.nested = nested
+        self.coerce = coerce
+        self.negate_in = negate_in
+
+    def bind(self, filter_, large_in=None):
+        """Create filter from the value of the node
+
+        :param dict filter_: filters information of the node
+        :param callable large_in: filter factory for large lists of values, see
+            :func:`create_filters`
+        :return: the sqlalchemy filter
+        """
+        if self.field is not None:
+            value = self.field
+        elif self.nested is not None and not self.between:
+            value = self.nested.bind(filter_["val"], large_in)
+        else:
+            value = self.coerce(filter_["val"])
+
+        if (
+            large_in is not None
+            and self.negate_in is not None
+            and isinstance(value, list)
+        ):
+            resolved = large_in(self.column, value, self.negate_in)
+            if resolved is not None:
+                return resolved
+
+        if self.between:
+            return self.column.between(*value)
+
+        if self.kwarg is not None:
+            return self.operator(**{self.kwarg: value})
+
+        return self.operator(value)
+
+
+class CompiledBoolean(object):
+    """Compiled "or", "and" or "not" node"""
+
+    __slots__ = ("key", "combine", "operands")
+
+    def __init__(self, key, combine, operands):
+        """Initialize the plan
+
+        :param str key: key of operands in filter information
+        :param callable combine: sqlalchemy function combining operand filters
+        :param tuple operands: compiled plans of operands
+        """
+        self.key = key
+        self.combine = combine
+        self.operands = operands
+
+    def bind(self, filter_, large_in=None):
+        """Create filter from values of operand nodes
+
+        :param dict filter_: filters information of the node
+        :param callable large_in: filter factory for large lists of values
+        :return: the sqlalchemy filter
+        """
+        if self.key == "not":
+            return self.combine(self.operands[0].bind(filter_["not"], large_in))
+
+        return self.combine(
+            operand.bind(filt, large_in)
+            for operand, filt in zip(self.operands, filter_[self.key])
+        )
+
+
 class Node(object):
     """Helper to recursively create filters with sqlalchemy according to filter querystring parameter"""
 
@@ -47,48 +359,83 @@ class Node(object):
 
     def resolve(self):
         """Create filter for a particular node of the filter tree"""
+        return self.compile().bind(self.filter_)
+
+    def compile(self):
+        """Compile the node into a plan of column and operator callables
+
+        Names, operators and fields are validated and looked up once, the plan
+        only binds values of a filter with the same shape to create the filter.
+
+        :return: plan with a ``bind(filter_)`` method creating the filter
+        """
         if (
             "or" not in self.filter_
             and "and" not in self.filter_
             and "not" not in self.filter_
         ):
-            value = self.value
-
-            if self.operator == "between":
-                return self.column.between(*value)
-
-            if isinstance(value, dict):
-                value = Node(
-                    self.related_model, value, self.resource, self.related_schema
-                ).resolve()
+            field = self.value if self.filter_.get("field") is not None else None
+            if field is None and "val" not in self.filter_:
+                raise InvalidFilters("Can't find value or field in a filter")
 
+            column = self.column
+            between = self.op == "between"
+            nested = None
+            if (
+                field is None
+                and not between
+                and isinstance(self.filter_["val"], Mapping)
+            ):
+                nested = Node(
+                    self.related_model,
+                    self.filter_["val"],
+                    self.resource,
+                    self.related_schema,
+                ).compile()
+
+            kwarg = None
             if "__" in self.filter_.get("name", ""):
-                value = {self.filter_["name"].split("__")[1]: value}
+                kwarg = self.filter_["name"].split("__")[1]
+
+            operator = self._get_operator(column)
+            negate_in = None
+            if kwarg is None and field is None and nested is None:
+                negate_in = IN_OPERATORS.get(operator)
+
+            return CompiledLeaf(
+                getattr(column, operator),
+                column,
+                kwarg,
+                between,
+                field,
+                nested,
+                self._get_coercer(column),
+                negate_in,
+            )
 
-            if isinstance(value, dict):
-                return getattr(self.column, self.operator)(
-                    **{k: v for k, v in value.items()}
+        for key, combine in (("or", or_), ("and", and_)):
+            if key in self.filter_ and self.filter_[key]:
+                return CompiledBoolean(
+                    key,
+                    combine,
+                    tuple(
+                        Node(self.model, filt, self.resource, self.schema).compile()
+                        for filt in self.filter_[key]
+                    ),
                 )
-            else:
-                return getattr(self.column, self.operator)(value)
-
-        if "or" in self.filter_ and self.filter_["or"]:
-            return or_(
-                Node(self.model, filt, self.resource, self.schema).resolve()
-                for filt in self.filter_["or"]
-            )
-        if "and" in self.filter_ and self.filter_["and"]:
-            return and_(
-                Node(self.model, filt, self.resource, self.schema).resolve()
-                for filt in self.filter_["and"]
-            )
         if "not" in self.filter_ and self.filter_["not"]:
-            return not_(
-                Node(
-                    self.model, self.filter_["not"], self.resource, self.schema
-                ).resolve()
+            return CompiledBoolean(
+                "not",
+                not_,
+                (
+                    Node(
+                        self.model, self.filter_["not"], self.resource, self.schema
+                    ).compile(),
+                ),
             )
 
+        return CompiledEmpty()
+
     @property
     def name(self):
         """Return the name of the node or raise a BadRequest exception
@@ -146,13 +493,21 @@ class Node(object):
 
         :return callable: a callable to make operation on a column
         """
+        return self._get_operator(self.column)
+
+    def _get_operator(self, column):
+        """Get name of the operator method of a column
+
+        :param InstrumentedAttribute column: the column to filter on
+        :return str: name of the method
+        """
         operators = (self.op, self.op + "_", "__" + self.op + "__")
 
         for op in operators:
-            if hasattr(self.column, op):
+            if hasattr(column, op):
                 return op
 
-        raise InvalidFilters("{} has no operator {}".format(self.column.key, self.op))
+        raise InvalidFilters("{} has no operator {}".format(column.key, self.op))
 
     @property
     def value(self):
@@ -177,6 +532,37 @@ class Node(object):
 
             return self._coerce(self.filter_["val"])
 
+    def _get_coercer(self, column):
+        """Get function coercing values to filter a column on
+
+        Values are parsed according to the python type of the column or, if the type
+        of the column is unknown, of the schema field. :meth:`_coerce` heuristic is
+        used for other columns and for values that can't be parsed.
+
+        :param InstrumentedAttribute column: the column to filter on
+        :return callable: the function
+        """
+        try:
+            python_type = column.type.python_type
+        except (AttributeError, NotImplementedError):
+            python_type = None
+
+        if python_type not in TYPE_PARSERS:
+            schema_field = self.schema._declared_fields[self.name]
+            python_type = next(
+                (
+                    type_
+                    for field_cls, type_ in SCHEMA_FIELD_TYPES
+                    if isinstance(schema_field, field_cls)
+                ),
+                None,
+            )
+
+        if python_type is None:
+            return self._coerce
+
+        return TypedCoercer(TYPE_PARSERS[python_type], self._coerce)
+
     @classmethod
     def _coerce(
         cls, value: Union[Mapping, Iterable, str, int, float]
@@ -216,7 +602,7 @@ class Node(object):
         """
         related_field_name = self.name
 
-        related_fields = get_relationships(self.schema) + get_nested_fields(self.schema)
+        related_fields = get_schema_metadata(self.schema).related_fields
         if related_field_name not in related_fields:
             raise InvalidFilters(
                 "{} has no relationship or nested attribute {}".format(
@@ -235,7 +621,7 @@ class Node(object):
         :return Schema: the related schema
         """
         related_field_name = self.name
-        related_fields = get_relationships(self.schema) + get_nested_fields(self.schema)
+        related_fields = get_schema_metadata(self.schema).related_fields
         if related_field_name not in related_fields:
             raise InvalidFilters(
                 "{} has no relationship or nested attribute {}".format(
@@ -243,4 +629,4 @@ class Node(object):
                 )
             )
 
-        return self.schema._declared_fields[related_field_name].schema.__class__
+        return get_related_schema_cls(self.schema, related_field_name)
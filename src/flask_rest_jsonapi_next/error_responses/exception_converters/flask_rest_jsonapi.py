@@ -8,6 +8,21 @@ class _FlaskRestJsonApiExceptionConverter(ExceptionConverter):
         if not isinstance(exc, JsonApiException):
             raise ValueError()
 
+        if getattr(exc, "errors", None):
+            return [
+                {
+                    "title": error.get("title", exc.title),
+                    "detail": error.get("detail", ""),
+                    "http_status": error.get("status", exc.status),
+                    **{
+                        key: error[key]
+                        for key in ("source", "meta", "code")
+                        if error.get(key)
+                    },
+                }
+                for error in exc.errors
+            ]
+
         retv = dict(title=exc.title, detail=exc.detail, http_status=exc.status)
 
         if exc.source:
@@ -118,6 +118,29 @@ class InvalidType(JsonApiException):
     status = "409"
 
 
+class OperationFailed(JsonApiException):
+    """Error of an operation of an atomic request, carrying every error object of the
+    response of the operation
+    """
+
+    title = "Operation failed"
+
+    def __init__(self, errors, status=None):
+        """Initialize the error
+
+        :param list errors: error objects of the response of the operation
+        :param status: http status of the response of the operation
+        """
+        self.errors = errors
+        first = errors[0] if errors else dict()
+        super(OperationFailed, self).__init__(
+            detail=first.get("detail", ""),
+            source=first.get("source"),
+            title=first.get("title"),
+            status=status,
+        )
+
+
 class AccessDenied(JsonApiException):
     """Throw this error when requested resource owner doesn't match the user of the ticket"""
 
@@ -0,0 +1,103 @@
+"""JSON encoder backends used to serialize response documents"""
+
+import decimal
+import uuid
+
+import flask
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover
+    msgspec = None
+
+
+def _default(value):
+    """Serialize values not natively supported by fast encoders like Flask does"""
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+
+    if hasattr(value, "__html__"):
+        return str(value.__html__())
+
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(type(value).__name__)
+    )
+
+
+def _flask_dumps(value):
+    return flask.json.dumps(value)
+
+
+def _orjson_dumps(value):
+    return orjson.dumps(
+        value,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS,
+    )
+
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=_default, decimal_format="string")
+
+
+def _msgspec_dumps(value):
+    return _msgspec_encoder.encode(value)
+
+
+JSON_ENCODERS = {
+    "flask": _flask_dumps,
+    "orjson": _orjson_dumps if orjson is not None else None,
+    "msgspec": _msgspec_dumps if msgspec is not None else None,
+}
+
+
+def get_json_encoder(name=None):
+    """Get function serializing documents to JSON
+
+    "auto" picks first installed of orjson and msgspec and falls back to
+    ``flask.json.dumps``.
+
+    :param str name: name of encoder backend, defaults to ``JSON_ENCODER`` config key
+    :return callable: function returning JSON document as str or bytes
+    """
+    if name is None:
+        name = current_app.config.get("JSON_ENCODER", "flask")
+
+    if name == "auto":
+        return JSON_ENCODERS["orjson"] or JSON_ENCODERS["msgspec"] or _flask_dumps
+
+    if name not in JSON_ENCODERS:
+        raise ValueError(
+            "JSON_ENCODER must be one of auto, {}".format(", ".join(JSON_ENCODERS))
+        )
+
+    if JSON_ENCODERS[name] is None:
+        raise ValueError("JSON_ENCODER {} is not installed".format(name))
+
+    return JSON_ENCODERS[name]
+
+
+def json_dumps(value):
+    """Serialize document to JSON with encoder backend configured by ``JSON_ENCODER``
+
+    :param value: the document
+    :return: JSON document as str (Flask encoder) or bytes (other encoders)
+    """
+    return get_json_encoder()(value)
+
+
+def json_dumps_bytes(value):
+    """Serialize document to JSON bytes with configured encoder backend
+
+    :param value: the document
+    :return bytes: UTF-8 encoded JSON document
+    """
+    encoded = get_json_encoder()(value)
+
+    return encoded.encode("utf-8") if isinstance(encoded, str) else encoded
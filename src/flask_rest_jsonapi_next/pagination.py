@@ -2,23 +2,132 @@
 
 from __future__ import division
 
-from copy import copy
+import base64
+import binascii
+import datetime
+import json
+import uuid
+from decimal import Decimal
 from math import ceil
 from urllib.parse import urlencode
 
 from flask import current_app
 
+from .exceptions import BadRequest
 
-def add_pagination_links(data, object_count, querystring, base_url):
+CURSOR_PARAMETERS = ("cursor", "after", "before")
+
+
+class Page(list):
+    """Objects of one page of a collection
+
+    Used when total number of objects in collection is not known, carries information
+    needed for pagination links instead.
+    """
+
+    def __init__(self, objects=(), has_next=False):
+        """Initialize a page
+
+        :param iterable objects: objects in page
+        :param bool has_next: whether there is a next page
+        """
+        super().__init__(objects)
+        self.has_next = has_next
+
+
+class CursorPage(Page):
+    """Objects of one page of keyset paginated collection
+
+    Besides objects, it carries opaque cursors pointing to neighbouring pages.
+    """
+
+    def __init__(self, objects=(), next_cursor=None, prev_cursor=None):
+        """Initialize a page
+
+        :param iterable objects: objects in page
+        :param str next_cursor: cursor of the next page or None if there is no next page
+        :param str prev_cursor: cursor of the previous page or None if there is no
+            previous page
+        """
+        super().__init__(objects, has_next=next_cursor is not None)
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+_CURSOR_TYPES = (
+    ("datetime", datetime.datetime, datetime.datetime.fromisoformat),
+    ("date", datetime.date, datetime.date.fromisoformat),
+    ("time", datetime.time, datetime.time.fromisoformat),
+    ("decimal", Decimal, Decimal),
+    ("uuid", uuid.UUID, uuid.UUID),
+)
+
+
+def _encode_cursor_value(value):
+    for tag, type_, _ in _CURSOR_TYPES:
+        if isinstance(value, type_):
+            return {
+                tag: (
+                    value.isoformat()
+                    if tag in ("datetime", "date", "time")
+                    else str(value)
+                )
+            }
+    return value
+
+
+def _decode_cursor_value(value):
+    if isinstance(value, dict):
+        ((tag, raw),) = value.items()
+        for tag_, _, parse in _CURSOR_TYPES:
+            if tag == tag_:
+                return parse(raw)
+        raise ValueError(tag)
+    return value
+
+
+def encode_cursor(values):
+    """Encode values of sort keys of a row into an opaque cursor
+
+    :param list values: values of sort keys
+    :return str: the cursor
+    """
+    data = json.dumps([_encode_cursor_value(value) for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, length, parameter):
+    """Decode values of sort keys from a cursor
+
+    :param str cursor: the cursor
+    :param int length: expected number of sort keys
+    :param str parameter: querystring parameter that provided the cursor
+    :return list: values of sort keys
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = [_decode_cursor_value(value) for value in json.loads(data)]
+    except (binascii.Error, TypeError, ValueError, AttributeError):
+        raise BadRequest("Invalid cursor", source={"parameter": parameter})
+
+    if len(values) != length:
+        raise BadRequest("Invalid cursor", source={"parameter": parameter})
+
+    return values
+
+
+def add_pagination_links(data, object_count, querystring, base_url, page=None):
     """Add pagination links to result
 
     :param dict data: the result of the view
-    :param int object_count: number of objects in result
+    :param int object_count: number of objects in result or None if it is not known
     :param QueryStringManager querystring: the managed querystring fields and values
     :param str base_url: the base url for pagination
+    :param Page page: objects of current page, required if collection is keyset
+        paginated or if object_count is None
     """
     links = {}
-    all_qs_args = copy(querystring.querystring)
+    all_qs_args = dict(querystring.querystring)
 
     links["self"] = base_url
 
@@ -26,7 +135,39 @@ def add_pagination_links(data, object_count, querystring, base_url):
     if all_qs_args:
         links["self"] += "?" + urlencode(all_qs_args)
 
-    if querystring.pagination.get("size") != "0" and object_count > 1:
+    if isinstance(page, CursorPage):
+        for key in CURSOR_PARAMETERS:
+            all_qs_args.pop("page[{}]".format(key), None)
+
+        links["first"] = base_url
+        if all_qs_args:
+            links["first"] += "?" + urlencode(all_qs_args)
+
+        if page.prev_cursor is not None:
+            links["prev"] = "?".join(
+                (base_url, urlencode({**all_qs_args, "page[before]": page.prev_cursor}))
+            )
+        if page.next_cursor is not None:
+            links["next"] = "?".join(
+                (base_url, urlencode({**all_qs_args, "page[after]": page.next_cursor}))
+            )
+
+    elif querystring.pagination.get("size") != "0" and object_count is None:
+        all_qs_args.pop("page[number]", None)
+
+        links["first"] = base_url
+        if all_qs_args:
+            links["first"] += "?" + urlencode(all_qs_args)
+
+        current_page = int(querystring.pagination.get("number", 0)) or 1
+        if current_page > 1:
+            all_qs_args.update({"page[number]": current_page - 1})
+            links["prev"] = "?".join((base_url, urlencode(all_qs_args)))
+        if getattr(page, "has_next", False):
+            all_qs_args.update({"page[number]": current_page + 1})
+            links["next"] = "?".join((base_url, urlencode(all_qs_args)))
+
+    elif querystring.pagination.get("size") != "0" and object_count > 1:
         # compute last link
         page_size = (
             int(querystring.pagination.get("size", 0))
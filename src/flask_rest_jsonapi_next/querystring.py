@@ -1,8 +1,12 @@
 """Helper to deal with querystring parameters according to jsonapi specification"""
 
 import json
+import re
+from functools import cached_property
+from types import MappingProxyType
 
 from flask import current_app
+from werkzeug.datastructures import MultiDict
 
 from .exceptions import (
     BadRequest,
@@ -11,11 +15,18 @@ from .exceptions import (
     InvalidInclude,
     InvalidSort,
 )
-from .schema import get_model_field, get_relationships, get_schema_from_type
+from .pagination import CURSOR_PARAMETERS
+from .schema import get_model_field, get_schema_from_type, get_schema_metadata
 
 
 class QueryStringManager(object):
-    """Querystring parser according to jsonapi reference"""
+    """Querystring parser according to jsonapi reference
+
+    Each of parsed parameters (``filters``, ``pagination``, ``fields``, ``sorting``,
+    ``include`` and ``querystring``) is parsed and validated once, on first access,
+    and returned as read-only value afterwards. Invalid parameters are reported when
+    they are accessed, not when the manager is initialized.
+    """
 
     MANAGED_KEYS = ("filter", "page", "fields", "sort", "include", "q")
 
@@ -37,15 +48,32 @@ class QueryStringManager(object):
         self.allow_disable_pagination = allow_disable_pagination
         self.max_page_size = max_page_size
 
+        self._key_values = dict()
+
+    def _items(self):
+        """Return items of the querystring, including every value of repeated keys
+
+        :return iterable: key / value pairs
+        """
+        if isinstance(self.qs, MultiDict):
+            return self.qs.items(multi=True)
+
+        return self.qs.items()
+
     def _get_key_values(self, name):
         """Return a dict containing key / values items for a given key, used for items like filters, page, etc.
 
+        Values of repeated keys (``filter[id]=1&filter[id]=2``) are merged into a list.
+
         :param str name: name of the querystring parameter
-        :return dict: a dict of key / values items
+        :return dict: a read-only dict of key / values items
         """
+        if name in self._key_values:
+            return self._key_values[name]
+
         results = {}
 
-        for key, value in self.qs.items():
+        for key, value in self._items():
             try:
                 if not key.startswith(name):
                     continue
@@ -58,42 +86,74 @@ class QueryStringManager(object):
                     item_value = value.split(",")
                 else:
                     item_value = value
+
+                if item_key in results:
+                    previous_value = results[item_key]
+                    item_value = (
+                        previous_value
+                        if isinstance(previous_value, list)
+                        else [previous_value]
+                    ) + (item_value if isinstance(item_value, list) else [item_value])
                 results.update({item_key: item_value})
             except Exception:
                 raise BadRequest("Parse error", source={"parameter": key})
 
-        return results
+        self._key_values[name] = MappingProxyType(results)
+
+        return self._key_values[name]
+
+    _RE_IS_LIST_VALUE = re.compile(r"^\[(.+)\]$")
 
     def _simple_filters(self, dict_):
         """Return filter list
 
+        Comma separated values (``filter[id]=1,2``) and values in brackets
+        (``filter[id]=[1,2]``, integers are converted to int) are filtered with 'in'
+        operator.
+
         :return list: list of dict for filter parameters. Includes support for 'in' for list values
         """
         filter_list = []
         for key, value in dict_.items():
             operator = "eq"
-            if isinstance(value, list):
+            raw_value = ",".join(value) if isinstance(value, list) else value
+            list_match = self._RE_IS_LIST_VALUE.match(raw_value)
+            if list_match:
+                operator = "in"
+                value = list_match.group(1).split(",")
+                try:
+                    value = [int(item) for item in value]
+                except ValueError:
+                    pass
+            elif isinstance(value, list):
                 operator = "in"
             filter_list.append({"name": key, "op": operator, "val": value})
         return filter_list
 
-    @property
+    @cached_property
     def querystring(self):
         """Return original querystring but containing only managed keys
 
-        :return dict: dict of managed querystring parameter
+        :return dict: read-only dict of managed querystring parameter
         """
-        return {
-            key: value
-            for (key, value) in self.qs.items()
-            if key.startswith(self.MANAGED_KEYS) or self._get_key_values("filter[")
-        }
+        simple_filters = bool(self._get_key_values("filter["))
+
+        return MappingProxyType(
+            {
+                key: value
+                for (key, value) in self.qs.items()
+                if simple_filters or key.startswith(self.MANAGED_KEYS)
+            }
+        )
 
-    @property
+    @cached_property
     def filters(self):
         """Return filters from query string.
 
-        :return list: filter information
+        Filters of ``filter`` parameter (JSON) and simple filters (``filter[name]``)
+        are merged into single list.
+
+        :return tuple: filter information
         """
         results = []
         filters = self.qs.get("filter")
@@ -112,13 +172,13 @@ class QueryStringManager(object):
         if self._get_key_values("filter["):
             results.extend(self._simple_filters(self._get_key_values("filter[")))
 
-        return results
+        return tuple(results)
 
-    @property
+    @cached_property
     def pagination(self):
         """Return all page parameters as a dict.
 
-        :return dict: a dict of pagination information
+        :return dict: a read-only dict of pagination information
 
         To allow multiples strategies, all parameters starting with `page` will be included. e.g::
 
@@ -132,10 +192,23 @@ class QueryStringManager(object):
             >>> query_string = {'page[number]': '25', 'page[size]': '10'}
             >>> parsed_query.pagination
             {'number': '25', 'size': '10'}
+
+        Example with cursor strategy::
+
+            >>> query_string = {'page[after]': 'WzQyXQ', 'page[size]': '10'}
+            >>> parsed_query.pagination
+            {'after': 'WzQyXQ', 'size': '10'}
         """
         # check values type
         result = self._get_key_values("page")
         for key, value in result.items():
+            if key in CURSOR_PARAMETERS:
+                if not isinstance(value, str):
+                    raise BadRequest(
+                        "Parse error", source={"parameter": "page[{}]".format(key)}
+                    )
+                continue
+
             if key not in ("number", "size"):
                 raise BadRequest(
                     "{} is not a valid parameter of pagination".format(key),
@@ -143,11 +216,23 @@ class QueryStringManager(object):
                 )
             try:
                 int(value)
-            except ValueError:
+            except (TypeError, ValueError):
                 raise BadRequest(
                     "Parse error", source={"parameter": "page[{}]".format(key)}
                 )
 
+        cursors = [key for key in CURSOR_PARAMETERS if key in result]
+        if len(cursors) > 1 or (cursors and "number" in result):
+            raise BadRequest(
+                "Pagination parameters {} can't be used together".format(
+                    ", ".join(
+                        "page[{}]".format(key)
+                        for key in cursors + (["number"] if "number" in result else [])
+                    )
+                ),
+                source={"parameter": "page"},
+            )
+
         if self.allow_disable_pagination is None:
             self.allow_disable_pagination = current_app.config.get(
                 "ALLOW_DISABLE_PAGINATION", True
@@ -171,23 +256,23 @@ class QueryStringManager(object):
 
         return result
 
-    @property
+    @cached_property
     def fields(self):
         """Return fields wanted by client.
 
-        :return dict: a dict of sparse fieldsets information
+        :return dict: a read-only dict of sparse fieldsets information
 
         Return value will be a dict containing all fields by resource, for example::
 
             {
-                "user": ['name', 'email'],
+                "user": ('name', 'email'),
             }
 
         """
-        result = self._get_key_values("fields")
-        for key, value in result.items():
-            if not isinstance(value, list):
-                result[key] = [value]
+        result = {
+            key: tuple(value) if isinstance(value, list) else (value,)
+            for key, value in self._get_key_values("fields").items()
+        }
 
         for key, value in result.items():
             schema = get_schema_from_type(key)
@@ -197,24 +282,24 @@ class QueryStringManager(object):
                         "{} has no attribute {}".format(schema.__name__, obj)
                     )
 
-        return result
+        return MappingProxyType(result)
 
     _RELATIONSHIP_SEPARATOR = "."
 
-    @property
+    @cached_property
     def sorting(self):
         """
         Return fields to sort by, resolving nested relationships properly.
 
-        :return list: a list of sorting information
+        :return tuple: sorting information
 
         Example return value::
-            [
+            (
                 {'field': 'created_at', 'order': 'desc'},
-            ]
+            )
         """
         if not self.qs.get("sort"):
-            return []
+            return ()
 
         sorting_results = []
         for sort_field in self.qs["sort"].split(","):
@@ -228,20 +313,22 @@ class QueryStringManager(object):
                         f"{self.schema.__name__} has no attribute {sort_field}"
                     )
 
-                if sort_field in get_relationships(self.schema):
+                if sort_field in get_schema_metadata(self.schema).relationships:
                     raise InvalidSort(
                         f"{sort_field} is a relationship field and requires an attribute to sort on"
                     )
 
                 field = get_model_field(self.schema, sort_field)
-                sorting_results.append({"field": field, "order": order})
+                sorting_results.append(
+                    MappingProxyType({"field": field, "order": order})
+                )
 
             else:
                 fields = sort_field.split(self._RELATIONSHIP_SEPARATOR)
 
                 for idx, field in enumerate(fields):
                     is_last = idx == len(fields) - 1
-                    relationships = get_relationships(current_schema)
+                    relationships = get_schema_metadata(current_schema).relationships
 
                     if field in relationships:
                         if is_last:
@@ -261,20 +348,27 @@ class QueryStringManager(object):
                             f"You can't sort on {field} because it is not a relationship field"
                         )
 
-                sorting_results.append({"field": sort_field, "order": order})
+                sorting_results.append(
+                    MappingProxyType({"field": sort_field, "order": order})
+                )
 
-        return sorting_results
+        return tuple(sorting_results)
 
-    @property
+    @cached_property
     def include(self):
         """Return fields to include
 
-        :return list: a list of include information
+        :return tuple: include information
         """
-        include_param = self.qs.get("include", [])
+        include = tuple(
+            include_path
+            for key, value in self._items()
+            if key == "include" and value
+            for include_path in value.split(",")
+        )
 
         if current_app.config.get("MAX_INCLUDE_DEPTH") is not None:
-            for include_path in include_param:
+            for include_path in include:
                 if (
                     len(include_path.split("."))
                     > current_app.config["MAX_INCLUDE_DEPTH"]
@@ -285,4 +379,4 @@ class QueryStringManager(object):
                         )
                     )
 
-        return include_param.split(",") if include_param else []
+        return include
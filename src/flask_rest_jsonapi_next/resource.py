@@ -1,28 +1,67 @@
 """This module contains the logic of resource management"""
 
+import hashlib
 import inspect
-import re
-
-import flask
-from flask import make_response, request, url_for
+import itertools
+import tempfile
+
+from flask import (
+    current_app,
+    make_response,
+    request,
+    stream_with_context,
+    url_for,
+)
 from flask.views import MethodView
 from flask.wrappers import Response as FlaskResponse
 from marshmallow_jsonapi.fields import BaseRelationship
-from werkzeug.datastructures import ImmutableMultiDict
+from werkzeug.http import is_resource_modified
 from werkzeug.wrappers import Response
 
 from .data_layers.alchemy import SqlalchemyDataLayer
+from .data_layers.async_alchemy import AsyncSqlalchemyDataLayer
 from .data_layers.base import BaseDataLayer
 from .decorators import check_headers, check_method_requirements
 from .exceptions import BadRequest, InvalidType, RelationNotFound
+from .json_encoders import json_dumps, json_dumps_bytes
 from .pagination import add_pagination_links
 from .querystring import QueryStringManager as QSManager
-from .schema import compute_schema, get_model_field, get_relationships
+from .response_cache import response_cache
+from .schema import (
+    compute_schema,
+    get_model_field,
+    get_related_id_field,
+    get_related_schema_cls,
+    get_schema_metadata,
+)
+from .transaction import Transaction
+
+# Default number of objects fetched and serialized at once by streamed collections
+STREAM_CHUNK_SIZE = 1000
+
+# Size of included objects kept in memory by streamed collections before spooling
+# them to disk
+STREAM_SPOOL_SIZE = 1024 * 1024
 
 
 class Resource(MethodView):
     """Base resource class"""
 
+    # Class of the data layer when data_layer has no "class" key
+    default_data_layer_class = SqlalchemyDataLayer
+
+    # Conditional GET: if True, GET responses get ETag computed from the encoded
+    # document when no version of the objects is known
+    etag = False
+
+    # Model attributes holding version (ie. counter or update time) and last
+    # modification time of objects, used for ETag and Last-Modified of GET responses
+    version_field = None
+    last_modified_field = None
+
+    # If True, encoded documents of GET responses are kept in response cache
+    cache_responses = False
+
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
 
@@ -40,7 +79,7 @@ class Resource(MethodView):
                 )
 
             data_layer_cls = cls.__dict__["data_layer"].get(
-                "class", SqlalchemyDataLayer
+                "class", cls.default_data_layer_class
             )
             data_layer_kwargs = cls.__dict__["data_layer"]
             cls._data_layer = data_layer_cls(data_layer_kwargs)
@@ -60,14 +99,35 @@ class Resource(MethodView):
 
     def dispatch_request(self, *args, **kwargs):
         """Logic of how to handle a request"""
+        return self.make_jsonapi_response(self.call_method(args, kwargs))
+
+    def call_method(self, args, kwargs):
+        """Call the method of the resource manager handling the request
+
+        :param tuple args: args of the view
+        :param dict kwargs: kwargs of the view
+        :return: the value returned by the method
+        """
         method = getattr(self, request.method.lower(), None)
         if method is None and request.method == "HEAD":
             method = getattr(self, "get", None)
         assert method is not None, "Unimplemented method {}".format(request.method)
 
-        headers = {"Content-Type": "application/vnd.api+json"}
+        if request.method in ("GET", "HEAD") or not self.unit_of_work():
+            return method(*args, **kwargs)
+
+        with Transaction() as transaction:
+            transaction.join(getattr(self, "_data_layer", None))
+            return method(*args, **kwargs)
 
-        response = method(*args, **kwargs)
+    def make_jsonapi_response(self, response):
+        """Make the response from the value returned by the method of the request
+
+        :param response: a response, a document or a tuple (document, status code)
+            or (document, status code, headers)
+        :return Response: the response
+        """
+        headers = {"Content-Type": "application/vnd.api+json"}
 
         if isinstance(response, Response):
             if "Content-Type" not in response.headers:
@@ -77,7 +137,9 @@ class Resource(MethodView):
         if not isinstance(response, tuple):
             if isinstance(response, dict):
                 response.update({"jsonapi": {"version": "1.0"}})
-            return make_response(flask.json.dumps(response), 200, headers)
+            return self.make_conditional(
+                make_response(json_dumps(response), 200, headers)
+            )
 
         try:
             data, status_code, headers = response
@@ -102,9 +164,234 @@ class Resource(MethodView):
         elif isinstance(data, str):
             json_response = data
         else:
-            json_response = flask.json.dumps(data)
+            json_response = json_dumps(data)
+
+        return self.make_conditional(make_response(json_response, status_code, headers))
+
+    def probe_version(self, args, kwargs, qs):
+        """Get version of requested objects before they are queried
+
+        Override to enable conditional GET without querying objects when their
+        version can be found cheaply (ie. in a cache or a table of versions).
+
+        :param tuple args: args of the view
+        :param dict kwargs: kwargs of the view
+        :param QueryStringManager qs: a querystring manager
+        :return tuple: version and last modification time (datetime) of requested
+            objects, None if unknown. Last modification time of collections is
+            ignored, see :meth:`get_objects_version`
+        """
+        return None, None
+
+    def get_objects_version(self, objects, count=None, many=False):
+        """Get version of objects from ``version_field`` and ``last_modified_field``
+
+        Version of a collection is built from its count and identifiers of its
+        objects, so that it changes when objects are added or removed, and
+        collections have no last modification time: the latest modification of
+        remaining objects doesn't change when an object is removed.
+
+        :param list objects: the objects
+        :param int count: total number of objects in collection
+        :param bool many: True if objects are a page of a collection
+        :return tuple: version and last modification time of objects, None if
+            unknown
+        """
+        version_field = getattr(self, "version_field", None)
+        last_modified_field = getattr(self, "last_modified_field", None)
+
+        if many:
+            id_attribute = self.schema._declared_fields["id"].attribute or "id"
+            version = (
+                count,
+                tuple(
+                    (
+                        getattr(obj, id_attribute),
+                        getattr(obj, version_field, None) if version_field else None,
+                        (
+                            getattr(obj, last_modified_field, None)
+                            if last_modified_field
+                            else None
+                        ),
+                    )
+                    for obj in objects
+                ),
+            )
+            return version, None
+
+        version = None
+        if version_field is not None:
+            version = tuple(getattr(obj, version_field) for obj in objects)
+
+        last_modified = None
+        if last_modified_field is not None:
+            last_modified = max(
+                (
+                    getattr(obj, last_modified_field)
+                    for obj in objects
+                    if getattr(obj, last_modified_field) is not None
+                ),
+                default=None,
+            )
+
+        return version, last_modified
+
+    def is_not_modified(self, version, last_modified):
+        """Check conditional request headers against version of requested objects
+
+        Known version and last modification time are kept for ETag and
+        Last-Modified headers of the response.
+
+        :param version: version of requested objects or None if unknown
+        :param datetime last_modified: last modification time of requested objects or
+            None if unknown
+        :return bool: True if client has current representation of objects
+        """
+        if version is not None:
+            self._etag = hashlib.blake2b(
+                repr((request.full_path, version)).encode("utf-8"), digest_size=16
+            ).hexdigest()
+        if last_modified is not None:
+            self._last_modified = last_modified
+
+        etag = getattr(self, "_etag", None)
+        last_modified = getattr(self, "_last_modified", None)
+        if etag is None and last_modified is None:
+            return False
+
+        return not is_resource_modified(
+            request.environ, etag=etag, last_modified=last_modified
+        )
+
+    def not_modified_response(self):
+        """Make 304 Not Modified response with ETag and Last-Modified headers
+
+        :return Response: the response
+        """
+        return self._add_validators(make_response("", 304))
+
+    def make_conditional(self, response):
+        """Add ETag and Last-Modified headers to response of GET request and turn it
+        into 304 Not Modified response if client has current representation
+
+        :param Response response: the response
+        :return Response: the response
+        """
+        if request.method not in ("GET", "HEAD") or response.status_code != 200:
+            return response
+
+        if getattr(self, "_cache_key", None) is not None:
+            response_cache.set(
+                self._cache_key,
+                (
+                    response.get_data(),
+                    getattr(self, "_etag", None),
+                    getattr(self, "_last_modified", None),
+                ),
+            )
+
+        self._add_validators(response)
+        if getattr(self, "etag", False) and response.get_etag()[0] is None:
+            response.add_etag()
+
+        if response.get_etag()[0] is None and response.last_modified is None:
+            return response
+
+        return response.make_conditional(request)
+
+    def get_cached_response(self, args, kwargs, qs):
+        """Get response of GET request from response cache
+
+        Enabled by ``cache_responses`` attribute. On cache miss, the response of the
+        request is cached once made.
+
+        :param tuple args: args of the view
+        :param dict kwargs: kwargs of the view
+        :param QueryStringManager qs: a querystring manager
+        :return Response: the cached response or None
+        """
+        if not getattr(self, "cache_responses", False):
+            return None
+
+        key = self.get_response_cache_key(args, kwargs, qs)
+        if key is None:
+            return None
+
+        entry = response_cache.get(key)
+        if entry is None:
+            self._cache_key = key
+            return None
+
+        data, etag, last_modified = entry
+        if getattr(self, "_etag", None) is None:
+            self._etag = etag
+        if getattr(self, "_last_modified", None) is None:
+            self._last_modified = last_modified
+
+        return self.make_conditional(
+            make_response(data, 200, {"Content-Type": "application/vnd.api+json"})
+        )
+
+    def get_response_cache_key(self, args, kwargs, qs):
+        """Get key of response cache entry of GET request
+
+        Built from the endpoint, view kwargs and normalized querystring, with current
+        generations of the resource type and included resource types. Override to
+        add values the document depends on (ie. identity of the user), or return None
+        to skip the cache.
+
+        :param tuple args: args of the view
+        :param dict kwargs: kwargs of the view
+        :param QueryStringManager qs: a querystring manager
+        :return str: the key or None
+        """
+        types = {self.schema.opts.type_}
+        for include_path in qs.include:
+            schema = self.schema
+            for field in include_path.split("."):
+                relationship = schema._declared_fields.get(field)
+                if getattr(relationship, "type_", None) is None:
+                    break
+                types.add(relationship.type_)
+                schema = get_related_schema_cls(schema, field)
+
+        return response_cache.make_key(
+            [
+                request.host_url,
+                request.endpoint,
+                kwargs,
+                list(qs.filters),
+                dict(qs.pagination),
+                {type_: sorted(fields) for type_, fields in qs.fields.items()},
+                list(qs.sorting),
+                sorted(qs.include),
+            ],
+            types,
+        )
+
+    def _add_validators(self, response):
+        if getattr(self, "_etag", None) is not None:
+            response.set_etag(self._etag)
+        if getattr(self, "_last_modified", None) is not None:
+            response.last_modified = self._last_modified
+
+        return response
+
+    def unit_of_work(self):
+        """Whether writes of the request are committed once at the end of the request
+
+        Enabled by ``unit_of_work`` data layer parameter, defaults to
+        ``UNIT_OF_WORK`` configuration key. In unit of work mode the data layer
+        only flushes its session and the session is committed once after the
+        http method (hooks included) returned, or rolled back if it raised.
+
+        :return bool: True if unit of work mode is enabled
+        """
+        unit_of_work = getattr(getattr(self, "_data_layer", None), "unit_of_work", None)
+        if unit_of_work is None:
+            unit_of_work = current_app.config.get("UNIT_OF_WORK", False)
 
-        return make_response(json_response, status_code, headers)
+        return bool(unit_of_work)
 
 
 class ResourceList(Resource):
@@ -117,9 +404,29 @@ class ResourceList(Resource):
 
         qs = QSManager(request.args, self.schema)
 
+        # Collections have no Last-Modified, see get_objects_version
+        if self.is_not_modified(self.probe_version(args, kwargs, qs)[0], None):
+            return self.not_modified_response()
+
+        cached_response = self.get_cached_response(args, kwargs, qs)
+        if cached_response is not None:
+            return cached_response
+
         parent_filter = self._get_parent_filter(request.url, kwargs)
         objects_count, objects = self.get_collection(qs, kwargs, filters=parent_filter)
 
+        stream = getattr(self, "stream", False)
+        if not stream and (
+            getattr(self, "version_field", None) is not None
+            or getattr(self, "last_modified_field", None) is not None
+        ):
+            if not isinstance(objects, list):
+                objects = list(objects)
+            if self.is_not_modified(
+                *self.get_objects_version(objects, objects_count, many=True)
+            ):
+                return self.not_modified_response()
+
         schema_kwargs = getattr(self, "get_schema_kwargs", dict())
         schema_kwargs.update({"many": True})
 
@@ -127,33 +434,141 @@ class ResourceList(Resource):
 
         schema = compute_schema(self.schema, schema_kwargs, qs, qs.include)
 
-        result = schema.dump(objects)
+        result = dict() if stream else schema.dump(objects)
+
+        count_mode = getattr(self._data_layer, "count_mode", "exact")
+        if objects_count is None:
+            count_mode = "none"
 
         view_kwargs = (
             request.view_args if getattr(self, "view_kwargs", None) is True else dict()
         )
         add_pagination_links(
-            result, objects_count, qs, url_for(self.view, _external=True, **view_kwargs)
+            result,
+            objects_count if count_mode == "exact" else None,
+            qs,
+            url_for(self.view, _external=True, **view_kwargs),
+            page=objects,
         )
 
-        result.update({"meta": {"count": objects_count}})
+        meta = {"count_mode": count_mode}
+        if objects_count is not None:
+            meta["count"] = objects_count
+        result.update({"meta": meta})
 
         final_result = self.after_get(result)
 
+        if stream and isinstance(final_result, dict):
+            return self._stream_collection(schema, objects, final_result)
+
         return final_result
 
+    def _stream_collection(self, schema, objects, result):
+        """Stream serialized collection in chunked response
+
+        Objects are fetched and serialized in chunks of ``stream_chunk_size``
+        objects. Included objects are spooled to temporary file until all objects
+        are written.
+
+        :param Schema schema: the schema used to serialize objects
+        :param objects: query or iterable of objects
+        :param dict result: top level members of document other than data and included
+        :return Response: streamed response
+        """
+        chunk_size = getattr(self, "stream_chunk_size", STREAM_CHUNK_SIZE)
+
+        if hasattr(objects, "yield_per"):
+            objects = objects.yield_per(chunk_size)
+
+        # Executes the query, so that database errors are raised before response
+        # headers are sent
+        objects = iter(objects)
+
+        def generate():
+            links = None
+            included_keys = set()
+
+            with tempfile.SpooledTemporaryFile(
+                max_size=STREAM_SPOOL_SIZE, mode="w+b"
+            ) as included:
+                yield b'{"data": ['
+
+                separator = b""
+                chunk = list(itertools.islice(objects, chunk_size))
+                while True:
+                    schema.included_data = dict()
+                    dumped = schema.dump(chunk)
+                    if links is None:
+                        links = dumped.get("links", dict())
+
+                    for item in dumped["data"]:
+                        yield separator + json_dumps_bytes(item)
+                        separator = b", "
+
+                    for key, item in schema.included_data.items():
+                        if key not in included_keys:
+                            included.write(
+                                (b", " if included_keys else b"")
+                                + json_dumps_bytes(item)
+                            )
+                            included_keys.add(key)
+
+                    if len(chunk) < chunk_size:
+                        break
+
+                    chunk = list(itertools.islice(objects, chunk_size))
+                    if not chunk:
+                        break
+
+                yield b"]"
+
+                if included_keys:
+                    yield b', "included": ['
+                    included.seek(0)
+                    for block in iter(lambda: included.read(STREAM_SPOOL_SIZE), b""):
+                        yield block
+                    yield b"]"
+
+            schema.included_data = dict()
+
+            result["links"] = {**links, **result.get("links", dict())}
+            result["jsonapi"] = {"version": "1.0"}
+            for key, value in result.items():
+                if key not in ("data", "included"):
+                    yield b", " + json_dumps_bytes(key) + b": " + json_dumps_bytes(
+                        value
+                    )
+
+            yield b"}"
+
+        return FlaskResponse(
+            stream_with_context(generate()),
+            200,
+            content_type="application/vnd.api+json",
+        )
+
     @check_method_requirements
     def post(self, *args, **kwargs):
-        """Create an object"""
+        """Create an object, or objects if bulk creation is enabled and data is a list"""
         json_data = request.get_json() or {}
 
         qs = QSManager(request.args, self.schema)
 
         self.before_marshmallow(args, kwargs)
 
+        bulk = (
+            getattr(self, "bulk_create", False)
+            and isinstance(json_data, dict)
+            and isinstance(json_data.get("data"), list)
+        )
+
+        schema_kwargs = getattr(self, "post_schema_kwargs", dict())
+        if bulk:
+            schema_kwargs = {**schema_kwargs, "many": True}
+
         schema = compute_schema(
             getattr(self, "post_schema", self.schema),
-            getattr(self, "post_schema_kwargs", dict()),
+            schema_kwargs,
             qs,
             qs.include,
         )
@@ -163,18 +578,21 @@ class ResourceList(Resource):
         self.before_post(args, kwargs, data=data)
 
         try:
-            obj = self.create_object(data, kwargs)
+            if bulk:
+                obj = self.create_objects(data, kwargs)
+            else:
+                obj = self.create_object(data, kwargs)
         except Exception:
             # Subclass can override self.create_object, but doesn't have to do it
             # correctly. Let's protect from that.
             self._data_layer.rollback()
             raise
 
-        result = getattr(self, "post_response_schema", self.schema)(many=False).dump(
-            obj
-        )
+        result = getattr(self, "post_response_schema", self.schema)(many=bulk).dump(obj)
 
-        if result["data"].get("links", {}).get("self"):
+        if bulk:
+            final_result = (result, 201)
+        elif result["data"].get("links", {}).get("self"):
             final_result = (result, 201, {"Location": result["data"]["links"]["self"]})
         else:
             final_result = (result, 201)
@@ -196,7 +614,7 @@ class ResourceList(Resource):
         for key, value in self.schema._declared_fields.items():
             if isinstance(value, BaseRelationship):
                 if value.type_ == parent_segment:
-                    return {value.id_field: parent_id}
+                    return {get_related_id_field(self.schema, key): parent_id}
 
         return {}
 
@@ -220,49 +638,21 @@ class ResourceList(Resource):
         pass
 
     def get_collection(self, qs, kwargs, filters=None, as_query=True):
-        """
-        Implements override for ResourceList that allows lists as
-        values for simple filters, ie. following query strings are supported:
-        ?filter[foobar_id]=1,2,3
-        """
-
-        request_args = ImmutableMultiDict(
-            self._transform_simple_filter(k, v) for k, v in qs.qs.items(multi=True)
-        )
-
-        qs = QSManager(
-            request_args, self.schema, qs.allow_disable_pagination, qs.max_page_size
-        )
+        """Get the collection from the data layer
 
+        Simple filters with lists as values, ie. ``?filter[foobar_id]=[1,2,3]``, are
+        parsed by the querystring manager, see :attr:`QueryStringManager.filters`.
+        """
         return self._data_layer.get_collection(
             qs, kwargs, filters=filters, as_query=as_query
         )
 
-    _RE_IS_SIMPLE_FILTER = re.compile(r"^filter\[([A-Za-z_-]+)\]$")
-    _RE_IS_LIST_VALUE = re.compile(r"^\[(.+)\]$")
-
-    def _transform_simple_filter(self, k, v):
-        key_match = self._RE_IS_SIMPLE_FILTER.match(k)
-        value_match = self._RE_IS_LIST_VALUE.match(v)
-
-        if key_match and value_match:
-            k = "filter"
-
-            try:
-                values = [int(_) for _ in value_match.groups()[0].split(",")]
-
-            except ValueError:
-                values = value_match.groups()[0].split(",")
-
-            v = flask.json.dumps(
-                [{"name": key_match.groups()[0], "op": "in", "val": values}]
-            )
-
-        return k, v
-
     def create_object(self, data, kwargs):
         return self._data_layer.create_object(data, kwargs)
 
+    def create_objects(self, data, kwargs):
+        return self._data_layer.create_objects(data, kwargs)
+
 
 class ResourceDetail(Resource):
     """Base class of a resource detail manager"""
@@ -274,8 +664,18 @@ class ResourceDetail(Resource):
 
         qs = QSManager(request.args, self.schema)
 
+        if self.is_not_modified(*self.probe_version(args, kwargs, qs)):
+            return self.not_modified_response()
+
+        cached_response = self.get_cached_response(args, kwargs, qs)
+        if cached_response is not None:
+            return cached_response
+
         obj = self.get_object(kwargs, qs)
 
+        if obj is not None and self.is_not_modified(*self.get_objects_version([obj])):
+            return self.not_modified_response()
+
         self.before_marshmallow(args, kwargs)
 
         schema = compute_schema(
@@ -622,7 +1022,7 @@ class ResourceRelationship(Resource):
         """Get useful data for relationship management"""
         relationship_field = request.path.split("/")[-1].replace("-", "_")
 
-        if relationship_field not in get_relationships(self.schema):
+        if relationship_field not in get_schema_metadata(self.schema).relationships:
             raise RelationNotFound(
                 "{} has no attribute {}".format(
                     self.schema.__name__, relationship_field
@@ -630,7 +1030,7 @@ class ResourceRelationship(Resource):
             )
 
         related_type_ = self.schema._declared_fields[relationship_field].type_
-        related_id_field = self.schema._declared_fields[relationship_field].id_field
+        related_id_field = get_related_id_field(self.schema, relationship_field)
         model_relationship_field = get_model_field(self.schema, relationship_field)
 
         return (
@@ -671,3 +1071,55 @@ class ResourceRelationship(Resource):
     def after_delete(self, result, status_code):
         """Hook to make custom work after delete method"""
         return result, status_code
+
+
+class AsyncResource(Resource):
+    """Base class of async resource managers
+
+    Http methods and hooks are the ones of synchronous resource managers. They are
+    run by ``run_sync`` of the data layer (see
+    :class:`~flask_rest_jsonapi_next.data_layers.async_alchemy.AsyncSqlalchemyDataLayer`)
+    so that all their database calls are awaited, while the view itself is a
+    coroutine run by Flask async views support. The session of the data layer is
+    closed at the end of the request.
+    """
+
+    default_data_layer_class = AsyncSqlalchemyDataLayer
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        if getattr(cls, "_data_layer", None) is not None and not hasattr(
+            cls._data_layer, "run_sync"
+        ):
+            raise RuntimeError(
+                f"{cls.__name__}.data_layer['class'] must be an async data layer!"
+            )
+
+        if getattr(cls, "stream", False):
+            raise RuntimeError(f"{cls.__name__} can't stream collections!")
+
+    async def dispatch_request(self, *args, **kwargs):
+        """Logic of how to handle a request, awaiting database calls"""
+        data_layer = getattr(self, "_data_layer", None)
+        if data_layer is None:
+            response = self.call_method(args, kwargs)
+        else:
+            try:
+                response = await data_layer.run_sync(self.call_method, args, kwargs)
+            finally:
+                await data_layer.close_session()
+
+        return self.make_jsonapi_response(response)
+
+
+class AsyncResourceList(AsyncResource, ResourceList):
+    """Base class of an async resource list manager"""
+
+
+class AsyncResourceDetail(AsyncResource, ResourceDetail):
+    """Base class of an async resource detail manager"""
+
+
+class AsyncResourceRelationship(AsyncResource, ResourceRelationship):
+    """Base class of an async resource relationship manager"""
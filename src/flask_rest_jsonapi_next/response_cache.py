@@ -0,0 +1,115 @@
+"""Server side cache of GET responses, invalidated by writes of data layers"""
+
+import hashlib
+import json
+import uuid
+
+from .cache import LRUCache
+
+# Default maximal number of entries kept by in-process cache
+RESPONSE_CACHE_SIZE = 256
+
+# Default number of seconds cached responses are kept
+RESPONSE_CACHE_TIMEOUT = 300
+
+KEY_PREFIX = "flask_rest_jsonapi_next:"
+
+
+class ResponseCache(object):
+    """Cache of encoded documents of GET responses
+
+    Entries are stored in ``backend``, any object with ``get(key)`` and
+    ``set(key, value, timeout=None)`` methods (ie. a Flask-Caching ``Cache``), by
+    default in-process LRU cache. Keys of entries contain current generation of
+    every resource type of the document. Writes of a resource type replace its
+    generation, so that entries of previous generations are never read again and are
+    left to expiration and eviction of the backend.
+
+    Generations are stored in the backend as well: the in-process cache only sees
+    writes of its own process, so applications running several processes must use a
+    backend shared by all of them. Entries expire after ``timeout`` seconds anyway,
+    which bounds staleness of documents changed by writes made outside of data
+    layers.
+    """
+
+    def __init__(
+        self, backend=None, maxsize=RESPONSE_CACHE_SIZE, timeout=RESPONSE_CACHE_TIMEOUT
+    ):
+        """Initialize the cache
+
+        :param backend: the backend storing entries, None for in-process LRU cache
+        :param int maxsize: maximal number of entries of in-process LRU cache, 0
+            disables it
+        :param int timeout: number of seconds entries are kept
+        """
+        self.backend = backend
+        self.lru = LRUCache(maxsize)
+        self.timeout = timeout
+
+    def _get_backend(self):
+        return self.backend if self.backend is not None else self.lru
+
+    def get(self, key):
+        """Get cached entry
+
+        :param str key: the key, see :meth:`make_key`
+        :return: the entry or None
+        """
+        return self._get_backend().get(key)
+
+    def set(self, key, value):
+        """Store entry for ``timeout`` seconds
+
+        :param str key: the key, see :meth:`make_key`
+        :param value: the entry
+        """
+        self._get_backend().set(key, value, timeout=self.timeout)
+
+    def generation(self, type_):
+        """Get current generation of a resource type
+
+        :param str type_: the resource type
+        :return str: the generation
+        """
+        backend = self._get_backend()
+        key = "{}generation:{}".format(KEY_PREFIX, type_)
+
+        generation = backend.get(key)
+        if generation is None:
+            generation = uuid.uuid4().hex
+            backend.set(key, generation)
+
+        return generation
+
+    def invalidate(self, types):
+        """Invalidate entries of documents containing resource types
+
+        :param iterable types: the resource types
+        """
+        backend = self._get_backend()
+        for type_ in types:
+            backend.set("{}generation:{}".format(KEY_PREFIX, type_), uuid.uuid4().hex)
+
+    def make_key(self, parts, types):
+        """Build key of an entry
+
+        :param list parts: JSON serializable values identifying the document
+        :param iterable types: resource types contained in the document
+        :return str: the key
+        """
+        data = json.dumps(
+            [parts, [(type_, self.generation(type_)) for type_ in sorted(set(types))]],
+            sort_keys=True,
+            default=str,
+        )
+
+        return "{}response:{}".format(
+            KEY_PREFIX,
+            hashlib.blake2b(data.encode("utf-8"), digest_size=16).hexdigest(),
+        )
+
+
+#: Cache of GET responses of resource managers with ``cache_responses`` attribute,
+#: configured by ``RESPONSE_CACHE_SIZE``, ``RESPONSE_CACHE_TIMEOUT`` and
+#: ``RESPONSE_CACHE_BACKEND`` keys
+response_cache = ResponseCache()
@@ -1,33 +1,309 @@
 """Helpers to deal with marshmallow schemas"""
 
+import asyncio
+import threading
+import warnings
+import weakref
+from contextvars import ContextVar
+from functools import wraps
+from types import MappingProxyType
 from typing import Optional, Tuple
 
 from marshmallow import class_registry
 from marshmallow.base import SchemaABC
-from marshmallow_jsonapi.fields import List, Nested, Relationship
+from marshmallow_jsonapi.fields import _RECURSIVE_NESTED, List, Nested, Relationship
 
+from .cache import LRUCache
 from .exceptions import InvalidInclude
 
+# Serialization plans computed by compute_schema
+schema_cache = LRUCache()
 
-def compute_schema(schema_cls, default_kwargs, qs, include):
-    """Compute a schema around compound documents and sparse fieldsets
 
-    :param Schema schema_cls: the schema class
-    :param dict default_kwargs: the schema default kwargs
-    :param QueryStringManager qs: qs
-    :param list include: the relation field to include data from
+class DuplicateSchemaTypeWarning(UserWarning):
+    """Unrelated schema classes are registered for the same resource type"""
 
-    :return Schema schema: the schema computed
+
+class SchemaTypeIndex(object):
+    """Index of schema classes in ``marshmallow.class_registry`` by resource type
+
+    Kept up to date as schema classes are registered. If more schema classes have
+    the same resource type, the first registered one is indexed and the others are
+    available through :meth:`duplicates`.
+    """
+
+    def __init__(self):
+        self._schemas = dict()
+        self._duplicates = dict()
+        self._lock = threading.Lock()
+
+    def add(self, cls):
+        """Index schema class by its resource type
+
+        Warns with :class:`DuplicateSchemaTypeWarning` if the type is already indexed
+        for schema class that is not base class of ``cls``.
+
+        :param Schema cls: the schema class
+        """
+        type_ = getattr(getattr(cls, "opts", None), "type_", None)
+        if type_ is None:
+            return
+
+        with self._lock:
+            indexed = self._schemas.setdefault(type_, cls)
+            if indexed is cls or cls in self._duplicates.get(type_, ()):
+                return
+            self._duplicates.setdefault(type_, []).append(cls)
+
+        if not issubclass(cls, indexed):
+            warnings.warn(
+                DuplicateSchemaTypeWarning(
+                    "Schemas {} and {} have the same type: {}, type is resolved "
+                    "to {}".format(indexed, cls, type_, indexed)
+                )
+            )
+
+    def rebuild(self):
+        """Rebuild index from ``marshmallow.class_registry``"""
+        with self._lock:
+            self._schemas.clear()
+            self._duplicates.clear()
+
+        for classes in list(class_registry._registry.values()):
+            for cls in classes:
+                self.add(cls)
+
+    def get(self, resource_type, default=None):
+        """Return schema class for resource type
+
+        :param str resource_type: the type of the resource
+        :param default: returned if there is no schema for the type
+        :return Schema: the schema class
+        """
+        return self._schemas.get(resource_type, default)
+
+    def duplicates(self, resource_type):
+        """Return schema classes with resource type that are not indexed
+
+        :param str resource_type: the type of the resource
+        :return tuple: the schema classes in order of registration
+        """
+        return tuple(self._duplicates.get(resource_type, ()))
+
+    def __contains__(self, resource_type):
+        return resource_type in self._schemas
+
+
+schema_index = SchemaTypeIndex()
+
+
+class SchemaMetadata(object):
+    """Field metadata of a schema class computed once from its declared fields
+
+    Use :func:`get_schema_metadata` to get metadata of a schema class.
+    """
+
+    __slots__ = (
+        "schema_cls",
+        "model_fields",
+        "schema_fields",
+        "relationships",
+        "nested_fields",
+        "relationship_model_fields",
+        "nested_model_fields",
+        "related_fields",
+        "related_model_fields",
+    )
+
+    def __init__(self, schema_cls):
+        """Compute metadata of a schema class
+
+        :param Schema schema_cls: the schema class
+        """
+        declared_fields = schema_cls._declared_fields
+
+        object.__setattr__(self, "schema_cls", schema_cls)
+
+        #: schema field name -> model field name
+        model_fields = MappingProxyType(
+            {
+                key: key if field.attribute is None else field.attribute
+                for key, field in declared_fields.items()
+            }
+        )
+        object.__setattr__(self, "model_fields", model_fields)
+
+        #: model field name -> schema field name, first declared schema field wins
+        schema_fields = dict()
+        for key, model_field in model_fields.items():
+            schema_fields.setdefault(model_field, key)
+        object.__setattr__(self, "schema_fields", MappingProxyType(schema_fields))
+
+        relationships = tuple(
+            key
+            for key, field in declared_fields.items()
+            if isinstance(field, Relationship)
+        )
+        nested_fields = tuple(
+            key
+            for key, field in declared_fields.items()
+            if isinstance(field, (List, Nested))
+        )
+        object.__setattr__(self, "relationships", relationships)
+        object.__setattr__(self, "nested_fields", nested_fields)
+        object.__setattr__(
+            self,
+            "relationship_model_fields",
+            tuple(model_fields[key] for key in relationships),
+        )
+        object.__setattr__(
+            self,
+            "nested_model_fields",
+            tuple(model_fields[key] for key in nested_fields),
+        )
+        #: relationship and nested schema field names
+        object.__setattr__(
+            self, "related_fields", frozenset(relationships + nested_fields)
+        )
+        #: relationship and nested model field names
+        object.__setattr__(
+            self,
+            "related_model_fields",
+            frozenset(self.relationship_model_fields + self.nested_model_fields),
+        )
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SchemaMetadata is immutable")
+
+
+_schema_metadata = dict()
+
+
+def get_schema_metadata(schema):
+    """Get field metadata of a schema
+
+    Metadata is computed when schema class is registered in
+    ``marshmallow.class_registry`` or on first call and reused afterwards.
+
+    :param Schema schema: a marshmallow schema class or instance
+    :return SchemaMetadata: metadata of the schema class
+    """
+    schema_cls = schema if isinstance(schema, type) else schema.__class__
+
+    try:
+        return _schema_metadata[schema_cls]
+    except KeyError:
+        return _schema_metadata.setdefault(schema_cls, SchemaMetadata(schema_cls))
+
+
+def _watch_class_registry():
+    """Keep :data:`schema_index` and :data:`schema_cache` in sync with registry
+
+    Related schemas are resolved by name through ``marshmallow.class_registry`` so
+    (re)registering any schema class may change the outcome of cached computations.
+    """
+    register = class_registry.register
+    if getattr(register, "_clears_schema_cache", False):
+        return
+
+    @wraps(register)
+    def wrapper(classname, cls):
+        register(classname, cls)
+        schema_index.add(cls)
+        get_schema_metadata(cls)
+        schema_cache.clear()
+
+    wrapper._clears_schema_cache = True
+    class_registry.register = wrapper
+
+
+_watch_class_registry()
+schema_index.rebuild()
+
+
+def _freeze(value):
+    """Convert value into something hashable, raise TypeError if not possible"""
+    if isinstance(value, dict):
+        return frozenset((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(item) for item in value)
+    hash(value)
+    return value
+
+
+def _schema_cache_key(schema_cls, default_kwargs, qs, include):
+    """Build :data:`schema_cache` key or return None if request can't be cached"""
+    try:
+        return (
+            schema_cls,
+            _freeze(default_kwargs),
+            frozenset(include or ()),
+            frozenset(
+                (type_, frozenset(fields)) for type_, fields in qs.fields.items()
+            ),
+        )
+    except TypeError:
+        return None
+
+
+# Schema instance trees of plans reused by the current thread or asyncio task:
+# (owner task or None, WeakKeyDictionary of plan -> list of schema instances)
+_plan_schemas = ContextVar("flask_rest_jsonapi_next_plan_schemas", default=None)
+
+
+def _current_task():
+    """Get running asyncio task, None outside of event loop"""
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        return None
+
+
+class SerializationPlan(object):
+    """Immutable description of a tree of schemas computed for a request
+
+    Plan holds schema class and schema kwargs for each level of the compound document
+    and related plans for each included relationship. Plans are shared between
+    threads and requests, schema instances built from them are not: each thread, or
+    each asyncio task when requests are interleaved on an event loop (async resource
+    managers), gets its own instance tree from :meth:`schema`.
     """
-    # manage include_data parameter of the schema
-    schema_kwargs = default_kwargs
-    schema_kwargs["include_data"] = tuple()
 
-    # collect sub-related_includes
-    related_includes = {}
+    __slots__ = ("schema_cls", "schema_kwargs", "related", "__weakref__")
+
+    def __init__(self, schema_cls, schema_kwargs, related=()):
+        """Initialize a plan
+
+        :param Schema schema_cls: the schema class
+        :param dict schema_kwargs: kwargs used to instantiate the schema class
+        :param tuple related: tuple of (relationship field name, SerializationPlan)
+        """
+        object.__setattr__(self, "schema_cls", schema_cls)
+        object.__setattr__(self, "schema_kwargs", MappingProxyType(dict(schema_kwargs)))
+        object.__setattr__(self, "related", tuple(related))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SerializationPlan is immutable")
 
-    if include:
-        for include_path in include:
+    @classmethod
+    def compile(cls, schema_cls, default_kwargs, qs, include):
+        """Compute a plan around compound documents and sparse fieldsets
+
+        :param Schema schema_cls: the schema class
+        :param dict default_kwargs: the schema default kwargs
+        :param QueryStringManager qs: qs
+        :param list include: the relation field to include data from
+        :return SerializationPlan: the plan
+        """
+        schema_kwargs = dict(default_kwargs)
+        schema_kwargs["include_data"] = tuple()
+
+        # collect sub-related_includes
+        related_includes = {}
+
+        for include_path in include or ():
             field = include_path.split(".")[0]
 
             if field not in schema_cls._declared_fields:
@@ -41,44 +317,111 @@ def compute_schema(schema_cls, default_kwargs, qs, include):
                     )
                 )
 
-            schema_kwargs["include_data"] += (field,)
             if field not in related_includes:
+                schema_kwargs["include_data"] += (field,)
                 related_includes[field] = []
             if "." in include_path:
                 related_includes[field] += [".".join(include_path.split(".")[1:])]
 
-    only = _compute_sparse(schema_cls, default_kwargs, qs, include)
-    if only is not None:
-        schema_kwargs["only"] = only
-
-    # create base schema instance
-    schema = schema_cls(**schema_kwargs)
+        only = _compute_sparse(schema_cls, default_kwargs, qs, include)
+        if only is not None:
+            schema_kwargs["only"] = only
 
-    # manage compound documents
-    if include:
-        for include_path in include:
-            field = include_path.split(".")[0]
-            relation_field = schema.declared_fields[field]
-            related_schema_cls = schema.declared_fields[field].__dict__[
-                "_Relationship__schema"
-            ]
+        related = []
+        for field, field_includes in related_includes.items():
+            related_schema = get_related_schema(schema_cls, field)
             related_schema_kwargs = {}
             if "context" in default_kwargs:
                 related_schema_kwargs["context"] = default_kwargs["context"]
-            if isinstance(related_schema_cls, SchemaABC):
-                related_schema_kwargs["many"] = related_schema_cls.many
-                related_schema_cls = related_schema_cls.__class__
-            if isinstance(related_schema_cls, str):
-                related_schema_cls = class_registry.get_class(related_schema_cls)
-            related_schema = compute_schema(
-                related_schema_cls,
-                related_schema_kwargs,
-                qs,
-                related_includes[field] or None,
+            if isinstance(related_schema, SchemaABC):
+                related_schema_kwargs["many"] = related_schema.many
+            related.append(
+                (
+                    field,
+                    cls.compile(
+                        get_related_schema_cls(schema_cls, field),
+                        related_schema_kwargs,
+                        qs,
+                        field_includes or None,
+                    ),
+                )
             )
-            relation_field.__dict__["_Relationship__schema"] = related_schema
 
-    return schema
+        return cls(schema_cls, schema_kwargs, related)
+
+    def build(self):
+        """Build new schema instance tree described by this plan
+
+        :return Schema: the root schema instance
+        """
+        return self._build([])
+
+    def _build(self, schemas):
+        schema = self.schema_cls(**self.schema_kwargs)
+        schemas.append(schema)
+
+        for field, plan in self.related:
+            # Fields of a schema instance are its own deep copies of the class level
+            # declared fields, so binding related schema here doesn't leak into
+            # other instances.
+            schema.fields[field]._Relationship__schema = plan._build(schemas)
+
+        return schema
+
+    def schema(self):
+        """Return schema instance tree for current thread or asyncio task, ready to be
+        used
+
+        :return Schema: the root schema instance
+        """
+        task = _current_task()
+        state = _plan_schemas.get()
+        if state is None or state[0] is not task:
+            # Tasks inherit context of their parent, they must not share its schemas
+            state = (task, weakref.WeakKeyDictionary())
+            _plan_schemas.set(state)
+
+        schemas = state[1].get(self)
+
+        if schemas is None:
+            schemas = []
+            self._build(schemas)
+            state[1][self] = schemas
+        else:
+            for schema in schemas:
+                schema.included_data = {}
+                schema.document_meta = {}
+
+        return schemas[0]
+
+
+def compute_schema(schema_cls, default_kwargs, qs, include):
+    """Compute a schema around compound documents and sparse fieldsets
+
+    Computed plans are cached in :data:`schema_cache`, see :class:`SerializationPlan`.
+
+    :param Schema schema_cls: the schema class
+    :param dict default_kwargs: the schema default kwargs
+    :param QueryStringManager qs: qs
+    :param list include: the relation field to include data from
+
+    :return Schema schema: the schema computed
+    """
+    key = None
+    if schema_cache.maxsize:
+        key = _schema_cache_key(schema_cls, default_kwargs, qs, include)
+
+    plan = None
+    if key is not None:
+        plan = schema_cache.get(key)
+
+    if plan is None:
+        plan = SerializationPlan.compile(schema_cls, default_kwargs, qs, include)
+        if key is None:
+            return plan.build()
+        schema_cache.set(key, plan)
+
+    return plan.schema()
 
 
 def get_model_field(schema, field):
@@ -88,13 +431,11 @@ def get_model_field(schema, field):
     :param str field: the name of the schema field
     :return str: the name of the field in the model
     """
-    if schema._declared_fields.get(field) is None:
+    try:
+        return get_schema_metadata(schema).model_fields[field]
+    except KeyError:
         raise Exception("{} has no attribute {}".format(schema.__name__, field))
 
-    if schema._declared_fields[field].attribute is not None:
-        return schema._declared_fields[field].attribute
-    return field
-
 
 def get_nested_fields(schema, model_field=False):
     """Return nested fields of a schema to support a join
@@ -103,18 +444,12 @@ def get_nested_fields(schema, model_field=False):
     :param boolean model_field: whether to extract the model field for the nested fields
     :return list: list of nested fields of the schema
     """
-
-    nested_fields = []
-    for key, value in schema._declared_fields.items():
-        if isinstance(value, List):
-            nested_fields.append(key)
-        elif isinstance(value, Nested):
-            nested_fields.append(key)
+    metadata = get_schema_metadata(schema)
 
     if model_field is True:
-        nested_fields = [get_model_field(schema, key) for key in nested_fields]
+        return list(metadata.nested_model_fields)
 
-    return nested_fields
+    return list(metadata.nested_fields)
 
 
 def get_relationships(schema, model_field=False):
@@ -123,16 +458,12 @@ def get_relationships(schema, model_field=False):
     :param Schema schema: a marshmallow schema
     :param list: list of relationship fields of a schema
     """
-    relationships = [
-        key
-        for (key, value) in schema._declared_fields.items()
-        if isinstance(value, Relationship)
-    ]
+    metadata = get_schema_metadata(schema)
 
     if model_field is True:
-        relationships = [get_model_field(schema, key) for key in relationships]
+        return list(metadata.relationship_model_fields)
 
-    return relationships
+    return list(metadata.relationships)
 
 
 def get_related_schema(schema, field):
@@ -145,20 +476,77 @@ def get_related_schema(schema, field):
     return schema._declared_fields[field].__dict__["_Relationship__schema"]
 
 
+def get_related_schema_cls(schema, field):
+    """Retrieve the related schema class of a relationship or nested field
+
+    Unlike ``Relationship.schema`` and ``Nested.schema``, this doesn't instantiate and
+    store related schema on the field, which would mutate field declared on the schema
+    class.
+
+    :param Schema schema: the schema to retrieve the relationship field from
+    :param field: the relationship field, or nested field (possibly in a list)
+    :return Schema: the related schema class
+    """
+    declared_field = schema._declared_fields[field]
+    if isinstance(declared_field, List):
+        declared_field = declared_field.inner
+
+    if isinstance(declared_field, Nested):
+        related_schema = declared_field.nested
+        if callable(related_schema) and not isinstance(related_schema, type):
+            related_schema = related_schema()
+    else:
+        related_schema = get_related_schema(schema, field)
+
+    if isinstance(related_schema, SchemaABC):
+        return related_schema.__class__
+    if isinstance(related_schema, bytes):
+        related_schema = related_schema.decode()
+    if isinstance(related_schema, str):
+        if related_schema == _RECURSIVE_NESTED:
+            return schema if isinstance(schema, type) else schema.__class__
+        return class_registry.get_class(related_schema)
+
+    return related_schema
+
+
+def get_related_id_field(schema, field):
+    """Retrieve the identifier field of related model of a relationship field
+
+    Same as ``Relationship.id_field`` but doesn't mutate field declared on the schema
+    class.
+
+    :param Schema schema: the schema to retrieve the relationship field from
+    :param field: the relationship field
+    :return str: the name of the identifier field
+    """
+    relation_field = schema._declared_fields[field]
+
+    if not isinstance(relation_field, Relationship):
+        return relation_field.id_field
+
+    id_field = relation_field.__dict__.get("_Relationship__id_field")
+    if id_field:
+        return id_field
+
+    if get_related_schema(schema, field):
+        related_id = get_related_schema_cls(schema, field)._declared_fields["id"]
+        return related_id.attribute or relation_field.default_id_field
+
+    return relation_field.default_id_field
+
+
 def get_schema_from_type(resource_type):
     """Retrieve a schema from the registry by his type
 
     :param str type_: the type of the resource
     :return Schema: the schema class
     """
-    for cls_name, cls in class_registry._registry.items():
-        try:
-            if cls[0].opts.type_ == resource_type:
-                return cls[0]
-        except Exception:
-            pass
+    schema = schema_index.get(resource_type)
+    if schema is None:
+        raise ValueError("Couldn't find schema for type: {}".format(resource_type))
 
-    raise ValueError("Couldn't find schema for type: {}".format(resource_type))
+    return schema
 
 
 def get_schema_field(schema, field):
@@ -168,15 +556,10 @@ def get_schema_field(schema, field):
     :param str field: the name of the model field
     :return str: the name of the field in the schema
     """
-    schema_fields_to_model = {
-        key: get_model_field(schema, key)
-        for (key, value) in schema._declared_fields.items()
-    }
-    for key, value in schema_fields_to_model.items():
-        if value == field:
-            return key
-
-    raise ValueError("Couldn't find schema field from {}".format(field))
+    try:
+        return get_schema_metadata(schema).schema_fields[field]
+    except KeyError:
+        raise ValueError("Couldn't find schema field from {}".format(field))
 
 
 def _compute_sparse(
@@ -194,30 +577,26 @@ def _compute_sparse(
     read-only property: setting it's value after instance had been __init__-ialized
     has no effect.
     """
-    # manage include_data parameter of the schema
-    schema_kwargs = {k: v for k, v in (default_kwargs or dict()).items()}
-
-    only = schema_kwargs.get("only")
+    only = (default_kwargs or dict()).get("only")
     # make sure id field is in only parameter unless marshmallow will raise an Exception
     if only is not None and "id" not in only:
         only = set(only)
         only.add("id")
-        schema_kwargs["only"] = tuple(only)
-
-    schema = schema_cls(**schema_kwargs)
 
     # manage sparse fieldsets
-    if schema.opts.type_ in qs.fields:
-        only = set(schema.declared_fields.keys()) & set(qs.fields[schema.opts.type_])
-        if schema.only:
-            only &= set(schema.only)
+    if schema_cls.opts.type_ in qs.fields:
+        sparse = set(schema_cls._declared_fields.keys()) & set(
+            qs.fields[schema_cls.opts.type_]
+        )
+        if only:
+            sparse &= set(only)
 
-        if only is not None and "id" not in only:
-            only.add("id")
+        sparse.add("id")
+        only = sparse
 
     # manage compound documents
     if include and only is not None:
-        only = only.union(set(include))
+        only = set(only).union(set(include))
 
     if only is not None:
         return tuple(only)
@@ -0,0 +1,89 @@
+"""Deferred commits of data layer sessions, so that several writes are committed at once"""
+
+from .response_cache import response_cache
+
+# Key of ``session.info`` set while commits of the session are deferred
+DEFER_COMMIT_KEY = "flask_rest_jsonapi_next.defer_commit"
+
+# Key of ``session.info`` with resource types written while commits are deferred,
+# whose cached responses are invalidated once committed
+WRITTEN_TYPES_KEY = "flask_rest_jsonapi_next.written_types"
+
+
+class Transaction(object):
+    """Defer commits of data layers joining the transaction until it ends
+
+    While commits are deferred, data layers only flush their session. Sessions are
+    committed once when the transaction ends, or rolled back if it ends with an
+    error. Sessions whose commits are already deferred by an outer transaction are
+    left to the outer transaction.
+
+    Example::
+
+        with Transaction() as transaction:
+            transaction.join(data_layer)
+            data_layer.create_object(data, view_kwargs)
+    """
+
+    def __init__(self):
+        """Initialize a transaction without sessions"""
+        self.sessions = []
+
+    def join(self, data_layer):
+        """Defer commits of the session of a data layer
+
+        :param BaseDataLayer data_layer: the data layer, ignored if it has no session
+        """
+        session = getattr(data_layer, "session", None)
+        if session is None or session.info.get(DEFER_COMMIT_KEY):
+            return
+
+        session.info[DEFER_COMMIT_KEY] = True
+        self.sessions.append(session)
+
+    def commit(self):
+        """Commit sessions of the transaction one after the other
+
+        Cached responses of resource types written in a session are invalidated as
+        soon as the session is committed. If a commit fails, only sessions not
+        committed yet are rolled back: sessions committed before stay committed.
+        """
+        for index, session in enumerate(self.sessions):
+            try:
+                session.commit()
+            except Exception:
+                try:
+                    for session_ in self.sessions[index:]:
+                        session_.rollback()
+                finally:
+                    self._release()
+                raise
+
+            response_cache.invalidate(session.info.pop(WRITTEN_TYPES_KEY, ()))
+
+        self._release()
+
+    def rollback(self):
+        """Roll back sessions of the transaction"""
+        try:
+            for session in self.sessions:
+                session.rollback()
+        finally:
+            self._release()
+
+    def _release(self):
+        for session in self.sessions:
+            session.info.pop(DEFER_COMMIT_KEY, None)
+            session.info.pop(WRITTEN_TYPES_KEY, None)
+        self.sessions = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+        return False
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+from flask import Blueprint, Flask, json
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from flask_rest_jsonapi_next import (
+    Api,
+    AsyncResourceDetail,
+    AsyncResourceList,
+    AsyncResourceRelationship,
+    ResourceList,
+)
+
+from .factories.models import Computer, ComputerSchema, Person, PersonSchema
+from .factories.models.db import Base
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("asgiref")
+pytest.importorskip("greenlet")
+
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    async_scoped_session,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+ASYNC_SESSION = async_scoped_session(
+    async_sessionmaker(expire_on_commit=False), scopefunc=asyncio.current_task
+)
+
+
+class AsyncPersonList(AsyncResourceList):
+    schema = PersonSchema
+    data_layer = {"model": Person, "session": ASYNC_SESSION}
+
+
+class AsyncPersonDetail(AsyncResourceDetail):
+    schema = PersonSchema
+    data_layer = {"model": Person, "session": ASYNC_SESSION, "url_field": "person_id"}
+
+
+class AsyncPersonComputersRelationship(AsyncResourceRelationship):
+    schema = PersonSchema
+    data_layer = {"model": Person, "session": ASYNC_SESSION, "url_field": "person_id"}
+
+
+class AsyncComputerList(AsyncResourceList):
+    schema = ComputerSchema
+    data_layer = {"model": Computer, "session": ASYNC_SESSION}
+
+
+class AsyncComputerDetail(AsyncResourceDetail):
+    schema = ComputerSchema
+    data_layer = {"model": Computer, "session": ASYNC_SESSION}
+
+
+@pytest.fixture()
+def async_client(tmp_path):
+    url = "sqlite:///{}".format(tmp_path / "async.db")
+    Base.metadata.create_all(create_engine(url))
+    ASYNC_SESSION.session_factory.configure(
+        bind=create_async_engine(
+            url.replace("sqlite", "sqlite+aiosqlite"), poolclass=NullPool
+        )
+    )
+
+    app = Flask(__name__)
+    blueprint = Blueprint("api", __name__)
+    api = Api(blueprint=blueprint)
+    api.route(AsyncPersonList, "person_list", "/persons")
+    api.route(AsyncPersonDetail, "person_detail", "/persons/<int:person_id>")
+    api.route(
+        AsyncPersonComputersRelationship,
+        "person_computers",
+        "/persons/<int:person_id>/relationships/computers",
+    )
+    api.route(
+        AsyncComputerList,
+        "computer_list",
+        "/computers",
+        "/persons/<int:person_id>/computers",
+    )
+    api.route(AsyncComputerDetail, "computer_detail", "/computers/<int:id>")
+    api.init_app(app)
+
+    with app.test_client() as client:
+        yield client
+
+
+def test_async_resources(async_client):
+    response = async_client.post(
+        "/persons",
+        data=json.dumps({"data": {"type": "person", "attributes": {"name": "async"}}}),
+        content_type="application/vnd.api+json",
+    )
+    assert response.status_code == 201, response.json
+    person_id = response.json["data"]["id"]
+
+    response = async_client.post(
+        "/computers",
+        data=json.dumps(
+            {
+                "data": {
+                    "type": "computer",
+                    "attributes": {"serial": "async"},
+                    "relationships": {
+                        "owner": {"data": {"type": "person", "id": person_id}}
+                    },
+                }
+            }
+        ),
+        content_type="application/vnd.api+json",
+    )
+    assert response.status_code == 201, response.json
+    computer_id = response.json["data"]["id"]
+
+    response = async_client.get(
+        "/persons?include=computers", content_type="application/vnd.api+json"
+    )
+    assert response.status_code == 200, response.json
+    assert response.json["meta"]["count"] == 1
+    assert response.json["data"][0]["relationships"]["computers"]["data"] == [
+        {"type": "computer", "id": computer_id}
+    ]
+
+    response = async_client.patch(
+        "/persons/{}".format(person_id),
+        data=json.dumps(
+            {
+                "data": {
+                    "type": "person",
+                    "id": person_id,
+                    "attributes": {"name": "async_updated"},
+                }
+            }
+        ),
+        content_type="application/vnd.api+json",
+    )
+    assert response.status_code == 200, response.json
+    assert response.json["data"]["attributes"]["name"] == "async_updated"
+
+    response = async_client.get(
+        "/persons/{}/relationships/computers".format(person_id),
+        content_type="application/vnd.api+json",
+    )
+    assert response.status_code == 200, response.json
+    assert [str(item["id"]) for item in response.json["data"]] == [computer_id]
+
+    response = async_client.delete(
+        "/persons/{}".format(person_id), content_type="application/vnd.api+json"
+    )
+    assert response.status_code == 200, response.json
+
+    response = async_client.get(
+        "/persons/{}".format(person_id), content_type="application/vnd.api+json"
+    )
+    assert response.status_code == 404
+
+
+def test_async_resource_requires_async_data_layer():
+    with pytest.raises(RuntimeError):
+
+        class InvalidAsyncPersonList(AsyncResourceList):
+            schema = PersonSchema
+            data_layer = {
+                "class": ResourceList.default_data_layer_class,
+                "model": Person,
+                "session": ASYNC_SESSION,
+            }
+
+    with pytest.raises(RuntimeError):
+
+        class StreamedAsyncPersonList(AsyncResourceList):
+            schema = PersonSchema
+            data_layer = {"model": Person, "session": ASYNC_SESSION}
+            stream = True
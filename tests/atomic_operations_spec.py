@@ -0,0 +1,275 @@
+from flask import Blueprint, Flask, json, request
+
+from flask_rest_jsonapi_next import Api, ResourceList
+from flask_rest_jsonapi_next.atomic import ATOMIC_CONTENT_TYPE
+from flask_rest_jsonapi_next.exceptions import AccessDenied
+
+from .factories.models import APP_DB, Computer, Person, PersonSchema
+from .factories.resources import (
+    ComputerList,
+    PersonComputersRelationship,
+    PersonDetail,
+)
+
+
+def post_operations(client, operations):
+    return client.post(
+        "/operations",
+        data=json.dumps({"atomic:operations": operations}),
+        content_type=ATOMIC_CONTENT_TYPE,
+        headers={"Accept": ATOMIC_CONTENT_TYPE},
+    )
+
+
+def test_atomic_operations(client, api_middleware, db, computer):
+    operations = [
+        {
+            "op": "add",
+            "data": {"type": "person", "lid": "p1", "attributes": {"name": "atomic"}},
+        },
+        {
+            "op": "add",
+            "data": {
+                "type": "computer",
+                "attributes": {"serial": "atomic_serial"},
+                "relationships": {"owner": {"data": {"type": "person", "lid": "p1"}}},
+            },
+        },
+        {
+            "op": "update",
+            "data": {
+                "type": "person",
+                "lid": "p1",
+                "attributes": {"name": "atomic_updated"},
+            },
+        },
+        {
+            "op": "add",
+            "ref": {"type": "person", "lid": "p1", "relationship": "computers"},
+            "data": [{"type": "computer", "id": str(computer.id)}],
+        },
+    ]
+
+    with client:
+        response = post_operations(client, operations)
+        assert response.status_code == 200, response.json["errors"]
+        assert response.headers["Content-Type"] == ATOMIC_CONTENT_TYPE
+        results = response.json["atomic:results"]
+        person_id = results[0]["data"]["id"]
+        assert results[2]["data"]["id"] == person_id
+        assert results[2]["data"]["attributes"]["name"] == "atomic_updated"
+        assert results[3] == {}
+
+        db.session.expire_all()
+        person = db.session.get(Person, int(person_id))
+        assert person.name == "atomic_updated"
+        assert sorted(c.serial for c in person.computers) == sorted(
+            ["atomic_serial", computer.serial]
+        )
+
+        # ComputerDetail doesn't handle DELETE
+        response = post_operations(
+            client,
+            [
+                {
+                    "op": "remove",
+                    "ref": {"type": "computer", "id": results[1]["data"]["id"]},
+                }
+            ],
+        )
+        assert response.status_code == 400
+
+        db.session.query(Computer).filter_by(serial="atomic_serial").delete()
+        db.session.delete(person)
+        db.session.commit()
+
+
+def test_atomic_operations_rollback(client, api_middleware, db):
+    operations = [
+        {"op": "add", "data": {"type": "person", "attributes": {"name": "atomic"}}},
+        {
+            "op": "update",
+            "data": {"type": "person", "id": "9999", "attributes": {"name": "x"}},
+        },
+    ]
+
+    with client:
+        response = post_operations(client, operations)
+        assert response.status_code == 404
+        assert response.json["errors"][0]["source"]["pointer"].startswith(
+            "/atomic:operations/1"
+        )
+        assert db.session.query(Person).filter_by(name="atomic").count() == 0
+
+        operations[1] = {
+            "op": "add",
+            "data": {"type": "person", "attributes": {"birth_date": "invalid"}},
+        }
+        response = post_operations(client, operations)
+        assert response.status_code == 422
+        assert sorted(
+            error["source"]["pointer"] for error in response.json["errors"]
+        ) == [
+            "/atomic:operations/1/data/attributes/birth_date",
+            "/atomic:operations/1/data/attributes/name",
+        ]
+        assert db.session.query(Person).filter_by(name="atomic").count() == 0
+
+
+def test_atomic_operations_remove(client, api_middleware, db):
+    person = Person(name="atomic_removed")
+    db.session.add(person)
+    db.session.commit()
+
+    with client:
+        response = post_operations(
+            client,
+            [{"op": "remove", "ref": {"type": "person", "id": str(person.person_id)}}],
+        )
+        assert response.status_code == 204
+        assert db.session.query(Person).filter_by(name="atomic_removed").count() == 0
+
+
+def test_atomic_operations_invalid(client, api_middleware):
+    with client:
+        response = post_operations(client, [{"op": "move"}])
+        assert response.status_code == 400
+        assert response.json["errors"][0]["source"]["pointer"] == (
+            "/atomic:operations/0/op"
+        )
+
+        response = client.post(
+            "/operations",
+            data=json.dumps({"data": {}}),
+            content_type=ATOMIC_CONTENT_TYPE,
+        )
+        assert response.status_code == 400
+
+        response = post_operations(
+            client, [{"op": "add", "data": {"type": "unknown", "attributes": {}}}]
+        )
+        assert response.status_code == 400
+
+
+def test_atomic_operations_permission(db):
+    class ProtectedPersonList(ResourceList):
+        schema = PersonSchema
+        data_layer = {"model": Person, "session": APP_DB.session}
+
+    class UnprotectedComputerList(ComputerList):
+        disable_permission = True
+
+    class UnprotectedPersonComputers(PersonComputersRelationship):
+        disable_permission = True
+
+    class UnprotectedPersonDetail(PersonDetail):
+        disable_permission = True
+
+    checked = []
+
+    def permission_manager(view, view_args, view_kwargs, *args, **kwargs):
+        checked.append((request.method, request.path))
+        if request.path != "/operations" and (
+            request.headers.get("Authorization") != "admin"
+        ):
+            raise AccessDenied("Forbidden")
+
+    app = Flask(__name__)
+    api = Api(blueprint=Blueprint("api", __name__))
+    api.route(ProtectedPersonList, "person_list", "/persons")
+    api.route(UnprotectedPersonDetail, "person_detail", "/persons/<int:person_id>")
+    api.route(UnprotectedComputerList, "computer_list", "/computers")
+    api.route(
+        UnprotectedPersonComputers,
+        "person_computers",
+        "/persons/<int:person_id>/relationships/computers",
+    )
+    api.atomic_operations("/operations")
+    api.permission_manager(permission_manager)
+    api.init_app(app)
+
+    operations = [
+        {"op": "add", "data": {"type": "person", "attributes": {"name": "denied"}}}
+    ]
+    with app.test_client() as client:
+        response = post_operations(client, operations)
+        assert response.status_code == 403
+        assert response.json["errors"][0]["source"]["pointer"] == (
+            "/atomic:operations/0"
+        )
+        assert checked == [("POST", "/operations"), ("POST", "/persons")]
+        assert db.session.query(Person).filter_by(name="denied").count() == 0
+
+        response = client.post(
+            "/operations",
+            data=json.dumps({"atomic:operations": operations}),
+            content_type=ATOMIC_CONTENT_TYPE,
+            headers={"Authorization": "admin"},
+        )
+        assert response.status_code == 200, response.json
+        assert db.session.query(Person).filter_by(name="denied").count() == 1
+
+        db.session.query(Person).filter_by(name="denied").delete()
+        db.session.commit()
+
+
+def test_atomic_operations_request_hooks(db):
+    class HookedPersonList(ResourceList):
+        schema = PersonSchema
+        data_layer = {"model": Person, "session": APP_DB.session}
+
+    calls = []
+
+    app = Flask(__name__)
+    api = Api(blueprint=Blueprint("api", __name__))
+    api.route(HookedPersonList, "person_list", "/persons")
+    api.route(PersonDetail, "person_detail", "/persons/<int:person_id>")
+    api.route(ComputerList, "computer_list", "/computers")
+    api.atomic_operations("/operations")
+    api.init_app(app)
+
+    @app.after_request
+    def reject_persons(response):
+        calls.append(("after", request.path))
+        if request.path == "/persons" and request.headers.get("X-Reject"):
+            response = app.response_class(
+                json.dumps(
+                    {"errors": [{"status": "409", "title": "Rejected", "detail": "x"}]}
+                ),
+                409,
+                content_type="application/vnd.api+json",
+            )
+        return response
+
+    @app.teardown_request
+    def teardown(exc):
+        calls.append(("teardown", request.path))
+
+    operations = [
+        {"op": "add", "data": {"type": "person", "attributes": {"name": "hooked"}}}
+    ]
+    with app.test_client() as client:
+        response = post_operations(client, operations)
+        assert response.status_code == 200, response.json
+        assert calls == [
+            ("after", "/persons"),
+            ("teardown", "/persons"),
+            ("after", "/operations"),
+            ("teardown", "/operations"),
+        ]
+
+        response = client.post(
+            "/operations",
+            data=json.dumps({"atomic:operations": operations}),
+            content_type=ATOMIC_CONTENT_TYPE,
+            headers={"X-Reject": "1"},
+        )
+        assert response.status_code == 409
+        assert response.json["errors"][0]["title"] == "Rejected"
+        assert response.json["errors"][0]["source"]["pointer"] == (
+            "/atomic:operations/0"
+        )
+
+    assert db.session.query(Person).filter_by(name="hooked").count() == 1
+    db.session.query(Person).filter_by(name="hooked").delete()
+    db.session.commit()
@@ -12,6 +12,7 @@ from .models import db
 from .models.fixtures import (
     computer,
     computer_schema,
+    groups,
     person,
     person_2,
     person_model,
@@ -7,13 +7,24 @@ from .resources import (
     ComputerDetail,
     ComputerList,
     ComputerOwnerRelationship,
+    PersonBulkList,
+    PersonCachedList,
     PersonComputersRelationship,
+    PersonConditionalDetail,
+    PersonConditionalList,
     PersonDetail,
+    PersonEstimatedCountList,
+    PersonKeysetList,
     PersonList,
     PersonListMakeResponse,
     PersonListMakeResponseNoSchema,
     PersonListRaiseExc,
     PersonListRaiseJsonapiExc,
+    PersonStreamList,
+    PersonStreamModelList,
+    PersonUncountedList,
+    PersonUnitOfWorkList,
+    PersonWindowCountList,
     StringJsonAttributePersonDetail,
     StringJsonAttributePersonList,
 )
@@ -44,6 +55,29 @@ def api(api_blueprint):
 @pytest.fixture
 def register_routes(client, api, app, api_blueprint):
     api.route(PersonList, "person_list", "/persons")
+    api.route(PersonKeysetList, "person_keyset_list", "/persons_keyset")
+    api.route(PersonUncountedList, "person_uncounted_list", "/persons_uncounted")
+    api.route(
+        PersonEstimatedCountList,
+        "person_estimated_count_list",
+        "/persons_estimated_count",
+    )
+    api.route(
+        PersonWindowCountList, "person_window_count_list", "/persons_window_count"
+    )
+    api.route(PersonStreamList, "person_stream_list", "/persons_stream")
+    api.route(
+        PersonStreamModelList, "person_stream_model_list", "/persons_stream_model"
+    )
+    api.route(PersonBulkList, "person_bulk_list", "/persons_bulk")
+    api.route(PersonUnitOfWorkList, "person_unit_of_work_list", "/persons_unit_of_work")
+    api.route(PersonConditionalList, "person_conditional_list", "/persons_conditional")
+    api.route(PersonCachedList, "person_cached_list", "/persons_cached")
+    api.route(
+        PersonConditionalDetail,
+        "person_conditional_detail",
+        "/persons_conditional/<int:person_id>",
+    )
     api.route(PersonDetail, "person_detail", "/persons/<int:person_id>")
     api.route(
         PersonComputersRelationship,
@@ -89,6 +123,7 @@ def register_routes(client, api, app, api_blueprint):
         "string_json_attribute_person_detail",
         "/string_json_attribute_persons/<int:person_id>",
     )
+    api.atomic_operations("/operations")
 
 
 @pytest.fixture
@@ -1,6 +1,7 @@
-from .computer import Computer, ComputerSchema
+from .computer import Computer, ComputerModelSchema, ComputerSchema
 from .db import APP_DB, db
-from .person import Person, PersonSchema
+from .group import Group
+from .person import Person, PersonModelSchema, PersonSchema
 from .person_single_tag import PersonSingleTag, PersonSingleTagSchema
 from .person_tag import PersonTag, PersonTagSchema
 from .string_json_attribute_person import (
@@ -31,3 +31,22 @@ class ComputerSchema(Schema):
         id_field="person_id",
         type_="person",
     )
+
+
+class ComputerModelSchema(ComputerSchema):
+    class Meta:
+        type_ = "computer"
+        self_view = "api.computer_detail"
+        self_view_kwargs = {"id": "<id>"}
+        model = Computer
+
+    owner = Relationship(
+        attribute="person",
+        dump_default=None,
+        load_default=None,
+        related_view="api.person_detail",
+        related_view_kwargs={"person_id": "<person.person_id>"},
+        schema="PersonModelSchema",
+        id_field="person_id",
+        type_="person",
+    )
@@ -49,6 +49,7 @@ class Db:
 
     def _upgrade(self):
         from .computer import Computer
+        from .group import Group
         from .person import Person
         from .person_single_tag import PersonSingleTag
         from .person_tag import PersonTag
@@ -58,6 +59,7 @@ class Db:
         PersonSingleTag.metadata.create_all(self.engine)
         Person.metadata.create_all(self.engine)
         Computer.metadata.create_all(self.engine)
+        Group.metadata.create_all(self.engine)
         StringJsonAttributePerson.metadata.create_all(self.engine)
 
         self._upgraded = True
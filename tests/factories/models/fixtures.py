@@ -1,6 +1,7 @@
 import pytest
 
 from .computer import Computer, ComputerSchema
+from .group import Group
 from .person import Person, PersonSchema
 from .person_single_tag import PersonSingleTagSchema
 from .person_tag import PersonTagSchema
@@ -41,6 +42,17 @@ def computer(db):
     db.session.commit()
 
 
+@pytest.fixture()
+def groups(db):
+    groups_ = [Group(name="group_{}".format(i)) for i in range(3)]
+    db.session.add_all(groups_)
+    db.session.commit()
+    yield groups_
+    for group in groups_:
+        db.session.delete(group)
+    db.session.commit()
+
+
 @pytest.fixture()
 def computer_schema():
     return ComputerSchema
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, ForeignKey, Integer, String, Table
+
+from .db import Base
+
+person_group = Table(
+    "person_group",
+    Base.metadata,
+    Column("person_id", ForeignKey("person.person_id"), primary_key=True),
+    Column("group_id", ForeignKey("group.id"), primary_key=True),
+)
+
+
+class Group(Base):
+    __tablename__ = "group"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
@@ -4,6 +4,7 @@ from sqlalchemy import Column, DateTime, Integer, String
 from sqlalchemy.orm import relationship
 
 from .db import Base
+from .group import person_group
 from .person_single_tag import PersonSingleTagSchema
 from .person_tag import PersonTagSchema
 
@@ -15,6 +16,7 @@ class Person(Base):
     name = Column(String, nullable=False)
     birth_date = Column(DateTime)
     computers = relationship("Computer", backref="person")
+    groups = relationship("Group", secondary=person_group)
     tags = relationship(
         "PersonTag", cascade="save-update, merge, delete, delete-orphan"
     )
@@ -44,3 +46,19 @@ class PersonSchema(Schema):
 
     tags = fields.Nested(PersonTagSchema, many=True)
     single_tag = fields.Nested(PersonSingleTagSchema)
+
+
+class PersonModelSchema(PersonSchema):
+    class Meta:
+        type_ = "person"
+        self_view = "api.person_detail"
+        self_view_kwargs = {"person_id": "<id>"}
+        model = Person
+
+    computers = Relationship(
+        related_view="api.computer_list",
+        related_view_kwargs={"person_id": "<person_id>"},
+        schema="ComputerModelSchema",
+        type_="computer",
+        many=True,
+    )
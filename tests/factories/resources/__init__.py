@@ -1,12 +1,23 @@
 from .computer import ComputerDetail, ComputerList, ComputerOwnerRelationship
 from .person import (
+    PersonBulkList,
+    PersonCachedList,
     PersonComputersRelationship,
+    PersonConditionalDetail,
+    PersonConditionalList,
     PersonDetail,
+    PersonEstimatedCountList,
+    PersonKeysetList,
     PersonList,
     PersonListMakeResponse,
     PersonListMakeResponseNoSchema,
     PersonListRaiseExc,
     PersonListRaiseJsonapiExc,
+    PersonStreamList,
+    PersonStreamModelList,
+    PersonUncountedList,
+    PersonUnitOfWorkList,
+    PersonWindowCountList,
 )
 from .string_json_attribute_person import (
     StringJsonAttributePersonDetail,
@@ -7,7 +7,7 @@ from flask_rest_jsonapi_next import (
     ResourceRelationship,
 )
 
-from ..models import APP_DB, Person, PersonSchema
+from ..models import APP_DB, Computer, Person, PersonModelSchema, PersonSchema
 from .commons import dummy_decorator
 
 
@@ -27,6 +27,112 @@ class PersonList(ResourceList):
     post_schema_kwargs = dict()
 
 
+class PersonKeysetList(ResourceList):
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+        "pagination_strategy": "keyset",
+    }
+
+
+class PersonUncountedList(ResourceList):
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+        "count_mode": "none",
+    }
+
+
+class PersonEstimatedCountList(ResourceList):
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+        "count_mode": "estimated",
+        "count_estimator": lambda query: 42,
+    }
+
+
+class PersonWindowCountList(ResourceList):
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+        "window_count": True,
+    }
+
+
+class PersonStreamList(ResourceList):
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+    }
+    stream = True
+    stream_chunk_size = 2
+
+
+class PersonStreamModelList(ResourceList):
+    schema = PersonModelSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+    }
+    stream = True
+    stream_chunk_size = 2
+
+
+class PersonBulkList(ResourceList):
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+        "bulk_create_batch_size": 2,
+    }
+    bulk_create = True
+
+
+class PersonUnitOfWorkList(ResourceList):
+    def after_create_object(self, obj, data, view_kwargs):
+        self.session.add(Computer(serial="unit_of_work", person_id=obj.person_id))
+        self.commit()
+        if obj.name == "fail":
+            raise JsonApiException("Hook failed")
+
+    schema = PersonSchema
+    data_layer = {
+        "model": Person,
+        "session": APP_DB.session,
+        "unit_of_work": True,
+        "methods": {"after_create_object": after_create_object},
+    }
+
+
+class PersonConditionalList(ResourceList):
+    schema = PersonSchema
+    data_layer = {"model": Person, "session": APP_DB.session}
+    version_field = "name"
+    last_modified_field = "birth_date"
+
+
+class PersonCachedList(ResourceList):
+    schema = PersonSchema
+    data_layer = {"model": Person, "session": APP_DB.session}
+    cache_responses = True
+
+
+class PersonConditionalDetail(ResourceDetail):
+    def probe_version(self, args, kwargs, qs):
+        return self.versions.get(kwargs["person_id"]), None
+
+    schema = PersonSchema
+    data_layer = {"model": Person, "session": APP_DB.session, "url_field": "person_id"}
+    etag = True
+    versions = dict()
+
+
 class PersonDetail(ResourceDetail):
     def before_update_object(self, obj, data, view_kwargs):
         pass
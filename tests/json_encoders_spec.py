@@ -0,0 +1,56 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from flask import json
+
+from flask_rest_jsonapi_next.json_encoders import (
+    JSON_ENCODERS,
+    get_json_encoder,
+    json_dumps_bytes,
+)
+
+INSTALLED_ENCODERS = [name for name, encoder in JSON_ENCODERS.items() if encoder]
+
+
+@pytest.mark.parametrize("encoder", INSTALLED_ENCODERS)
+def test_json_encoder_responses(app, client, api_middleware, person, encoder):
+    with client:
+        expected = client.get("/persons", content_type="application/vnd.api+json")
+        expected_error = client.get(
+            "/persons/9999", content_type="application/vnd.api+json"
+        )
+
+        app.config["JSON_ENCODER"] = encoder
+        response = client.get("/persons", content_type="application/vnd.api+json")
+        assert response.status_code == 200, response.json["errors"]
+        assert response.json == expected.json
+
+        response = client.get("/persons/9999", content_type="application/vnd.api+json")
+        assert response.status_code == 404
+        assert response.json == expected_error.json
+
+
+@pytest.mark.parametrize("encoder", INSTALLED_ENCODERS)
+def test_json_encoder_values(app, encoder):
+    app.config["JSON_ENCODER"] = encoder
+    value = {
+        "decimal": decimal.Decimal("1.10"),
+        "uuid": uuid.UUID(int=1),
+        "date": datetime.date(2020, 1, 2),
+    }
+
+    with app.app_context():
+        decoded = json.loads(json_dumps_bytes(value))
+
+    assert decoded["decimal"] == "1.10"
+    assert decoded["uuid"] == "00000000-0000-0000-0000-000000000001"
+    assert "2020" in decoded["date"]
+
+
+def test_json_encoder_auto_and_invalid():
+    assert get_json_encoder("auto") in JSON_ENCODERS.values()
+
+    with pytest.raises(ValueError):
+        get_json_encoder("simplejson")
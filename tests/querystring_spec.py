@@ -1,11 +1,38 @@
+import asyncio
+import json
+import threading
+import warnings
+from datetime import datetime
+from decimal import Decimal
 from urllib.parse import parse_qs
 
 import pytest
+from werkzeug.datastructures import ImmutableMultiDict
 
+from flask_rest_jsonapi_next.cache import LRUCache
 from flask_rest_jsonapi_next.exceptions import BadRequest, InvalidInclude, InvalidSort
-from flask_rest_jsonapi_next.pagination import add_pagination_links
+from flask_rest_jsonapi_next.pagination import (
+    CursorPage,
+    add_pagination_links,
+    decode_cursor,
+    encode_cursor,
+)
 from flask_rest_jsonapi_next.querystring import QueryStringManager as QSManager
-from flask_rest_jsonapi_next.schema import compute_schema
+from flask_rest_jsonapi_next.schema import (
+    DuplicateSchemaTypeWarning,
+    SerializationPlan,
+    compute_schema,
+    get_model_field,
+    get_nested_fields,
+    get_related_id_field,
+    get_related_schema,
+    get_relationships,
+    get_schema_field,
+    get_schema_from_type,
+    get_schema_metadata,
+    schema_cache,
+    schema_index,
+)
 
 
 def test_qs_manager():
@@ -24,6 +51,30 @@ def test_add_pagination_links(app):
         assert last_page_dict["page[number]"][0] == "5"
 
 
+def test_add_cursor_pagination_links(app):
+    with app.app_context():
+        qs = {"page[after]": "abc", "page[size]": "10", "sort": "name"}
+        qsm = QSManager(qs, None)
+        pagination_dict = dict()
+        page = CursorPage([], next_cursor="next", prev_cursor=None)
+        add_pagination_links(pagination_dict, 43, qsm, str(), page=page)
+        links = pagination_dict["links"]
+        assert parse_qs(links["first"][1:]) == {"page[size]": ["10"], "sort": ["name"]}
+        assert parse_qs(links["next"][1:])["page[after]"] == ["next"]
+        assert "prev" not in links
+        assert "last" not in links
+
+
+def test_cursor_encoding():
+    values = [datetime(2020, 1, 2, 3, 4, 5), Decimal("1.5"), "foo", 42, None]
+    cursor = encode_cursor(values)
+    assert decode_cursor(cursor, len(values), "page[after]") == values
+    with pytest.raises(BadRequest):
+        decode_cursor(cursor, 1, "page[after]")
+    with pytest.raises(BadRequest):
+        decode_cursor("not a cursor", 1, "page[after]")
+
+
 def test_query_string_manager(person_schema):
     query_string = {"page[slumber]": "3"}
     qsm = QSManager(query_string, person_schema)
@@ -34,6 +85,95 @@ def test_query_string_manager(person_schema):
         qsm.sorting
 
 
+def test_query_string_manager_validates_on_access(app, person_schema, monkeypatch):
+    query_string = {"sort": "error", "include": "computers.owner", "page[size]": "x"}
+    monkeypatch.setitem(app.config, "MAX_INCLUDE_DEPTH", 1)
+    with app.app_context():
+        # Invalid parameters don't raise until they are read
+        qsm = QSManager(query_string, person_schema)
+        assert qsm.filters == ()
+        assert qsm.fields == {}
+
+        for name, error in (
+            ("sorting", InvalidSort),
+            ("include", InvalidInclude),
+            ("pagination", BadRequest),
+        ):
+            # Errors are not cached, each access raises
+            for _ in range(2):
+                with pytest.raises(error):
+                    getattr(qsm, name)
+
+
+def test_query_string_manager_parses_once(app, person_schema):
+    query_string = {
+        "page[number]": "3",
+        "page[size]": "10",
+        "fields[person]": "name,birth_date",
+        "filter[name]": "test",
+        "sort": "-name",
+        "include": "computers.owner",
+    }
+    with app.app_context():
+        qsm = QSManager(query_string, person_schema)
+        for name in ("filters", "pagination", "fields", "sorting", "include"):
+            assert getattr(qsm, name) is getattr(qsm, name)
+
+        assert qsm.pagination == {"number": "3", "size": "10"}
+        assert qsm.fields == {"person": ("name", "birth_date")}
+        assert qsm.include == ("computers.owner",)
+        assert qsm.filters == ({"name": "name", "op": "eq", "val": "test"},)
+        assert qsm.querystring == query_string
+
+        with pytest.raises(TypeError):
+            qsm.pagination["size"] = "20"
+        assert qsm.sorting == ({"field": "name", "order": "desc"},)
+        with pytest.raises(TypeError):
+            qsm.sorting[0]["order"] = "asc"
+        with pytest.raises(AttributeError):
+            qsm.sorting.append({"field": "birth_date", "order": "asc"})
+
+        app.config["MAX_INCLUDE_DEPTH"] = 1
+        with pytest.raises(InvalidInclude):
+            QSManager(query_string, person_schema).include
+        assert QSManager({"include": "computers"}, person_schema).include == (
+            "computers",
+        )
+
+
+def test_query_string_manager_simple_filters(person_schema):
+    query_string = {
+        "filter": json.dumps([{"name": "name", "op": "eq", "val": "test"}]),
+        "filter[id]": "[1,2]",
+        "filter[name]": "[a,b]",
+        "filter[birth_date]": "2000-01-01,2000-01-02",
+    }
+    assert QSManager(query_string, person_schema).filters == (
+        {"name": "name", "op": "eq", "val": "test"},
+        {"name": "id", "op": "in", "val": [1, 2]},
+        {"name": "name", "op": "in", "val": ["a", "b"]},
+        {"name": "birth_date", "op": "in", "val": ["2000-01-01", "2000-01-02"]},
+    )
+
+
+def test_query_string_manager_repeated_keys(app, person_schema):
+    query_string = ImmutableMultiDict(
+        [
+            ("filter[name]", "a"),
+            ("filter[name]", "b,c"),
+            ("fields[person]", "name"),
+            ("fields[person]", "birth_date"),
+            ("include", "computers"),
+            ("include", "computers.owner"),
+        ]
+    )
+    with app.app_context():
+        qsm = QSManager(query_string, person_schema)
+        assert qsm.filters == ({"name": "name", "op": "in", "val": ["a", "b", "c"]},)
+        assert qsm.fields == {"person": ("name", "birth_date")}
+        assert qsm.include == ("computers", "computers.owner")
+
+
 def test_compute_schema(person_schema):
     query_string = {"page[number]": "3", "fields[person]": list()}
     qsm = QSManager(query_string, person_schema)
@@ -46,28 +186,175 @@ def test_compute_schema_propagate_context(person_schema, computer_schema):
     query_string = {}
     qsm = QSManager(query_string, person_schema)
     schema = compute_schema(person_schema, dict(), qsm, ["computers"])
-    assert (
-        schema.declared_fields["computers"]
-        .__dict__["_Relationship__schema"]
-        .__dict__["context"]
-        == dict()
-    )
+    assert schema.fields["computers"].schema.context == dict()
     schema = compute_schema(
         person_schema, dict(context=dict(foo="bar")), qsm, ["computers"]
     )
-    assert schema.declared_fields["computers"].__dict__[
-        "_Relationship__schema"
-    ].__dict__["context"] == dict(foo="bar")
+    assert schema.fields["computers"].schema.context == dict(foo="bar")
+
+
+def test_compute_schema_does_not_mutate_declared_fields(person_schema):
+    qsm = QSManager({}, person_schema)
+    compute_schema(person_schema, dict(), qsm, ["computers.owner"])
+    get_related_id_field(person_schema, "computers")
+    assert get_related_schema(person_schema, "computers") == "ComputerSchema"
+
+
+def test_serialization_plan(person_schema, computer_schema):
+    qsm = QSManager({"fields[computer]": "serial"}, person_schema)
+    plan = SerializationPlan.compile(person_schema, dict(), qsm, ["computers.owner"])
+
+    assert plan.schema_kwargs["include_data"] == ("computers",)
+    ((field, related_plan),) = plan.related
+    assert field == "computers"
+    assert related_plan.schema_cls is computer_schema
+    assert set(related_plan.schema_kwargs["only"]) == {"id", "serial", "owner"}
+    with pytest.raises(AttributeError):
+        plan.related = ()
+
+    schema = plan.schema()
+    assert plan.schema() is schema
+    assert plan.build() is not schema
+    assert schema.fields["computers"].schema.fields["owner"].schema.include_data == ()
+
+    other_thread = []
+    thread = threading.Thread(target=lambda: other_thread.append(plan.schema()))
+    thread.start()
+    thread.join()
+    assert other_thread[0] is not schema
+
+    # Interleaved tasks of an event loop get their own schemas
+    async def task_schemas():
+        first = plan.schema()
+        await asyncio.sleep(0)
+        return first, plan.schema()
+
+    async def run_tasks():
+        return await asyncio.gather(task_schemas(), task_schemas())
+
+    (first, first_again), (second, second_again) = asyncio.run(run_tasks())
+    assert first is first_again
+    assert second is second_again
+    assert first is not second
+    assert schema not in (first, second)
+
+
+def test_compute_schema_cache(person_schema):
+    schema_cache.clear()
+    qsm = QSManager({"fields[computer]": "serial"}, person_schema)
+    before = schema_cache.info()
+
+    schema = compute_schema(person_schema, dict(), qsm, ["computers"])
+    schema.included_data[("computer", "1")] = {}
+    assert compute_schema(person_schema, dict(), qsm, ["computers"]) is schema
+    assert schema.included_data == dict()
+    assert (
+        compute_schema(person_schema, dict(many=True), qsm, ["computers"]) is not schema
+    )
+
+    info = schema_cache.info()
+    assert info["hits"] - before["hits"] == 1
+    assert info["misses"] - before["misses"] == 2
+    assert info["size"] == 2
+
+
+def test_schema_cache_eviction():
+    cache = LRUCache(maxsize=2)
+    for key in range(3):
+        cache.set(key, key)
+    assert cache.get(0) is None
+    assert cache.get(2) == 2
+    assert cache.info() == dict(hits=1, misses=1, evictions=1, size=2, maxsize=2)
+
+    cache.set(3, 3, timeout=-1)
+    assert cache.get(3) is None
+    cache.set(3, 3, timeout=60)
+    assert cache.get(3) == 3
+
+
+def test_schema_cache_cleared_on_registry_change(person_schema):
+    from marshmallow_jsonapi import Schema, fields
+
+    qsm = QSManager({}, person_schema)
+    compute_schema(person_schema, dict(), qsm, ["computers"])
+    assert schema_cache.info()["size"] > 0
+
+    class CacheClearingSchema(Schema):
+        class Meta:
+            type_ = "cache_clearing"
+
+        id = fields.Integer(as_string=True)
+
+    assert schema_cache.info()["size"] == 0
+
+
+def test_schema_index(person_schema):
+    from marshmallow_jsonapi import Schema, fields
+
+    assert get_schema_from_type("person") is person_schema
+    assert "person" in schema_index
+    with pytest.raises(ValueError):
+        get_schema_from_type("unknown")
+
+    class IndexedSchema(Schema):
+        class Meta:
+            type_ = "indexed"
+
+        id = fields.Integer(as_string=True)
+
+    assert schema_index.get("indexed") is IndexedSchema
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+
+        class IndexedVariantSchema(IndexedSchema):
+            pass
+
+    with pytest.warns(DuplicateSchemaTypeWarning):
+
+        class UnrelatedIndexedSchema(Schema):
+            class Meta:
+                type_ = "indexed"
+
+            id = fields.Integer(as_string=True)
+
+    assert schema_index.get("indexed") is IndexedSchema
+    assert schema_index.duplicates("indexed") == (
+        IndexedVariantSchema,
+        UnrelatedIndexedSchema,
+    )
+
+
+def test_schema_metadata(person_schema, computer_schema):
+    metadata = get_schema_metadata(person_schema)
+    assert metadata is get_schema_metadata(person_schema())
+    assert metadata.relationships == ("computers",)
+    assert metadata.nested_fields == ("tags", "single_tag")
+    assert metadata.model_fields["id"] == "person_id"
+    assert metadata.schema_fields["person_id"] == "id"
+    assert metadata.related_fields == {"computers", "tags", "single_tag"}
+    with pytest.raises(AttributeError):
+        metadata.relationships = ()
+
+    assert get_relationships(computer_schema) == ["owner"]
+    assert get_relationships(computer_schema, model_field=True) == ["person"]
+    assert get_nested_fields(person_schema, model_field=True) == ["tags", "single_tag"]
+    assert get_model_field(computer_schema, "owner") == "person"
+    assert get_schema_field(computer_schema, "person") == "owner"
+    with pytest.raises(Exception):
+        get_model_field(computer_schema, "unknown")
+    with pytest.raises(ValueError):
+        get_schema_field(computer_schema, "unknown")
 
 
 def test_query_string_manager_sorting_not_through_relationship(person_schema):
     query_string = {"sort": "name"}
     qsm = QSManager(query_string, person_schema)
-    assert qsm.sorting == [{"field": "name", "order": "asc"}]
+    assert qsm.sorting == ({"field": "name", "order": "asc"},)
 
     query_string = {"sort": "-name"}
     qsm = QSManager(query_string, person_schema)
-    assert qsm.sorting == [{"field": "name", "order": "desc"}]
+    assert qsm.sorting == ({"field": "name", "order": "desc"},)
 
     for sort_field in ["surname", "-surname"]:
         query_string = {"sort": sort_field}
@@ -79,11 +366,11 @@ def test_query_string_manager_sorting_not_through_relationship(person_schema):
 def test_query_string_manager_sorting_through_relationship(person_schema):
     query_string = {"sort": "computers.serial"}
     qsm = QSManager(query_string, person_schema)
-    assert qsm.sorting == [{"field": "computers.serial", "order": "asc"}]
+    assert qsm.sorting == ({"field": "computers.serial", "order": "asc"},)
 
     query_string = {"sort": "-computers.serial"}
     qsm = QSManager(query_string, person_schema)
-    assert qsm.sorting == [{"field": "computers.serial", "order": "desc"}]
+    assert qsm.sorting == ({"field": "computers.serial", "order": "desc"},)
 
     for sort_field in [
         "computers",
@@ -1,8 +1,11 @@
 import pytest
+import sqlalchemy
 from flask import json
 
 from flask_rest_jsonapi_next import ResourceDetail
 
+from .factories.resources import PersonConditionalDetail
+
 
 def test_get_detail(client, api_middleware, person):
     with client:
@@ -322,3 +325,50 @@ def test_detail_wrong_data_layer_inheritance(wrong_data_layer):
             data_layer = {"class": wrong_data_layer}
 
         PersonDetail()
+
+
+def test_get_detail_conditional(client, api_middleware, db, person):
+    url = "/persons_conditional/{}".format(person.person_id)
+    executions = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        executions.append(statement)
+
+    with client:
+        response = client.get(url, content_type="application/vnd.api+json")
+        assert response.status_code == 200, response.json["errors"]
+        etag = response.headers["ETag"]
+
+        response = client.get(
+            url,
+            content_type="application/vnd.api+json",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 304
+        assert not response.data
+
+        PersonConditionalDetail.versions[person.person_id] = 1
+        try:
+            response = client.get(url, content_type="application/vnd.api+json")
+            assert response.status_code == 200
+            assert response.headers["ETag"] != etag
+            etag = response.headers["ETag"]
+
+            sqlalchemy.event.listen(
+                db.engine, "before_cursor_execute", before_cursor_execute
+            )
+            try:
+                response = client.get(
+                    url,
+                    content_type="application/vnd.api+json",
+                    headers={"If-None-Match": etag},
+                )
+            finally:
+                sqlalchemy.event.remove(
+                    db.engine, "before_cursor_execute", before_cursor_execute
+                )
+            assert response.status_code == 304
+            assert response.headers["ETag"] == etag
+            assert not executions
+        finally:
+            PersonConditionalDetail.versions.clear()
@@ -1,7 +1,23 @@
-from urllib.parse import urlencode
+import datetime
+from urllib.parse import urlencode, urlsplit
 
+import pytest
+import sqlalchemy
 from flask import json
 
+from .factories.models import Computer, Person
+
+
+@pytest.fixture()
+def keyset_persons(db):
+    persons = [Person(name="keyset_{}".format(name)) for name in "abcde"]
+    db.session.add_all(persons)
+    db.session.commit()
+    yield persons
+    for person in persons:
+        db.session.delete(person)
+    db.session.commit()
+
 
 def test_get_list(client, api_middleware, person, person_2):
     with client:
@@ -47,6 +63,30 @@ def test_get_list(client, api_middleware, person, person_2):
         assert response.status_code == 200, response.json["errors"]
 
 
+def test_get_list_count_query_without_joins(db, client, api_middleware, person):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        with client:
+            response = client.get(
+                "/persons?sort=-computers.serial&include=computers",
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 200, response.json["errors"]
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+    (count_statement,) = [_ for _ in statements if "count(*)" in _]
+    assert "JOIN" not in count_statement
+    assert "ORDER BY" not in count_statement
+
+
 def test_get_list_with_simple_filter(client, api_middleware, person, person_2):
     with client:
         querystring = urlencode(
@@ -64,6 +104,23 @@ def test_get_list_with_simple_filter(client, api_middleware, person, person_2):
         assert response.status_code == 200, response.json["errors"]
 
 
+def test_get_list_with_simple_list_filter(client, api_middleware, person, person_2):
+    with client:
+        querystring = urlencode(
+            {
+                "filter[id]": "[{},{}]".format(person.person_id, person_2.person_id),
+                "filter": json.dumps(
+                    [{"name": "name", "op": "eq", "val": person.name}]
+                ),
+            }
+        )
+        response = client.get(
+            "/persons" + "?" + querystring, content_type="application/vnd.api+json"
+        )
+        assert response.status_code == 200, response.json["errors"]
+        assert [item["id"] for item in response.json["data"]] == [str(person.person_id)]
+
+
 def test_get_list_disable_pagination(client, api_middleware):
     with client:
         querystring = urlencode({"page[size]": 0})
@@ -73,6 +130,229 @@ def test_get_list_disable_pagination(client, api_middleware):
         assert response.status_code == 200, response.json["errors"]
 
 
+def test_get_list_keyset_pagination(client, api_middleware, keyset_persons):
+    querystring = urlencode(
+        {
+            "page[size]": 2,
+            "sort": "-name",
+            "filter": json.dumps([{"name": "name", "op": "like", "val": "keyset_%"}]),
+        }
+    )
+    url = "/persons_keyset?" + querystring
+    names = []
+
+    with client:
+        while url:
+            response = client.get(url, content_type="application/vnd.api+json")
+            assert response.status_code == 200, response.json["errors"]
+            names.append([_["attributes"]["name"] for _ in response.json["data"]])
+            assert response.json["meta"]["count"] == 5
+            next_link = response.json["links"].get("next")
+            url = "?".join(urlsplit(next_link)[2:4]) if next_link else None
+
+        assert names == [
+            ["keyset_e", "keyset_d"],
+            ["keyset_c", "keyset_b"],
+            ["keyset_a"],
+        ]
+
+        prev_link = response.json["links"]["prev"]
+        response = client.get(
+            "?".join(urlsplit(prev_link)[2:4]), content_type="application/vnd.api+json"
+        )
+        assert response.status_code == 200, response.json["errors"]
+        assert [_["attributes"]["name"] for _ in response.json["data"]] == [
+            "keyset_c",
+            "keyset_b",
+        ]
+        assert "prev" in response.json["links"]
+        assert "next" in response.json["links"]
+
+
+def test_get_list_keyset_pagination_nullable(
+    db, client, api_middleware, keyset_persons
+):
+    for index, person in enumerate(keyset_persons[:3]):
+        person.birth_date = datetime.datetime(2000, 1, 1 + index % 2)
+    db.session.commit()
+
+    ids = [str(person.person_id) for person in keyset_persons]
+    expected = {
+        "birth_date": [ids[0], ids[2], ids[1], ids[3], ids[4]],
+        "-birth_date": [ids[3], ids[4], ids[1], ids[0], ids[2]],
+    }
+
+    with client:
+        for sort, expected_ids in expected.items():
+            querystring = urlencode(
+                {
+                    "page[size]": 2,
+                    "sort": sort,
+                    "filter": json.dumps(
+                        [{"name": "name", "op": "like", "val": "keyset_%"}]
+                    ),
+                }
+            )
+            url = "/persons_keyset?" + querystring
+            pages = []
+            while url:
+                response = client.get(url, content_type="application/vnd.api+json")
+                assert response.status_code == 200, response.json["errors"]
+                pages.append([_["id"] for _ in response.json["data"]])
+                next_link = response.json["links"].get("next")
+                url = "?".join(urlsplit(next_link)[2:4]) if next_link else None
+
+            assert sum(pages, []) == expected_ids, sort
+
+            prev_link = response.json["links"]["prev"]
+            response = client.get(
+                "?".join(urlsplit(prev_link)[2:4]),
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 200, response.json["errors"]
+            assert [_["id"] for _ in response.json["data"]] == pages[-2], sort
+
+
+def test_get_list_without_count(client, api_middleware, keyset_persons):
+    querystring = {
+        "page[size]": 2,
+        "sort": "name",
+        "filter": json.dumps([{"name": "name", "op": "like", "val": "keyset_%"}]),
+    }
+
+    with client:
+        response = client.get(
+            "/persons_uncounted?" + urlencode(querystring),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 200, response.json["errors"]
+        assert response.json["meta"] == {"count_mode": "none"}
+        assert len(response.json["data"]) == 2
+        assert "next" in response.json["links"]
+        assert "prev" not in response.json["links"]
+        assert "last" not in response.json["links"]
+
+        querystring["page[number]"] = 3
+        response = client.get(
+            "/persons_uncounted?" + urlencode(querystring),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 200, response.json["errors"]
+        assert [_["attributes"]["name"] for _ in response.json["data"]] == ["keyset_e"]
+        assert "next" not in response.json["links"]
+        assert "prev" in response.json["links"]
+
+
+def test_get_list_estimated_count(client, api_middleware, keyset_persons):
+    with client:
+        response = client.get(
+            "/persons_estimated_count?page[size]=2",
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 200, response.json["errors"]
+        assert response.json["meta"] == {"count_mode": "estimated", "count": 42}
+        assert "next" in response.json["links"]
+        assert "last" not in response.json["links"]
+
+
+def test_get_list_window_count(db, client, api_middleware, keyset_persons):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    querystring = {
+        "page[size]": 2,
+        "sort": "-name",
+        "filter": json.dumps([{"name": "name", "op": "like", "val": "keyset_%"}]),
+    }
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        with client:
+            response = client.get(
+                "/persons_window_count?" + urlencode(querystring),
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 200, response.json["errors"]
+            assert response.json["meta"] == {"count_mode": "exact", "count": 5}
+            assert [_["attributes"]["name"] for _ in response.json["data"]] == [
+                "keyset_e",
+                "keyset_d",
+            ]
+            assert "last" in response.json["links"]
+            (count_statement,) = [_ for _ in statements if "count(*)" in _]
+            assert "OVER ()" in count_statement
+            assert "LIMIT" in count_statement
+
+            querystring["page[number]"] = 4
+            response = client.get(
+                "/persons_window_count?" + urlencode(querystring),
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 200, response.json["errors"]
+            assert response.json["data"] == []
+            assert response.json["meta"]["count"] == 5
+
+            del statements[:]
+            querystring["sort"] = "computers.serial"
+            response = client.get(
+                "/persons_window_count?" + urlencode(querystring),
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 200, response.json["errors"]
+            assert response.json["meta"]["count"] == 5
+            assert not any("OVER ()" in _ for _ in statements)
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+
+def test_get_list_stream(db, client, api_middleware, keyset_persons, computer):
+    keyset_persons[0].computers.append(computer)
+    db.session.commit()
+
+    querystring = {
+        "sort": "name",
+        "include": "computers",
+        "filter": json.dumps([{"name": "name", "op": "like", "val": "keyset_%"}]),
+    }
+
+    with client:
+        for page_size in (0, 4):
+            querystring["page[size]"] = page_size
+            expected = client.get(
+                "/persons?" + urlencode(querystring),
+                content_type="application/vnd.api+json",
+            )
+            # Schema with Meta.model eager loads included computers
+            for url in ("/persons_stream", "/persons_stream_model"):
+                response = client.get(
+                    url + "?" + urlencode(querystring),
+                    content_type="application/vnd.api+json",
+                )
+                assert response.status_code == 200, response.json["errors"]
+                assert response.is_streamed
+                assert response.content_type == "application/vnd.api+json"
+                for key in ("data", "included", "meta", "jsonapi"):
+                    assert response.json[key] == expected.json[key]
+                assert set(response.json["links"]) == set(expected.json["links"])
+
+
+def test_get_list_keyset_pagination_errors(client, api_middleware):
+    with client:
+        for url in (
+            "/persons_keyset?page[number]=2",
+            "/persons_keyset?page[after]=invalid",
+            "/persons_keyset?page[after]=WzFd&page[before]=WzFd",
+            "/persons?page[after]=WzFd",
+            "/persons_keyset?sort=computers.serial",
+        ):
+            response = client.get(url, content_type="application/vnd.api+json")
+            assert response.status_code == 400, url
+
+
 def test_head_list(client, api_middleware):
     with client:
         response = client.head("/persons", content_type="application/vnd.api+json")
@@ -99,6 +379,85 @@ def test_post_list(client, api_middleware, computer):
         assert response.status_code == 201, response.json["errors"]
 
 
+def test_post_list_bulk(client, api_middleware, db, computer):
+    payload = {
+        "data": [
+            {"type": "person", "attributes": {"name": "bulk_{}".format(i)}}
+            for i in range(5)
+        ]
+    }
+    payload["data"][0]["relationships"] = {
+        "computers": {"data": [{"type": "computer", "id": str(computer.id)}]}
+    }
+
+    with client:
+        response = client.post(
+            "/persons_bulk",
+            data=json.dumps(payload),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 201, response.json["errors"]
+        data = response.json["data"]
+        assert [item["attributes"]["name"] for item in data] == [
+            "bulk_{}".format(i) for i in range(5)
+        ]
+        assert computer.person.person_id == int(data[0]["id"])
+
+        persons = db.session.query(Person).filter(Person.name.like("bulk_%")).all()
+        assert len(persons) == 5
+        for person in persons:
+            db.session.delete(person)
+        db.session.commit()
+
+        payload["data"][3]["attributes"] = {}
+        response = client.post(
+            "/persons_bulk",
+            data=json.dumps(payload),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 422
+        assert response.json["errors"][0]["source"]["pointer"] == (
+            "/data/3/attributes/name"
+        )
+        assert not db.session.query(Person).filter(Person.name.like("bulk_%")).all()
+
+        response = client.post(
+            "/persons",
+            data=json.dumps(payload),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code != 201
+
+
+def test_post_list_related_objects_not_found(client, api_middleware, computer):
+    payload = {
+        "data": {
+            "type": "person",
+            "attributes": {"name": "test"},
+            "relationships": {
+                "computers": {
+                    "data": [
+                        {"type": "computer", "id": str(computer.id)},
+                        {"type": "computer", "id": "9998"},
+                        {"type": "computer", "id": "9999"},
+                    ]
+                }
+            },
+        }
+    }
+
+    with client:
+        response = client.post(
+            "/persons",
+            data=json.dumps(payload),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 404, response.json["errors"]
+        assert response.json["errors"][0]["detail"] == (
+            "Computer.id: 9998, 9999 not found"
+        )
+
+
 def test_post_list_nested_no_join(client, api_middleware, computer):
     payload = {
         "data": {
@@ -259,6 +618,7 @@ def test_get_list_invalid_sort(client, api_middleware):
             "/persons" + "?" + querystring, content_type="application/vnd.api+json"
         )
         assert response.status_code == 400, response.json["errors"]
+        assert response.json["errors"][0]["source"] == {"parameter": "sort"}
 
 
 def test_get_list_invalid_filters_val(client, api_middleware):
@@ -367,3 +727,117 @@ def test_post_list_validation_error(client, api_middleware, computer):
             content_type="application/vnd.api+json",
         )
         assert response.status_code == 422, response.json["errors"]
+
+
+def test_post_list_unit_of_work(client, api_middleware, db):
+    commits = []
+
+    def count_commit(session):
+        commits.append(session)
+
+    sqlalchemy.event.listen(db.Session, "after_commit", count_commit)
+    try:
+        with client:
+            response = client.post(
+                "/persons_unit_of_work",
+                data=json.dumps(
+                    {"data": {"type": "person", "attributes": {"name": "unit"}}}
+                ),
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 201, response.json["errors"]
+            assert len(commits) == 1
+
+            person = db.session.get(Person, int(response.json["data"]["id"]))
+            assert [computer.serial for computer in person.computers] == [
+                "unit_of_work"
+            ]
+            for computer in person.computers:
+                db.session.delete(computer)
+            db.session.delete(person)
+            db.session.commit()
+
+            del commits[:]
+            response = client.post(
+                "/persons_unit_of_work",
+                data=json.dumps(
+                    {"data": {"type": "person", "attributes": {"name": "fail"}}}
+                ),
+                content_type="application/vnd.api+json",
+            )
+            assert response.status_code == 500
+            assert not commits
+            assert not db.session.query(Person).filter_by(name="fail").all()
+            assert not db.session.query(Computer).filter_by(serial="unit_of_work").all()
+            assert not db.session.info
+    finally:
+        sqlalchemy.event.remove(db.Session, "after_commit", count_commit)
+
+
+def test_get_list_conditional(client, api_middleware, db, person, person_2):
+    person.birth_date = datetime.datetime(2020, 1, 2, 3, 4, 5)
+    db.session.commit()
+
+    with client:
+        response = client.get(
+            "/persons_conditional", content_type="application/vnd.api+json"
+        )
+        assert response.status_code == 200, response.json["errors"]
+        etag = response.headers["ETag"]
+        # Latest modification of remaining objects is unchanged by deletes
+        assert response.last_modified is None
+
+        response = client.get(
+            "/persons_conditional",
+            content_type="application/vnd.api+json",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert not response.data
+
+        response = client.get(
+            "/persons_conditional",
+            content_type="application/vnd.api+json",
+            headers={"If-Modified-Since": "Thu, 02 Jan 2020 03:04:05 GMT"},
+        )
+        assert response.status_code == 200
+
+        response = client.get(
+            "/persons_conditional?page[size]=1",
+            content_type="application/vnd.api+json",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 200
+
+        person_2.name = "conditional"
+        db.session.commit()
+        response = client.get(
+            "/persons_conditional",
+            content_type="application/vnd.api+json",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        etag = response.headers["ETag"]
+
+        removed = Person(name="conditional_removed")
+        db.session.add(removed)
+        db.session.commit()
+        response = client.get(
+            "/persons_conditional",
+            content_type="application/vnd.api+json",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        db.session.delete(removed)
+        db.session.commit()
+        response = client.get(
+            "/persons_conditional",
+            content_type="application/vnd.api+json",
+            headers={"If-None-Match": etag},
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
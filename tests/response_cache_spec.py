@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+import sqlalchemy
+from flask import json
+
+from flask_rest_jsonapi_next.response_cache import ResponseCache, response_cache
+from flask_rest_jsonapi_next.transaction import WRITTEN_TYPES_KEY, Transaction
+
+
+class DictBackend(object):
+    def __init__(self):
+        self.entries = dict()
+        self.timeouts = dict()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.entries[key] = value
+        self.timeouts[key] = timeout
+
+
+def test_response_cache_invalidate():
+    backend = DictBackend()
+    cache = ResponseCache(backend=backend)
+
+    key = cache.make_key(["/persons", {"page": {"size": 1}}], ["person", "computer"])
+    assert key == cache.make_key(
+        ["/persons", {"page": {"size": 1}}], ["computer", "person"]
+    )
+    assert key != cache.make_key(["/persons", {"page": {"size": 2}}], ["person"])
+
+    cache.set(key, "document")
+    assert cache.get(key) == "document"
+    assert backend.timeouts[key] == cache.timeout
+
+    cache.invalidate(["group"])
+    assert (
+        cache.make_key(["/persons", {"page": {"size": 1}}], ["person", "computer"])
+        == key
+    )
+
+    cache.invalidate(["computer"])
+    key_2 = cache.make_key(["/persons", {"page": {"size": 1}}], ["person", "computer"])
+    assert key_2 != key
+    assert cache.get(key_2) is None
+    assert key in backend.entries
+
+
+class FakeSession(object):
+    def __init__(self, error=None):
+        self.info = dict()
+        self.error = error
+        self.calls = []
+
+    def commit(self):
+        self.calls.append("commit")
+        if self.error is not None:
+            raise self.error
+
+    def rollback(self):
+        self.calls.append("rollback")
+
+
+def test_transaction_partial_commit_invalidates_committed_types():
+    sessions = [FakeSession(), FakeSession(RuntimeError("commit")), FakeSession()]
+    transaction = Transaction()
+    for session, type_ in zip(sessions, ("person", "computer", "group")):
+        transaction.join(SimpleNamespace(session=session))
+        session.info[WRITTEN_TYPES_KEY] = {type_}
+
+    generations = {
+        type_: response_cache.generation(type_)
+        for type_ in ("person", "computer", "group")
+    }
+
+    with pytest.raises(RuntimeError):
+        transaction.commit()
+
+    assert [session.calls for session in sessions] == [
+        ["commit"],
+        ["commit", "rollback"],
+        ["rollback"],
+    ]
+    assert response_cache.generation("person") != generations["person"]
+    assert response_cache.generation("computer") == generations["computer"]
+    assert response_cache.generation("group") == generations["group"]
+    assert all(session.info == {} for session in sessions)
+    assert transaction.sessions == []
+
+
+def test_get_list_response_cache(client, api_middleware, db, person, computer):
+    computer.person = person
+    db.session.commit()
+    response_cache.lru.clear()
+    url = "/persons_cached?include=computers&sort=name"
+    executions = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        executions.append(statement)
+
+    with client:
+        response = client.get(url, content_type="application/vnd.api+json")
+        assert response.status_code == 200, response.json["errors"]
+        document = response.json
+
+        sqlalchemy.event.listen(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+        try:
+            response = client.get(url, content_type="application/vnd.api+json")
+        finally:
+            sqlalchemy.event.remove(
+                db.engine, "before_cursor_execute", before_cursor_execute
+            )
+        assert response.status_code == 200
+        assert response.json == document
+        assert not executions
+
+        response = client.patch(
+            "/persons/{}".format(person.person_id),
+            data=json.dumps(
+                {
+                    "data": {
+                        "type": "person",
+                        "id": str(person.person_id),
+                        "attributes": {"name": "cached"},
+                    }
+                }
+            ),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 200, response.json["errors"]
+
+        response = client.get(url, content_type="application/vnd.api+json")
+        assert "cached" in [
+            item["attributes"]["name"] for item in response.json["data"]
+        ]
+
+        response = client.patch(
+            "/computers/{}".format(computer.id),
+            data=json.dumps(
+                {
+                    "data": {
+                        "type": "computer",
+                        "id": str(computer.id),
+                        "attributes": {"serial": "cached"},
+                        "relationships": {
+                            "owner": {
+                                "data": {"type": "person", "id": str(person.person_id)}
+                            }
+                        },
+                    }
+                }
+            ),
+            content_type="application/vnd.api+json",
+        )
+        assert response.status_code == 200, response.json["errors"]
+
+        response = client.get(url, content_type="application/vnd.api+json")
+        assert "cached" in [
+            item["attributes"]["serial"] for item in response.json["included"]
+        ]
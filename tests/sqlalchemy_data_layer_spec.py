@@ -1,9 +1,19 @@
 import pytest
 import sqlalchemy
+from sqlalchemy.dialects.postgresql import asyncpg, psycopg2
+from sqlalchemy.ext.compiler import compiles
 
-from flask_rest_jsonapi_next import JsonApiException, SqlalchemyDataLayer
+from flask_rest_jsonapi_next import JsonApiException, ResourceList, SqlalchemyDataLayer
+from flask_rest_jsonapi_next.data_layers.alchemy import Explain, read_from_primary
 from flask_rest_jsonapi_next.data_layers.base import BaseDataLayer
-from flask_rest_jsonapi_next.exceptions import InvalidSort, RelationNotFound
+from flask_rest_jsonapi_next.exceptions import (
+    InvalidSort,
+    RelatedObjectNotFound,
+    RelationNotFound,
+)
+from flask_rest_jsonapi_next.querystring import QueryStringManager as QSManager
+
+from .factories.models import Computer, PersonModelSchema
 
 
 def test_sqlalchemy_data_layer_without_session(person_model, person_list):
@@ -16,6 +26,443 @@ def test_sqlalchemy_data_layer_without_model(db, person_list):
         SqlalchemyDataLayer(dict(session=db.session, resource=person_list))
 
 
+def test_sqlalchemy_data_layer_invalid_count_mode(db, person_model, person_list):
+    with pytest.raises(Exception):
+        SqlalchemyDataLayer(
+            dict(
+                session=db.session,
+                model=person_model,
+                resource=person_list,
+                count_mode="approximate",
+            )
+        )
+
+
+def test_sqlalchemy_data_layer_invalid_eagerload_strategy(
+    db, person_model, person_list
+):
+    with pytest.raises(Exception):
+        SqlalchemyDataLayer(
+            dict(
+                session=db.session,
+                model=person_model,
+                resource=person_list,
+                eagerload_strategies={"computers": "lazy"},
+            )
+        )
+
+
+def test_sqlalchemy_data_layer_invalid_large_in_strategy(db, person_model, person_list):
+    with pytest.raises(Exception):
+        SqlalchemyDataLayer(
+            dict(
+                session=db.session,
+                model=person_model,
+                resource=person_list,
+                large_in_strategy="temporary_table",
+            )
+        )
+
+
+def test_sqlalchemy_data_layer_eager_loader_name(db, person_model, person_list):
+    dl = SqlalchemyDataLayer(
+        dict(session=db.session, model=person_model, resource=person_list)
+    )
+    assert dl.get_eager_loader_name("computers", person_model.computers) == (
+        "joinedload"
+    )
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=person_list,
+            eagerload_strategy="auto",
+            eagerload_strategies={"tags": "subquery", "computers.owner": "raise"},
+        )
+    )
+    assert dl.get_eager_loader_name("computers", person_model.computers) == (
+        "selectinload"
+    )
+    assert dl.get_eager_loader_name("single_tag", person_model.single_tag) == (
+        "joinedload"
+    )
+    assert dl.get_eager_loader_name("tags", person_model.tags) == "subqueryload"
+    assert dl.get_eager_loader_name("computers.owner") == "raiseload"
+
+
+@pytest.mark.parametrize(
+    "eagerload_strategies",
+    [
+        {},
+        {"computers": "selectin"},
+        {"computers": "subquery", "computers.owner": "selectin"},
+    ],
+)
+def test_sqlalchemy_data_layer_eagerload_includes(
+    app, db, person_model, person, eagerload_strategies
+):
+    class PersonModelList(ResourceList):
+        schema = PersonModelSchema
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    db.session.add_all([Computer(serial="1", person=person) for _ in range(2)])
+    db.session.commit()
+    db.session.expire_all()
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=PersonModelList,
+            eagerload_strategies=eagerload_strategies,
+        )
+    )
+    qs = QSManager({"include": "computers.owner"}, PersonModelSchema)
+
+    with app.test_request_context(method="GET"):
+        query = dl.query(dict()).filter_by(person_id=person.person_id)
+        objects = dl.eagerload_includes(query, qs).all()
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert objects == [person]
+        assert "computers" not in sqlalchemy.inspect(person).unloaded
+        assert len(person.computers) == 2
+        for computer in person.computers:
+            assert "person" not in sqlalchemy.inspect(computer).unloaded
+        assert {computer.person for computer in person.computers} == {person}
+        assert statements == []
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+        for computer in person.computers:
+            db.session.delete(computer)
+        db.session.commit()
+
+
+def test_sqlalchemy_data_layer_estimate_count_unsupported_dialect(
+    db, person_model, person_list
+):
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=person_list,
+            count_mode="estimated",
+        )
+    )
+    assert dl.count_query(db.session.query(person_model)) is None
+
+
+def test_sqlalchemy_data_layer_explain(db, person_model, person):
+    query = db.session.query(person_model).filter(
+        person_model.name == person.name,
+        person_model.person_id.in_([person.person_id, 0]),
+    )
+
+    for dialect, placeholder in (
+        (psycopg2.dialect(), "%(name_1)s"),
+        (asyncpg.dialect(), "$1"),
+    ):
+        compiled = Explain(query.statement).compile(dialect=dialect)
+        assert str(compiled).startswith("EXPLAIN (FORMAT JSON) SELECT")
+        assert "person.name = {}".format(placeholder) in str(compiled)
+        assert compiled.params["name_1"] == person.name
+
+    # Parameters of the explained statement are bound by the session, including
+    # expanding IN parameters
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    @compiles(Explain, "sqlite")
+    def compile_sqlite_explain(element, compiler, **kwargs):
+        return "EXPLAIN QUERY PLAN " + compiler.process(element.statement, **kwargs)
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert db.session.execute(Explain(query.statement)).all()
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+    ((statement, parameters),) = statements
+    assert statement.startswith("EXPLAIN QUERY PLAN SELECT")
+    assert list(parameters) == [person.name, person.person_id, 0]
+
+
+def test_sqlalchemy_data_layer_get_related_objects(
+    db, person_model, person_list, computer
+):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=person_list,
+            related_objects_chunk_size=2,
+        )
+    )
+    identifiers = [{"id": str(computer.id)}] * 3
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert dl.get_related_objects(type(computer), "id", identifiers) == (
+            [computer] * 3
+        )
+        assert len(statements) == 1
+
+        with pytest.raises(RelatedObjectNotFound):
+            dl.get_related_objects(
+                type(computer), "id", identifiers + [{"id": "9998"}, {"id": "9999"}]
+            )
+        assert len(statements) == 3
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+
+def test_sqlalchemy_data_layer_large_in_filter(
+    db, person_model, person_list, person, person_2
+):
+    executions = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        executions.append((statement, parameters))
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=person_list,
+            large_in_threshold=10,
+        )
+    )
+    identifiers = [str(person.person_id)] + [str(i) for i in range(10000, 12500)]
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        results = {}
+        for op in ("in", "not_in"):
+            results[op] = dl.filter_query(
+                db.session.query(person_model),
+                [{"name": "id", "op": op, "val": identifiers}],
+                person_model,
+            ).all()
+        assert results["in"] == [person]
+        assert person not in results["not_in"] and person_2 in results["not_in"]
+
+        for statement, parameters in executions:
+            assert statement.count(" IN (") == 3
+            assert len(parameters) <= 1
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+    dl.large_in_threshold = None
+    assert dl.large_in_filter(person_model.person_id, list(range(20))) is None
+
+    # Strategies not supported by SQLite are rejected instead of failing in database
+    dl.large_in_threshold = 10
+    for strategy in ("array", "values"):
+        dl.large_in_strategy = strategy
+        with pytest.raises(Exception, match="not supported by sqlite"):
+            dl.filter_query(
+                db.session.query(person_model),
+                [{"name": "id", "op": "in", "val": identifiers}],
+                person_model,
+            ).all()
+
+
+def test_sqlalchemy_data_layer_relationship_related_objects(
+    db, person_model, person_list, person, groups
+):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def get_related_object(*args):
+        raise AssertionError("related objects are fetched one by one")
+
+    dl = SqlalchemyDataLayer(
+        dict(session=db.session, model=person_model, resource=person_list)
+    )
+    dl.get_related_object = get_related_object
+    view_kwargs = {"id": person.person_id}
+    group_ids = [group.id for group in groups]
+
+    def identifiers(*ids):
+        return {"data": [{"type": "group", "id": str(id_)} for id_ in ids]}
+
+    def group_queries():
+        return [_ for _ in statements if _.startswith("SELECT") and '"group"' in _]
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        _, updated = dl.create_relationship(
+            identifiers(*group_ids), "groups", "id", view_kwargs
+        )
+        assert updated is True
+        # Collection and related objects
+        assert len(group_queries()) == 2
+        assert sorted(group.id for group in person.groups) == group_ids
+
+        del statements[:]
+        _, updated = dl.create_relationship(
+            identifiers(*group_ids), "groups", "id", view_kwargs
+        )
+        assert updated is False
+
+        del statements[:]
+        _, updated = dl.delete_relationship(
+            identifiers(*group_ids[:2], 9999), "groups", "id", view_kwargs
+        )
+        assert updated is True
+        assert len(group_queries()) == 2
+        assert [group.id for group in person.groups] == group_ids[2:]
+
+        with pytest.raises(RelatedObjectNotFound):
+            dl.create_relationship(identifiers(9999), "groups", "id", view_kwargs)
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+        db.session.rollback()
+        person.groups = []
+        db.session.commit()
+
+
+def test_sqlalchemy_data_layer_set_based_relationship(
+    db, person_model, person_list, person, groups
+):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def linked_group_ids():
+        db.session.expire(person, ["groups"])
+        return sorted(group.id for group in person.groups)
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=person_list,
+            set_based_relationships=["groups"],
+        )
+    )
+    view_kwargs = {"id": person.person_id}
+    group_ids = [group.id for group in groups]
+
+    def identifiers(*ids):
+        return {"data": [{"type": "group", "id": str(id_)} for id_ in ids]}
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        _, updated = dl.create_relationship(
+            identifiers(*group_ids[:2]), "groups", "id", view_kwargs
+        )
+        assert updated is True
+
+        _, updated = dl.create_relationship(
+            identifiers(*group_ids[:2]), "groups", "id", view_kwargs
+        )
+        assert updated is False
+
+        _, updated = dl.update_relationship(
+            identifiers(*group_ids[1:]), "groups", "id", view_kwargs
+        )
+        assert updated is True
+
+        _, updated = dl.delete_relationship(
+            identifiers(group_ids[0], group_ids[2]), "groups", "id", view_kwargs
+        )
+        assert updated is True
+
+        with pytest.raises(RelatedObjectNotFound):
+            dl.create_relationship(identifiers(9999), "groups", "id", view_kwargs)
+
+        # Collection is never loaded
+        assert not any('FROM "group", person_group' in _ for _ in statements)
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+    assert linked_group_ids() == group_ids[1:2]
+    person.groups = []
+    db.session.commit()
+
+
+def test_sqlalchemy_data_layer_set_based_relationship_chunks(
+    db, person_model, person_list, person, groups
+):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.startswith("DELETE"):
+            statements.append((statement, parameters))
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            model=person_model,
+            resource=person_list,
+            set_based_relationships=True,
+            related_objects_chunk_size=1,
+        )
+    )
+    view_kwargs = {"id": person.person_id}
+    group_ids = [group.id for group in groups]
+
+    def identifiers(*ids):
+        return {"data": [{"type": "group", "id": str(id_)} for id_ in ids]}
+
+    dl.create_relationship(identifiers(*group_ids), "groups", "id", view_kwargs)
+
+    sqlalchemy.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        _, updated = dl.update_relationship(
+            identifiers(*group_ids), "groups", "id", view_kwargs
+        )
+        assert updated is False
+        assert statements == []
+
+        # Kept groups outnumber chunk size, only the stale one is deleted
+        _, updated = dl.update_relationship(
+            identifiers(*group_ids[1:]), "groups", "id", view_kwargs
+        )
+        assert updated is True
+        assert len(statements) == 1
+        assert "NOT IN" not in statements[0][0]
+        assert list(statements[0][1]) == [person.person_id, group_ids[0]]
+    finally:
+        sqlalchemy.event.remove(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+
+    db.session.expire(person, ["groups"])
+    assert sorted(group.id for group in person.groups) == group_ids[1:]
+    person.groups = []
+    db.session.commit()
+
+
 def test_sqlalchemy_data_layer_create_object_error(db, person_model, person_list):
     with pytest.raises(sqlalchemy.exc.IntegrityError):
         dl = SqlalchemyDataLayer(
@@ -231,3 +678,59 @@ def test_base_data_layer():
         base_dl.before_delete_relationship(None, None, None, dict())
     with pytest.raises(NotImplementedError):
         base_dl.after_delete_relationship(None, None, None, None, None, dict())
+
+
+def test_sqlalchemy_data_layer_read_session(app, db, person_model, person_list, person):
+    replica_engine = sqlalchemy.create_engine("sqlite:///:memory:")
+    person_model.metadata.create_all(replica_engine)
+    read_session = sqlalchemy.orm.Session(bind=replica_engine)
+    read_session.add(person_model(name="replica"))
+    read_session.commit()
+
+    lags = []
+
+    def replica_lag(session):
+        lags.append(session)
+        return lag
+
+    dl = SqlalchemyDataLayer(
+        dict(
+            session=db.session,
+            read_session=read_session,
+            model=person_model,
+            resource=person_list,
+            replica_lag=replica_lag,
+        )
+    )
+
+    def names():
+        return {obj.name for obj in dl.query(dict()).all()}
+
+    lag = 0.5
+    with app.test_request_context(method="GET"):
+        assert names() == {"replica"}
+        assert names() == {"replica"}
+        assert lags == [read_session]
+
+    with app.test_request_context(method="GET"):
+        read_from_primary()
+        assert person.name in names()
+
+    with app.test_request_context(method="PATCH"):
+        assert person.name in names()
+
+    lag = 2
+    with app.test_request_context(method="GET"):
+        assert person.name in names()
+
+    lag = None
+    with app.test_request_context(method="GET"):
+        assert person.name in names()
+
+    lag = 0.5
+    dl.read_your_writes_window = 60
+    dl.commit()
+    with app.test_request_context(method="GET"):
+        assert person.name in names()
+
+    read_session.close()
@@ -1,8 +1,20 @@
+from copy import deepcopy
+from datetime import datetime
+from decimal import Decimal
+
 import pytest
+from sqlalchemy.dialects import mssql, postgresql, sqlite
 
-from flask_rest_jsonapi_next.data_layers.filtering.alchemy import Node
+from flask_rest_jsonapi_next.data_layers.filtering.alchemy import (
+    Node,
+    compile_filter,
+    create_large_in_filter,
+    filter_cache,
+)
 from flask_rest_jsonapi_next.exceptions import InvalidFilters
 
+from .factories.models import PersonTagSchema
+
 
 def test_Node(person_model, person_schema):
     from copy import deepcopy
@@ -35,6 +47,25 @@ def test_Node(person_model, person_schema):
         n.related_schema
 
 
+def test_Node_related_schema(person_model, person_schema, computer_schema):
+    computers_field = person_schema._declared_fields["computers"]
+    declared_schema = computers_field.__dict__["_Relationship__schema"]
+    tags_field = person_schema._declared_fields["tags"]
+    tags_schema = tags_field._schema
+
+    filt = {"name": "computers", "op": "any", "val": {}}
+    assert Node(person_model, filt, None, person_schema).related_schema is (
+        computer_schema
+    )
+    assert computers_field.__dict__["_Relationship__schema"] is declared_schema
+
+    filt = {"name": "tags", "op": "any", "val": {}}
+    assert Node(person_model, filt, None, person_schema).related_schema is (
+        PersonTagSchema
+    )
+    assert tags_field._schema is tags_schema
+
+
 def test_Node_empty_filter(person_model, person_schema):
     for filt in [
         {"and": []},
@@ -43,3 +74,96 @@ def test_Node_empty_filter(person_model, person_schema):
     ]:
         resolved = Node(person_model, filt, None, person_schema).resolve()
         assert resolved is None
+
+
+def test_compile_filter_cache(person_model, person_schema):
+    filter_cache.clear()
+    filt = {
+        "or": [
+            {"name": "name", "op": "eq", "val": "John"},
+            {
+                "name": "computers",
+                "op": "any",
+                "val": {"name": "serial", "op": "eq", "val": "0000"},
+            },
+        ]
+    }
+    plan = compile_filter(person_model, filt, None, person_schema)
+    hits = filter_cache.info()["hits"]
+
+    other = deepcopy(filt)
+    other["or"][0]["val"] = "Jane"
+    other["or"][1]["val"]["val"] = "1111"
+    assert compile_filter(person_model, other, None, person_schema) is plan
+    assert filter_cache.info()["hits"] == hits + 1
+
+    compiled = str(plan.bind(other).compile(compile_kwargs={"literal_binds": True}))
+    assert compiled == str(
+        Node(person_model, other, None, person_schema)
+        .resolve()
+        .compile(compile_kwargs={"literal_binds": True})
+    )
+    assert "'Jane'" in compiled and "'1111'" in compiled
+
+    other["or"][0]["op"] = "ne"
+    assert compile_filter(person_model, other, None, person_schema) is not plan
+
+
+def test_compile_filter_invalid(person_model, person_schema):
+    filter_cache.clear()
+    with pytest.raises(InvalidFilters):
+        compile_filter(
+            person_model, {"name": "error", "op": "eq", "val": 1}, None, person_schema
+        )
+    assert filter_cache.info()["size"] == 0
+
+
+def test_Node_typed_coercion(person_model, person_schema):
+    def coerce(name, val):
+        return (
+            Node(
+                person_model,
+                {"name": name, "op": "in_", "val": val},
+                None,
+                person_schema,
+            )
+            .compile()
+            .coerce(val)
+        )
+
+    assert coerce("name", ["0001", "2000-01-01"]) == ["0001", "2000-01-01"]
+    assert coerce("id", ["1", "2", 3]) == [1, 2, 3]
+    assert coerce("id", "12") == 12
+    assert coerce("birth_date", ["2000-01-01"]) == [datetime(2000, 1, 1)]
+    # values that can't be parsed fall back to heuristic coercion
+    assert coerce("id", ["1", "1.5", "abc"]) == [1, Decimal("1.5"), "abc"]
+    # heuristic coercion for fields without known type
+    assert coerce("computers", "12") == 12
+
+
+def test_create_large_in_filter(person_model):
+    def compiled(expression, dialect):
+        return " ".join(str(expression.compile(dialect=dialect)).split())
+
+    column = person_model.person_id
+    assert (
+        compiled(create_large_in_filter(column, [1, 2], "array"), postgresql.dialect())
+        == "person.person_id = ANY (%(param_1)s::INTEGER[])"
+    )
+    assert (
+        compiled(
+            create_large_in_filter(column, [1, 2], "array", negate=True),
+            postgresql.dialect(),
+        )
+        == "person.person_id != ALL (%(param_1)s::INTEGER[])"
+    )
+    assert compiled(
+        create_large_in_filter(column, [1, 2], "values"), mssql.dialect()
+    ) == (
+        "person.person_id IN (SELECT in_values.value "
+        "FROM (VALUES (1), (2)) AS in_values (value))"
+    )
+    chunked = create_large_in_filter(column, list(range(2500)), "chunked")
+    assert compiled(chunked, sqlite.dialect()).count(" IN (") == 3
+    with pytest.raises(ValueError):
+        create_large_in_filter(column, [1, 2], "temporary_table")